@@ -46,7 +46,7 @@ class Convenience():
 
 
 	@classmethod
-	def text(cls, parent, text, x = None, y = None, pos = None, extents = None, width = None, height = None, halign = "left", font = "sans-serif", font_size = 12, fill = "#000000", stroke = None, attribute = None):
+	def text(cls, parent, text, x = None, y = None, pos = None, extents = None, width = None, height = None, halign = "left", font = "sans-serif", font_size = 12, fill = "#000000", stroke = None, attribute = None, emit_tspans = False):
 		if halign not in cls._ALLOWED_HALIGN:
 			raise SVGLibUsageException(f"halign must be one of {', '.join(sorted(cls._ALLOWED_HALIGN))}, but was: {halign}")
 		if (attribute is not None) and (attribute not in cls._ALLOWED_ATTRIBUTE):
@@ -81,10 +81,13 @@ class Convenience():
 			text_obj.style["font-style"] = "italic"
 
 		parent.add(text_obj)
+		if emit_tspans:
+			# Break lines ourselves instead of leaving it to the renderer
+			text_obj.apply_layout()
 		return text_obj
 
 	@classmethod
-	def walk_with_transformation_matrix(cls, root):
+	def _walk_with_transformation_matrix(cls, root_node, root_matrix, expand_instances, instantiated):
 		def _transform_context_function(transformation_matrix, parent, child):
 			if child.hasAttribute("transform"):
 				matrix = SVGTransform.parse(child.getAttribute("transform"))
@@ -94,11 +97,35 @@ class Convenience():
 					transformation_matrix = matrix * transformation_matrix
 			return transformation_matrix
 
-		for (node, transformation_matrix) in XMLTools.walk_elements_with_context(root.node, root_context = root.transformation_matrix, transform_context_function = _transform_context_function, exclude = set([ "defs" ])):
+		for (node, transformation_matrix) in XMLTools.walk_elements_with_context(root_node, root_context = root_matrix, transform_context_function = _transform_context_function, exclude = set([ "defs", "symbol" ])):
 			svg_object = SVGObject.attempt_handle(node)
 			if svg_object is not None:
 				yield (svg_object, transformation_matrix)
 
+			if expand_instances and (node.tagName == "use") and (svg_object is not None):
+				referenced = svg_object.referenced_node
+				if (referenced is None) or (referenced in instantiated):
+					continue
+				# Content is placed at (x, y) of the <use> element, then its
+				# own transformation applies.
+				matrix = svg_object.instance_matrix
+				if matrix is None:
+					matrix = transformation_matrix
+				elif transformation_matrix is not None:
+					matrix = matrix * transformation_matrix
+				if referenced.hasAttribute("transform"):
+					referenced_matrix = SVGTransform.parse(referenced.getAttribute("transform"))
+					matrix = referenced_matrix if (matrix is None) else (referenced_matrix * matrix)
+				yield from cls._walk_with_transformation_matrix(referenced, matrix, expand_instances, instantiated | set([ referenced ]))
+
+	@classmethod
+	def walk_with_transformation_matrix(cls, root, expand_instances = False):
+		# Yields all objects with their absolute transformation matrix (None
+		# meaning identity). <use> elements are yielded themselves; with
+		# expand_instances, the content they reference is yielded as well
+		# (once per instance) with the transformation of the instance.
+		yield from cls._walk_with_transformation_matrix(root.node, root.transformation_matrix, expand_instances, set())
+
 	@classmethod
 	def interpolate_extents(cls, root, max_interpolation_count = 100):
 		for (svg_object, transformation_matrix) in cls.walk_with_transformation_matrix(root):
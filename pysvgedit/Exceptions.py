@@ -22,3 +22,5 @@ class SVGException(Exception): pass
 class SVGValidationException(SVGException): pass
 class SVGInputFileException(SVGException): pass
 class SVGLibUsageException(SVGException): pass
+class SVGFontException(SVGException): pass
+class SVGRenderException(SVGException): pass
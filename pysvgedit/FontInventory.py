@@ -0,0 +1,260 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import json
+import tempfile
+import functools
+import subprocess
+import dataclasses
+from .TrueTypeFont import TrueTypeFont
+from .Exceptions import SVGFontException
+
+@dataclasses.dataclass(frozen = True)
+class FontFace():
+	family: str
+	subfamily: str
+	filename: str
+	font_index: int
+	weight: int
+	italic: bool
+
+class FontInventory():
+	_FONT_EXTENSIONS = set([ ".ttf", ".otf", ".ttc", ".otc" ])
+	_DEFAULT_FONT_DIRECTORIES = [
+		"/usr/share/fonts",
+		"/usr/local/share/fonts",
+		"~/.local/share/fonts",
+		"~/.fonts",
+		"/Library/Fonts",
+		"/System/Library/Fonts",
+		"~/Library/Fonts",
+	]
+
+	# Generic CSS families are resolved to the first installed candidate.
+	_GENERIC_FAMILIES = {
+		"sans-serif":	[ "DejaVu Sans", "Liberation Sans", "Noto Sans", "Arial", "Helvetica", "FreeSans" ],
+		"serif":		[ "DejaVu Serif", "Liberation Serif", "Noto Serif", "Times New Roman", "Times", "FreeSerif" ],
+		"monospace":	[ "DejaVu Sans Mono", "Liberation Mono", "Noto Sans Mono", "Courier New", "Courier", "FreeMono" ],
+		"cursive":		[ "Comic Sans MS", "URW Chancery L" ],
+		"fantasy":		[ "Impact" ],
+	}
+
+	# Metric-compatible substitutes that fontconfig uses for common families
+	_FAMILY_ALIASES = {
+		"arial":			[ "Liberation Sans", "Arimo" ],
+		"helvetica":		[ "Liberation Sans", "Arimo", "Nimbus Sans", "Nimbus Sans L" ],
+		"times new roman":	[ "Liberation Serif", "Tinos" ],
+		"times":			[ "Liberation Serif", "Tinos", "Nimbus Roman", "Nimbus Roman No9 L" ],
+		"courier new":		[ "Liberation Mono", "Cousine" ],
+		"courier":			[ "Liberation Mono", "Cousine", "Nimbus Mono PS", "Nimbus Mono L" ],
+	}
+
+	# fontconfig weights (FC_WEIGHT_*) to CSS weights
+	_FONTCONFIG_WEIGHTS = [ (0, 100), (40, 200), (50, 300), (80, 400), (100, 500), (180, 600), (200, 700), (205, 800), (210, 900) ]
+	_CACHE_VERSION = 1
+
+	def __init__(self, faces):
+		self._faces = list(faces)
+		self._faces_by_family = { }
+		for face in self._faces:
+			self._faces_by_family.setdefault(self.normalize_family(face.family), [ ]).append(face)
+
+	@property
+	def faces(self):
+		return iter(self._faces)
+
+	@classmethod
+	def normalize_family(cls, family: str):
+		family = family.strip()
+		if (len(family) >= 2) and (family[0] == family[-1]) and (family[0] in "'\""):
+			family = family[1 : -1]
+		return " ".join(family.split()).lower()
+
+	@classmethod
+	def split_family_list(cls, font_family: str):
+		# "'Fira Sans', Arial, sans-serif" -> [ "Fira Sans", "Arial", "sans-serif" ]
+		families = [ ]
+		for family in font_family.split(","):
+			family = family.strip()
+			if (len(family) >= 2) and (family[0] == family[-1]) and (family[0] in "'\""):
+				family = family[1 : -1]
+			if family != "":
+				families.append(family)
+		return families
+
+	@classmethod
+	def is_generic_family(cls, family: str):
+		return cls.normalize_family(family) in cls._GENERIC_FAMILIES
+
+	@classmethod
+	def default_font_directories(cls):
+		return [ os.path.expanduser(directory) for directory in cls._DEFAULT_FONT_DIRECTORIES ]
+
+	@classmethod
+	def _font_files(cls, directories):
+		for directory in directories:
+			for (dirname, subdirs, filenames) in os.walk(directory):
+				subdirs.sort()
+				for filename in sorted(filenames):
+					if os.path.splitext(filename)[1].lower() in cls._FONT_EXTENSIONS:
+						yield os.path.join(dirname, filename)
+
+	@classmethod
+	def _read_faces(cls, filename):
+		try:
+			for font_index in range(TrueTypeFont.font_count(filename)):
+				font = TrueTypeFont(filename, font_index = font_index)
+				for family in font.family_names:
+					yield FontFace(family = family, subfamily = font.subfamily_name, filename = filename, font_index = font_index, weight = font.weight, italic = font.italic)
+		except (OSError, SVGFontException):
+			# Unreadable or broken font files are ignored.
+			pass
+
+	@classmethod
+	def default_cache_filename(cls):
+		cache_home = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+		return os.path.join(cache_home, "pysvgedit", "font_inventory.json")
+
+	@classmethod
+	def _directory_mtimes(cls, directories):
+		# Installing or removing a font changes the modification time of the
+		# directory that contains it; a directory that does not exist (yet)
+		# is recorded as None.
+		mtimes = { }
+		for directory in directories:
+			if not os.path.isdir(directory):
+				mtimes[directory] = None
+				continue
+			for (dirname, subdirs, filenames) in os.walk(directory):
+				mtimes[dirname] = os.stat(dirname).st_mtime_ns
+		return mtimes
+
+	@classmethod
+	def _read_cache(cls, cache_filename):
+		try:
+			with open(cache_filename) as f:
+				cache = json.load(f)
+		except (OSError, ValueError):
+			return None
+		if cache.get("version") != cls._CACHE_VERSION:
+			return None
+		return cache
+
+	@classmethod
+	def _write_cache(cls, cache_filename, cache):
+		# Written atomically, several processes may scan at the same time.
+		cache_dir = os.path.dirname(cache_filename)
+		os.makedirs(cache_dir, exist_ok = True)
+		(fd, tmp_filename) = tempfile.mkstemp(dir = cache_dir, prefix = ".tmp_", suffix = ".json")
+		try:
+			with os.fdopen(fd, "w") as f:
+				json.dump(cache, f)
+			os.replace(tmp_filename, cache_filename)
+		finally:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+
+	@classmethod
+	def scan(cls, directories = None, cache_filename = None):
+		# With a cache file, the font files are only parsed again if any of
+		# the font directories changed, and then only those files that are
+		# new or modified.
+		if directories is None:
+			directories = cls.default_font_directories()
+		if cache_filename is None:
+			return cls(face for filename in cls._font_files(directories) for face in cls._read_faces(filename))
+
+		directory_mtimes = cls._directory_mtimes(directories)
+		cache = cls._read_cache(cache_filename)
+		if (cache is not None) and (cache["directories"] == directory_mtimes):
+			return cls(FontFace(**face) for faces in cache["files"].values() for face in faces["faces"])
+
+		cached_files = { } if (cache is None) else cache["files"]
+		files = { }
+		for filename in cls._font_files(directories):
+			stat = os.stat(filename)
+			cached = cached_files.get(filename)
+			if (cached is not None) and (cached["mtime"] == stat.st_mtime_ns) and (cached["size"] == stat.st_size):
+				files[filename] = cached
+			else:
+				files[filename] = { "mtime": stat.st_mtime_ns, "size": stat.st_size, "faces": [ dataclasses.asdict(face) for face in cls._read_faces(filename) ] }
+		try:
+			cls._write_cache(cache_filename, { "version": cls._CACHE_VERSION, "directories": directory_mtimes, "files": files })
+		except OSError:
+			# Cache is an optimization only
+			pass
+		return cls(FontFace(**face) for faces in files.values() for face in faces["faces"])
+
+	@classmethod
+	def _fontconfig_weight(cls, fc_weight: int):
+		return min(cls._FONTCONFIG_WEIGHTS, key = lambda weights: abs(weights[0] - fc_weight))[1]
+
+	@classmethod
+	def scan_fontconfig(cls, fc_list_binary: str = "fc-list"):
+		# Enumerates all fonts known to fontconfig with a single fc-list call.
+		# Every family name (fontconfig lists localized and legacy names
+		# comma-separated) becomes a face of its own.
+		output = subprocess.check_output([ fc_list_binary, "--format", "%{family}\t%{style}\t%{file}\t%{index}\t%{weight}\t%{slant}\n" ])
+		faces = [ ]
+		for line in output.decode("utf-8", errors = "replace").splitlines():
+			fields = line.split("\t")
+			if len(fields) != 6:
+				continue
+			(families, styles, filename, font_index, weight, slant) = fields
+			style = styles.split(",")[0]
+			for family in families.split(","):
+				family = family.replace("\\-", "-").strip()
+				if family == "":
+					continue
+				faces.append(FontFace(family = family, subfamily = style, filename = filename, font_index = int(font_index or 0), weight = cls._fontconfig_weight(int(float(weight or 80))), italic = int(float(slant or 0)) != 0))
+		return cls(faces)
+
+	@classmethod
+	@functools.cache
+	def default(cls):
+		return cls.scan(cache_filename = cls.default_cache_filename())
+
+	@property
+	def families(self):
+		return set(faces[0].family for faces in self._faces_by_family.values())
+
+	def _resolve_family(self, family: str):
+		normalized = self.normalize_family(family)
+		if normalized in self._faces_by_family:
+			return normalized
+		for candidate in self._GENERIC_FAMILIES.get(normalized, [ ]) + self._FAMILY_ALIASES.get(normalized, [ ]):
+			candidate = self.normalize_family(candidate)
+			if candidate in self._faces_by_family:
+				return candidate
+		return None
+
+	def has_family(self, family: str):
+		return self._resolve_family(family) is not None
+
+	def lookup(self, font_family: str, weight: int = 400, italic: bool = False):
+		# Returns the best matching face of the first available family of a
+		# CSS font-family list, or None if none of them are installed.
+		for family in self.split_family_list(font_family):
+			resolved = self._resolve_family(family)
+			if resolved is not None:
+				faces = self._faces_by_family[resolved]
+				return min(faces, key = lambda face: (face.italic != italic, abs(face.weight - weight), face.filename, face.font_index))
+		return None
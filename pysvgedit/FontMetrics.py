@@ -0,0 +1,203 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+import functools
+from .TrueTypeFont import TrueTypeFont
+from .FontInventory import FontInventory
+
+class FontMetrics():
+	# Metrics of a font at a specific size, all values are in user units
+	# (px). When no font file could be found, an approximation based on
+	# typical sans-serif proportions is used so that text extents can always
+	# be estimated.
+	_DEFAULT_FONT_SIZE = 16
+	_FALLBACK_ADVANCE = 0.55
+	_FALLBACK_ASCENT = 0.8
+	_FALLBACK_DESCENT = 0.2
+	_LENGTH_RE = re.compile(r"\s*(?P<value>[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?)\s*(?P<unit>[a-zA-Z%]*)\s*")
+	_UNIT_FACTORS = {
+		"":		1,
+		"px":	1,
+		"pt":	96 / 72,
+		"pc":	96 / 6,
+		"mm":	96 / 25.4,
+		"cm":	96 / 2.54,
+		"in":	96,
+	}
+	_FONT_SIZE_KEYWORDS = {
+		"xx-small":	9,
+		"x-small":	10,
+		"small":	13,
+		"medium":	16,
+		"large":	18,
+		"x-large":	24,
+		"xx-large":	32,
+	}
+	_FONT_WEIGHT_KEYWORDS = {
+		"normal":	400,
+		"bold":		700,
+		"lighter":	300,
+		"bolder":	700,
+	}
+
+	def __init__(self, font: TrueTypeFont | None, font_size: float):
+		self._font = font
+		self._font_size = font_size
+		self._advance_cache = { }
+		if font is not None:
+			self._scale = font_size / font.units_per_em
+		else:
+			self._scale = None
+
+	@property
+	def font(self):
+		return self._font
+
+	@property
+	def font_size(self):
+		return self._font_size
+
+	@property
+	def ascent(self):
+		if self._font is None:
+			return self._FALLBACK_ASCENT * self._font_size
+		return self._font.ascender * self._scale
+
+	@property
+	def descent(self):
+		# Positive distance below the baseline.
+		if self._font is None:
+			return self._FALLBACK_DESCENT * self._font_size
+		return -self._font.descender * self._scale
+
+	@property
+	def line_gap(self):
+		if self._font is None:
+			return 0
+		return self._font.line_gap * self._scale
+
+	def _glyph_metrics(self, char: str):
+		# (glyph ID, advance in px); cached per font and size.
+		if char not in self._advance_cache:
+			if self._font is None:
+				self._advance_cache[char] = (None, self._FALLBACK_ADVANCE * self._font_size)
+			else:
+				glyph_id = self._font.glyph_id(char)
+				self._advance_cache[char] = (glyph_id, self._font.advance_width(glyph_id) * self._scale)
+		return self._advance_cache[char]
+
+	def advance(self, char: str):
+		return self._glyph_metrics(char)[1]
+
+	def text_width(self, text: str, kerning: bool = True):
+		width = 0
+		previous_glyph_id = None
+		for char in text:
+			(glyph_id, advance) = self._glyph_metrics(char)
+			width += advance
+			if kerning and (previous_glyph_id is not None) and (glyph_id is not None):
+				width += self._font.kerning(previous_glyph_id, glyph_id) * self._scale
+			previous_glyph_id = glyph_id
+		return width
+
+	@classmethod
+	def parse_length(cls, value: str, relative_to: float | None = None):
+		# Returns the value in px or None if unparsable.
+		rematch = cls._LENGTH_RE.fullmatch(value)
+		if rematch is None:
+			return None
+		number = float(rematch["value"])
+		unit = rematch["unit"].lower()
+		if unit in cls._UNIT_FACTORS:
+			return number * cls._UNIT_FACTORS[unit]
+		if relative_to is None:
+			relative_to = cls._DEFAULT_FONT_SIZE
+		if unit in ("em", "rem"):
+			return number * relative_to
+		elif unit == "ex":
+			return number * relative_to / 2
+		elif unit == "%":
+			return number * relative_to / 100
+		return None
+
+	@classmethod
+	def parse_font_size(cls, value: str | None):
+		if value is None:
+			return cls._DEFAULT_FONT_SIZE
+		value = value.strip().lower()
+		if value in cls._FONT_SIZE_KEYWORDS:
+			return cls._FONT_SIZE_KEYWORDS[value]
+		font_size = cls.parse_length(value)
+		return font_size if (font_size is not None) else cls._DEFAULT_FONT_SIZE
+
+	@classmethod
+	def parse_font_weight(cls, value: str | None):
+		if value is None:
+			return 400
+		value = value.strip().lower()
+		if value in cls._FONT_WEIGHT_KEYWORDS:
+			return cls._FONT_WEIGHT_KEYWORDS[value]
+		try:
+			return int(value)
+		except ValueError:
+			return 400
+
+	@classmethod
+	def parse_line_height(cls, value: str | None, font_size: float):
+		# Inkscape uses 1.25 as the default line height.
+		if (value is None) or (value.strip().lower() == "normal"):
+			return 1.25 * font_size
+		try:
+			return float(value) * font_size
+		except ValueError:
+			line_height = cls.parse_length(value, relative_to = font_size)
+			return line_height if (line_height is not None) else 1.25 * font_size
+
+	@classmethod
+	@functools.lru_cache(maxsize = 64)
+	def _load_font(cls, filename: str, font_index: int):
+		return TrueTypeFont(filename, font_index = font_index)
+
+	@classmethod
+	@functools.lru_cache(maxsize = 1024)
+	def _get(cls, font_family: str, font_size: float, weight: int, italic: bool, inventory: FontInventory):
+		face = inventory.lookup(font_family, weight = weight, italic = italic)
+		font = cls._load_font(face.filename, face.font_index) if (face is not None) else None
+		return cls(font, font_size)
+
+	@classmethod
+	def get(cls, font_family: str = "sans-serif", font_size: float = _DEFAULT_FONT_SIZE, weight: int = 400, italic: bool = False, inventory: FontInventory | None = None):
+		if inventory is None:
+			inventory = FontInventory.default()
+		return cls._get(font_family, font_size, weight, italic, inventory)
+
+	@classmethod
+	def from_style(cls, style, inventory: FontInventory | None = None):
+		# Typically used with a computed style, so that inherited font
+		# properties are considered.
+		font_family = style.get("font-family") or "sans-serif"
+		font_size = cls.parse_font_size(style.get("font-size"))
+		weight = cls.parse_font_weight(style.get("font-weight"))
+		italic = (style.get("font-style") or "normal").strip().lower() in ("italic", "oblique")
+		return cls.get(font_family = font_family, font_size = font_size, weight = weight, italic = italic, inventory = inventory)
+
+	def __str__(self):
+		return f"FontMetrics<{self._font.family_name if (self._font is not None) else 'fallback'}, {self._font_size}px>"
@@ -0,0 +1,203 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import time
+import queue
+import shutil
+import logging
+import tempfile
+import selectors
+import subprocess
+import concurrent.futures
+from .RenderCache import RenderCache
+from .Exceptions import SVGRenderException, SVGLibUsageException
+
+_log = logging.getLogger(__spec__.name)
+
+class InkscapeWorkerCrashedException(SVGRenderException): pass
+
+class InkscapePipeWorker():
+	# Starts one Inkscape process per export, but streams the document
+	# through stdin so that no temporary file is needed.
+	def __init__(self, inkscape_binary: str = "inkscape", timeout: float = 60):
+		self._inkscape_binary = inkscape_binary
+		self._timeout = timeout
+
+	def export(self, svg_data: bytes, output_filename: str):
+		try:
+			subprocess.run([ self._inkscape_binary, "--pipe", f"--export-filename={output_filename}" ], input = svg_data, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, timeout = self._timeout, check = True)
+		except subprocess.TimeoutExpired as e:
+			raise SVGRenderException(f"Inkscape timed out after {self._timeout} seconds exporting {output_filename}.") from e
+		except subprocess.CalledProcessError as e:
+			raise SVGRenderException(f"Inkscape failed with status {e.returncode} exporting {output_filename}.") from e
+
+	def stop(self):
+		pass
+
+class InkscapeShellWorker():
+	# Keeps one "inkscape --shell" process alive and sends it export
+	# commands. The process is (re-)started on demand, so a crashed or hung
+	# Inkscape is replaced by a fresh one for the next job.
+	_PROMPT = b"> "
+	_STARTUP_TIMEOUT = 60
+
+	def __init__(self, inkscape_binary: str = "inkscape", timeout: float = 60):
+		self._inkscape_binary = inkscape_binary
+		self._timeout = timeout
+		self._process = None
+		self._tempdir = tempfile.mkdtemp(prefix = "pysvgedit_inkscape_")
+		self._export_count = 0
+
+	@property
+	def export_count(self):
+		return self._export_count
+
+	def _start(self):
+		_log.debug("Starting Inkscape shell worker: %s", self._inkscape_binary)
+		self._process = subprocess.Popen([ self._inkscape_binary, "--shell" ], stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL)
+		self._read_until_prompt(self._STARTUP_TIMEOUT)
+
+	def _kill(self):
+		if self._process is not None:
+			self._process.kill()
+			self._process.wait()
+			self._process = None
+
+	def _read_until_prompt(self, timeout):
+		output = bytearray()
+		end_time = time.monotonic() + timeout
+		with selectors.DefaultSelector() as selector:
+			selector.register(self._process.stdout, selectors.EVENT_READ)
+			while not output.endswith(self._PROMPT):
+				remaining = end_time - time.monotonic()
+				if (remaining <= 0) or (len(selector.select(remaining)) == 0):
+					self._kill()
+					raise SVGRenderException(f"Inkscape shell did not respond within {timeout} seconds.")
+				chunk = os.read(self._process.stdout.fileno(), 4096)
+				if len(chunk) == 0:
+					self._kill()
+					raise InkscapeWorkerCrashedException("Inkscape shell process terminated unexpectedly.")
+				output += chunk
+		return bytes(output[:-len(self._PROMPT)])
+
+	def _execute(self, command: str):
+		if self._process is None:
+			self._start()
+		try:
+			self._process.stdin.write(command.encode("utf-8") + b"\n")
+			self._process.stdin.flush()
+		except BrokenPipeError as e:
+			self._kill()
+			raise InkscapeWorkerCrashedException("Inkscape shell process terminated unexpectedly.") from e
+		return self._read_until_prompt(self._timeout)
+
+	def export(self, svg_data: bytes, output_filename: str):
+		output_filename = os.path.abspath(output_filename)
+		if any(char in output_filename for char in ";\n"):
+			raise SVGLibUsageException(f"Output filename cannot be passed to the Inkscape shell: {output_filename}")
+		input_filename = os.path.join(self._tempdir, "input.svg")
+		with open(input_filename, "wb") as f:
+			f.write(svg_data)
+
+		self._execute(f"file-open:{input_filename}; export-filename:{output_filename}; export-do; file-close")
+		if not os.path.exists(output_filename):
+			raise SVGRenderException(f"Inkscape did not produce output file {output_filename}.")
+		self._export_count += 1
+
+	def stop(self):
+		if self._process is not None:
+			try:
+				self._process.stdin.write(b"quit\n")
+				self._process.stdin.close()
+				self._process.wait(timeout = 5)
+			except (BrokenPipeError, subprocess.TimeoutExpired):
+				pass
+			self._kill()
+		shutil.rmtree(self._tempdir, ignore_errors = True)
+
+class InkscapeRenderer():
+	# Dispatches export jobs (SVG data -> PDF/PNG/... file) across a number of
+	# long-lived Inkscape workers. Jobs whose worker crashed are retried once
+	# on a restarted worker.
+	_WORKER_CLASSES = {
+		"shell":	InkscapeShellWorker,
+		"pipe":		InkscapePipeWorker,
+	}
+
+	def __init__(self, worker_count: int = 1, inkscape_binary: str = "inkscape", timeout: float = 60, mode: str = "shell", retries: int = 1, render_cache: RenderCache | None = None):
+		if mode not in self._WORKER_CLASSES:
+			raise SVGLibUsageException(f"Inkscape renderer mode must be one of {', '.join(sorted(self._WORKER_CLASSES))}, but was: {mode}")
+		self._retries = retries
+		self._render_cache = render_cache
+		self._workers = [ self._WORKER_CLASSES[mode](inkscape_binary = inkscape_binary, timeout = timeout) for _ in range(worker_count) ]
+		self._idle_workers = queue.Queue()
+		for worker in self._workers:
+			self._idle_workers.put(worker)
+		self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = worker_count, thread_name_prefix = "inkscape")
+
+	@property
+	def render_cache(self):
+		return self._render_cache
+
+	def _export(self, svg_data: bytes, output_filename: str):
+		# The output may be a hardlink into the render cache, so it is
+		# replaced instead of being overwritten in place.
+		if os.path.exists(output_filename):
+			os.unlink(output_filename)
+		worker = self._idle_workers.get()
+		try:
+			for attempt in range(self._retries + 1):
+				try:
+					worker.export(svg_data, output_filename)
+					return
+				except InkscapeWorkerCrashedException:
+					if attempt == self._retries:
+						raise
+					_log.warning("Inkscape worker crashed while exporting %s, retrying.", output_filename)
+		finally:
+			self._idle_workers.put(worker)
+
+	def render(self, svg_data: bytes, output_filename: str):
+		if self._render_cache is None:
+			self._export(svg_data, output_filename)
+		else:
+			self._render_cache.render(svg_data, output_filename, self._export)
+		return output_filename
+
+	def submit(self, svg_data: bytes, output_filename: str):
+		return self._executor.submit(self.render, svg_data, output_filename)
+
+	def render_many(self, jobs):
+		# Jobs are (svg_data, output_filename) tuples; returns the output
+		# filenames in the order of the jobs.
+		futures = [ self.submit(svg_data, output_filename) for (svg_data, output_filename) in jobs ]
+		return [ future.result() for future in futures ]
+
+	def close(self):
+		self._executor.shutdown(wait = True)
+		for worker in self._workers:
+			worker.stop()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,121 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import hashlib
+import functools
+import tempfile
+
+class MakoTemplateCache():
+	# Caches compiled Mako templates in-process by their source text. If a
+	# module directory is given, the compiled Python modules are also
+	# persisted there, keyed by a hash of the template source and compiler
+	# options, so that later processes do not need to recompile either.
+	def __init__(self, module_directory: str | None = None, strict_undefined: bool = True):
+		# Mako is only required when templates are actually rendered
+		import mako.template
+		import mako.lexer
+		import mako.parsetree
+		self._mako_template = mako.template
+		self._mako_lexer = mako.lexer
+		self._mako_parsetree = mako.parsetree
+		self._module_directory = module_directory
+		self._strict_undefined = strict_undefined
+		self._templates = { }
+		self._referenced_variables = { }
+		if self._module_directory is not None:
+			os.makedirs(self._module_directory, exist_ok = True)
+
+	@property
+	def module_directory(self):
+		return self._module_directory
+
+	def cache_key(self, text: str):
+		options = f"strict_undefined={self._strict_undefined}\n"
+		return hashlib.sha256((options + text).encode("utf-8")).hexdigest()
+
+	def _write_template_source(self, filename: str, text: str):
+		# Write atomically so that concurrent processes never see a partially
+		# written template.
+		(fd, tmp_filename) = tempfile.mkstemp(dir = self._module_directory, prefix = ".tmp_", suffix = ".mako")
+		try:
+			with os.fdopen(fd, "w", encoding = "utf-8") as f:
+				f.write(text)
+			os.replace(tmp_filename, filename)
+		except:
+			os.unlink(tmp_filename)
+			raise
+
+	def _compile(self, text: str):
+		if self._module_directory is None:
+			return self._mako_template.Template(text, strict_undefined = self._strict_undefined)
+
+		uri = f"{self.cache_key(text)}.mako"
+		template_filename = os.path.join(self._module_directory, uri)
+		if not os.path.isfile(template_filename):
+			self._write_template_source(template_filename, text)
+		# Mako only recompiles the module if it is missing or older than the
+		# template source file.
+		return self._mako_template.Template(filename = template_filename, module_directory = self._module_directory, uri = uri, input_encoding = "utf-8", strict_undefined = self._strict_undefined)
+
+	def get(self, text: str):
+		template = self._templates.get(text)
+		if template is None:
+			template = self._compile(text)
+			self._templates[text] = template
+		return template
+
+	def _analyze_referenced_variables(self, text: str):
+		# Over-approximates by considering all undeclared identifiers of all
+		# nodes in the parse tree. Templates that may access arbitrary
+		# variables (through the context, includes or inheritance) return
+		# None, meaning they depend on everything.
+		try:
+			parse_tree = self._mako_lexer.Lexer(text).parse()
+		except Exception:
+			return None
+		identifiers = set()
+		nodes = [ parse_tree ]
+		while len(nodes) > 0:
+			node = nodes.pop()
+			if isinstance(node, (self._mako_parsetree.IncludeTag, self._mako_parsetree.InheritTag, self._mako_parsetree.NamespaceTag)):
+				return None
+			if hasattr(node, "undeclared_identifiers"):
+				identifiers |= set(node.undeclared_identifiers())
+			nodes += node.get_children()
+		if len(identifiers & set([ "context", "pageargs", "capture", "caller", "self", "local", "parent", "next" ])) > 0:
+			return None
+		return frozenset(identifiers)
+
+	def referenced_variables(self, text: str):
+		if text not in self._referenced_variables:
+			self._referenced_variables[text] = self._analyze_referenced_variables(text)
+		return self._referenced_variables[text]
+
+	def render(self, text: str, **template_data):
+		return self.get(text).render(**template_data)
+
+	def __len__(self):
+		return len(self._templates)
+
+	@classmethod
+	@functools.cache
+	def default(cls):
+		return cls()
@@ -0,0 +1,98 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+class NumberFormatter():
+	# Formats numbers for SVG output with a fixed number of decimal places.
+	# Trailing zeros (and optionally the leading zero of values between -1
+	# and 1) are removed, so that 12.300000000000001 becomes "12.3", 10.0
+	# becomes "10" and, with strip_leading_zero, 0.5 becomes ".5".
+	_DEFAULT = None
+
+	# Above this magnitude, floats are no longer exact integers
+	_INTEGER_LIMIT = 2 ** 53
+
+	def __init__(self, precision: int = 6, strip_leading_zero: bool = False):
+		self._precision = precision
+		self._strip_leading_zero = strip_leading_zero
+		self._format_spec = f".{precision}f"
+
+	@property
+	def precision(self):
+		return self._precision
+
+	@property
+	def strip_leading_zero(self):
+		return self._strip_leading_zero
+
+	@classmethod
+	def default(cls):
+		# Formatter used by all serializers
+		if cls._DEFAULT is None:
+			cls._DEFAULT = cls()
+		return cls._DEFAULT
+
+	@classmethod
+	def set_default(cls, formatter: "NumberFormatter"):
+		cls._DEFAULT = formatter
+
+	def format(self, value: float):
+		if isinstance(value, int):
+			return str(int(value))
+		if value.is_integer() and (-self._INTEGER_LIMIT < value < self._INTEGER_LIMIT):
+			return str(int(value))
+		text = format(value, self._format_spec)
+		if "." in text:
+			text = text.rstrip("0").rstrip(".")
+		if text == "-0":
+			return "0"
+		if self._strip_leading_zero:
+			if text.startswith("0."):
+				text = text[1:]
+			elif text.startswith("-0."):
+				text = "-" + text[2:]
+		return text
+
+	def format_vector(self, vector, separator: str = " "):
+		return f"{self.format(vector.x)}{separator}{self.format(vector.y)}"
+
+	def join(self, values, separator: str = " "):
+		return separator.join(self.format(value) for value in values)
+
+	def format_array(self, values):
+		# Formats all values of a NumPy array (of any shape) and returns the
+		# flat list of strings. This is a convenience, not a batched
+		# operation: every value goes through format(), but the array is
+		# converted to Python floats at once to avoid the overhead of NumPy
+		# scalars per element.
+		import numpy
+		return list(map(self.format, numpy.asarray(values, dtype = float).ravel().tolist()))
+
+	def path_data(self, points, closed: bool = False):
+		# Formats a NumPy array of shape (n, 2) as a polyline path, e.g.
+		# "M 0 0 L 10 0 10 10 z".
+		text = self.format_array(points)
+		if len(text) == 0:
+			return ""
+		path = f"M {text[0]} {text[1]}"
+		if len(text) > 2:
+			path += " L " + " ".join(text[2:])
+		if closed:
+			path += " z"
+		return path
@@ -0,0 +1,147 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+
+class RenderCache():
+	# Content-addressed store of exported artifacts (PDF, PNG, ...), keyed by
+	# the hash of the serialized SVG data and the export options. Entries
+	# are handed out as hardlinks where possible, so outputs must be
+	# replaced, not modified in place. Least recently used entries are
+	# evicted when the cache grows beyond max_size bytes.
+	_CACHE_VERSION = b"pysvgedit-render-cache-1"
+
+	def __init__(self, cache_dir: str, max_size: int = 1024 * 1024 * 1024, hardlink: bool = True):
+		self._cache_dir = cache_dir
+		self._max_size = max_size
+		self._hardlink = hardlink
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+		os.makedirs(self._cache_dir, exist_ok = True)
+		self._size = sum(size for (filename, size, mtime) in self._entries())
+
+	@property
+	def hits(self):
+		return self._hits
+
+	@property
+	def misses(self):
+		return self._misses
+
+	@property
+	def stats(self):
+		return { "hits": self._hits, "misses": self._misses, "size": self._size }
+
+	@classmethod
+	def key(cls, svg_data: bytes, output_filename: str, options: tuple = ()):
+		# The export format is determined by the output file extension.
+		hashval = hashlib.sha256()
+		hashval.update(cls._CACHE_VERSION + b"\x00")
+		hashval.update(os.path.splitext(output_filename)[1].lower().encode("utf-8") + b"\x00")
+		hashval.update(repr(options).encode("utf-8") + b"\x00")
+		hashval.update(svg_data)
+		return hashval.hexdigest()
+
+	def _entry_filename(self, key: str, output_filename: str):
+		extension = os.path.splitext(output_filename)[1].lower()
+		return os.path.join(self._cache_dir, key[:2], key + extension)
+
+	def _entries(self):
+		for subdir in os.scandir(self._cache_dir):
+			if not subdir.is_dir():
+				continue
+			for entry in os.scandir(subdir.path):
+				try:
+					stat = entry.stat()
+				except FileNotFoundError:
+					continue
+				if not entry.name.startswith("."):
+					yield (entry.path, stat.st_size, stat.st_mtime_ns)
+
+	def _link_or_copy(self, src: str, dst: str):
+		# Places a copy of src at dst atomically.
+		(fd, tmp_filename) = tempfile.mkstemp(prefix = ".tmp_", dir = os.path.dirname(dst) or ".")
+		os.close(fd)
+		try:
+			if self._hardlink:
+				try:
+					os.unlink(tmp_filename)
+					os.link(src, tmp_filename)
+				except OSError:
+					shutil.copyfile(src, tmp_filename)
+			else:
+				shutil.copyfile(src, tmp_filename)
+			os.replace(tmp_filename, dst)
+		finally:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+
+	def fetch(self, key: str, output_filename: str):
+		entry_filename = self._entry_filename(key, output_filename)
+		try:
+			os.utime(entry_filename)
+			self._link_or_copy(entry_filename, output_filename)
+		except FileNotFoundError:
+			with self._lock:
+				self._misses += 1
+			return False
+		with self._lock:
+			self._hits += 1
+		return True
+
+	def store(self, key: str, output_filename: str):
+		entry_filename = self._entry_filename(key, output_filename)
+		os.makedirs(os.path.dirname(entry_filename), exist_ok = True)
+		self._link_or_copy(output_filename, entry_filename)
+		with self._lock:
+			self._size += os.stat(entry_filename).st_size
+			if self._size > self._max_size:
+				self._evict()
+
+	def _evict(self):
+		# Other processes may share the cache directory, therefore the
+		# directory is the source of truth and not the tracked size.
+		entries = sorted(self._entries(), key = lambda entry: entry[2])
+		self._size = sum(size for (filename, size, mtime) in entries)
+		target_size = self._max_size * 9 // 10
+		for (filename, size, mtime) in entries:
+			if self._size <= target_size:
+				break
+			try:
+				os.unlink(filename)
+			except FileNotFoundError:
+				pass
+			self._size -= size
+
+	def render(self, svg_data: bytes, output_filename: str, render_callback, options: tuple = ()):
+		# Returns True if the output was served from the cache; otherwise,
+		# render_callback(svg_data, output_filename) produces it and the
+		# result is stored.
+		key = self.key(svg_data, output_filename, options)
+		if self.fetch(key, output_filename):
+			return True
+		render_callback(svg_data, output_filename)
+		self.store(key, output_filename)
+		return False
@@ -40,6 +40,15 @@ class SVGAnimation():
 	def __init__(self, svg_document, animation_mode: SVGAnimationMode = SVGAnimationMode.Compose):
 		self._svg_document = svg_document
 		self._animation_mode = animation_mode
+		self._current_bitset = None
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	@property
+	def animation_mode(self):
+		return self._animation_mode
 
 	@functools.cached_property
 	def all_layers(self):
@@ -63,7 +72,8 @@ class SVGAnimation():
 
 	@property
 	def visible_layers(self):
-		return [ layer for layer in self.all_layers if layer.style.is_visible ]
+		resolver = self._svg_document.style_resolver
+		return [ layer for layer in self.all_layers if resolver.is_displayed(layer.node) ]
 
 	def _get_layer_tags(self, layer):
 		layer_tags = set()
@@ -119,8 +129,54 @@ class SVGAnimation():
 				yield svg_transforms
 			previous_layer = layer
 
-	def __iter__(self):
+	@functools.cached_property
+	def frame_bitsets(self):
+		# Visibility of the considered layers in every emitted frame, bit i
+		# corresponds to considered_layers[i]
+		layer_index = { layer.svgid: index for (index, layer) in enumerate(self.considered_layers) }
+		bitsets = [ ]
+		bitset = 0
+		applied_count = 0
 		for transformations in self._generate_layer_transformations():
-			for transformation in transformations:
-				transformation.apply()
-			yield self._svg_document
+			# The transformation list only ever grows between frames
+			for transformation in transformations[applied_count:]:
+				bit = 1 << layer_index[transformation.svg_object.svgid]
+				if transformation.visible:
+					bitset |= bit
+				else:
+					bitset &= ~bit
+			applied_count = len(transformations)
+			bitsets.append(bitset)
+		return bitsets
+
+	@property
+	def frame_count(self):
+		return len(self.frame_bitsets)
+
+	def frame(self, frameno: int):
+		# Puts the document into the state of frame number frameno (starting
+		# at zero) and returns it. Only layers whose visibility differs from
+		# the previously set frame are touched, the document must therefore
+		# not be modified in between.
+		bitset = self.frame_bitsets[frameno]
+		if self._current_bitset is None:
+			changed = (1 << len(self.considered_layers)) - 1
+		else:
+			changed = bitset ^ self._current_bitset
+		while changed != 0:
+			lowest_bit = changed & -changed
+			layer = self.considered_layers[lowest_bit.bit_length() - 1]
+			if bitset & lowest_bit:
+				layer.style.show()
+			else:
+				layer.style.hide()
+			changed ^= lowest_bit
+		self._current_bitset = bitset
+		return self._svg_document
+
+	def __len__(self):
+		return self.frame_count
+
+	def __iter__(self):
+		for frameno in range(self.frame_count):
+			yield self.frame(frameno)
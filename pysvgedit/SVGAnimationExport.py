@@ -0,0 +1,190 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import enum
+from .SVGAnimation import SVGAnimation
+from .SVGDefs import SVGDefs
+from .SVGGroup import SVGGroup
+from .SVGStyleSheet import SVGStyleSheet
+from .XMLTools import XMLTools
+from .NumberFormatter import NumberFormatter
+
+class SVGAnimationExportFormat(enum.Enum):
+	CSS = "css"						# One SVG, layers driven by CSS keyframes
+	SMIL = "smil"					# One SVG, layers driven by SMIL <animate>
+	MultiPage = "multipage"			# Inkscape multi-page document, one page per frame
+
+class SVGAnimationExport():
+	# Writes all frames of an animation into a single document, so that the
+	# output size depends on the unique content and not on the number of
+	# frames. The source document is not modified, all exports work on a
+	# copy of it.
+	_NON_RENDERED_TAGS = set([ "defs", "sodipodi:namedview", "metadata", "title", "desc", "style", "script" ])
+
+	def __init__(self, animation: SVGAnimation, frame_duration: float = 1, loop: bool = True, page_gap: float = 0):
+		self._animation = animation
+		self._frame_duration = frame_duration
+		self._loop = loop
+		self._page_gap = page_gap
+
+	@property
+	def total_duration(self):
+		return self._frame_duration * self._animation.frame_count
+
+	def _copy(self):
+		# Returns a copy of the document that shows the first frame (which is
+		# what viewers without animation support display) and its layers,
+		# which are in the same order as the considered layers of the source
+		# animation.
+		svg_document = self._animation.svg_document.clone()
+		animation = SVGAnimation(svg_document, animation_mode = self._animation.animation_mode)
+		if animation.frame_count > 0:
+			animation.frame(0)
+		return (svg_document, animation.considered_layers)
+
+	def _visibility_changes(self, layer_index: int):
+		# Returns (frameno, visible) tuples for every frame at which the
+		# visibility of the layer changes, including the first frame.
+		changes = [ ]
+		for (frameno, bitset) in enumerate(self._animation.frame_bitsets):
+			visible = ((bitset >> layer_index) & 1) == 1
+			if (len(changes) == 0) or (changes[-1][1] != visible):
+				changes.append((frameno, visible))
+		return changes
+
+	def _animated_layers(self, layers):
+		for (layer_index, layer) in enumerate(layers):
+			changes = self._visibility_changes(layer_index)
+			if len(changes) > 1:
+				yield (layer_index, layer, changes)
+
+	@staticmethod
+	def _fmt(value: float):
+		return NumberFormatter.default().format(value)
+
+	def _key_time(self, frameno: int):
+		return frameno / self._animation.frame_count
+
+	def css(self):
+		# Animates the opacity, which unlike display is animatable in every
+		# browser; CSS animations take precedence over the inline styles.
+		(svg_document, layers) = self._copy()
+		playback = "infinite" if self._loop else "1 forwards"
+		css = [ ]
+		for (layer_index, layer, changes) in self._animated_layers(layers):
+			style = layer.style
+			opacity = style["opacity"] or "1"
+			visible_initially = style.is_visible
+			style.show()
+			style["opacity"] = opacity if visible_initially else "0"
+
+			name = f"pysvgedit-layer{layer_index}"
+			layer.css_classes = layer.css_classes + [ name ]
+			# The last frame is repeated at 100%, otherwise the end of the
+			# animation would fall back to the inline style.
+			keyframes = [ (100 * self._key_time(frameno), visible) for (frameno, visible) in changes ] + [ (100, changes[-1][1]) ]
+			keyframes = " ".join(f"{self._fmt(percent)}% {{ opacity: {opacity if visible else 0} }}" for (percent, visible) in keyframes)
+			css.append(f"@keyframes {name} {{ {keyframes} }}")
+			css.append(f".{name} {{ animation: {name} {self._fmt(self.total_duration)}s step-end {playback}; }}")
+
+		stylesheet = svg_document.defs.add(SVGStyleSheet.new())
+		stylesheet.css_text = "\n".join(css) + "\n"
+		return svg_document
+
+	def smil(self):
+		(svg_document, layers) = self._copy()
+		for (layer_index, layer, changes) in self._animated_layers(layers):
+			animate = svg_document.node.ownerDocument.createElement("animate")
+			animate.setAttribute("attributeName", "display")
+			animate.setAttribute("calcMode", "discrete")
+			animate.setAttribute("dur", f"{self._fmt(self.total_duration)}s")
+			animate.setAttribute("values", ";".join("inline" if visible else "none" for (frameno, visible) in changes))
+			animate.setAttribute("keyTimes", ";".join(self._fmt(self._key_time(frameno)) for (frameno, visible) in changes))
+			if self._loop:
+				animate.setAttribute("repeatCount", "indefinite")
+			else:
+				animate.setAttribute("fill", "freeze")
+			layer.node.insertBefore(animate, layer.node.firstChild)
+		return svg_document
+
+	@staticmethod
+	def _page_box(svg_document):
+		if svg_document.node.hasAttribute("viewBox"):
+			return [ float(value) for value in svg_document.node.getAttribute("viewBox").replace(",", " ").split() ]
+		else:
+			extents = svg_document.extents
+			return [ 0, 0, extents.x, extents.y ]
+
+	def multipage(self):
+		# The rendered content is moved into <defs> once and every page
+		# references the parts that are visible in its frame through <use>.
+		(svg_document, layers) = self._copy()
+		root = svg_document.node
+		owner_document = root.ownerDocument
+		for (nsname, nsvalue) in svg_document._NAMESPACES.items():
+			if not root.hasAttribute(f"xmlns:{nsname}"):
+				root.setAttribute(f"xmlns:{nsname}", nsvalue)
+
+		layer_index = { layer.node: index for (index, layer) in enumerate(layers) }
+		for layer in layers:
+			layer.style.show()
+		content = [ node for node in XMLTools.find_all_elements(root) if node.tagName not in self._NON_RENDERED_TAGS ]
+		content_defs = svg_document.add(SVGDefs.new())
+		for node in content:
+			if not node.hasAttribute("id"):
+				node.setAttribute("id", svg_document.get_unused_id())
+			content_defs.node.appendChild(node)
+
+		try:
+			namedview = XMLTools.find_first_element(root, "sodipodi:namedview")
+		except StopIteration:
+			namedview = owner_document.createElement("sodipodi:namedview")
+			root.insertBefore(namedview, root.firstChild)
+		for page in list(XMLTools.find_all_elements(namedview, "inkscape:page")):
+			namedview.removeChild(page)
+
+		(x, y, width, height) = self._page_box(svg_document)
+		for (frameno, bitset) in enumerate(self._animation.frame_bitsets):
+			offset = frameno * (width + self._page_gap)
+			page = owner_document.createElement("inkscape:page")
+			page.setAttribute("id", svg_document.get_unused_id())
+			page.setAttribute("x", self._fmt(x + offset))
+			page.setAttribute("y", self._fmt(y))
+			page.setAttribute("width", self._fmt(width))
+			page.setAttribute("height", self._fmt(height))
+			namedview.appendChild(page)
+
+			group = svg_document.add(SVGGroup.new())
+			if offset != 0:
+				group.node.setAttribute("transform", f"translate({self._fmt(offset)},0)")
+			for node in content:
+				if (node in layer_index) and (((bitset >> layer_index[node]) & 1) == 0):
+					continue
+				use = owner_document.createElement("use")
+				use.setAttribute("xlink:href", f"#{node.getAttribute('id')}")
+				group.node.appendChild(use)
+		return svg_document
+
+	def export(self, export_format: SVGAnimationExportFormat):
+		return {
+			SVGAnimationExportFormat.CSS:		self.css,
+			SVGAnimationExportFormat.SMIL:		self.smil,
+			SVGAnimationExportFormat.MultiPage:	self.multipage,
+		}[export_format]()
@@ -21,6 +21,7 @@
 import math
 from .SVGObject import SVGObject, SVGXYObject, SVGStyleObject
 from .Vector2D import Vector2D
+from .NumberFormatter import NumberFormatter
 
 @SVGObject.register
 class SVGCircle(SVGObject, SVGXYObject, SVGStyleObject):
@@ -34,7 +35,8 @@ class SVGCircle(SVGObject, SVGXYObject, SVGStyleObject):
 
 	@radius.setter
 	def radius(self, value):
-		self.node.setAttribute("r", str(float(value)))
+		self.node.setAttribute("r", NumberFormatter.default().format(float(value)))
+		self._geometry_changed()
 
 	def hull_vertices(self, max_interpolation_count = 100):
 		pos = self.pos
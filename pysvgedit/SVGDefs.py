@@ -30,11 +30,8 @@ class SVGDefs(SVGObject):
 		return cls(cls._new_element())
 
 	def get(self, shape_spec):
-		if (shape_spec is not None) and shape_spec.startswith("url(#") and shape_spec.endswith(")"):
-			shape_id = shape_spec[5 : -1]
-			try:
-				node = XMLTools.find_first_element(self.node, constraint = lambda node: node.getAttribute("id") == shape_id)
-			except StopIteration:
-				return None
-			return SVGObject.attempt_handle(node)
-		return None
+		element_id = self.svg_document.reference_graph.parse_url(shape_spec)
+		node = None if (element_id is None) else self.svg_document.get_element_by_id(element_id)
+		if (node is None) or (self.node not in XMLTools.all_parent_elements(node)):
+			return None
+		return SVGObject.attempt_handle(node)
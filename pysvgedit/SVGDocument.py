@@ -22,7 +22,13 @@ import functools
 import xml.dom.minidom
 from .SVGObject import SVGObject, SVGWidthHeightObject
 from .SVGDefs import SVGDefs
+from .SVGStyleDeduplication import SVGStyleDeduplication
+from .SVGInstancing import SVGInstancing
+from .SVGStyleResolver import SVGStyleResolver
+from .SVGReferenceGraph import SVGReferenceGraph
+from .SVGOptimizer import SVGOptimizer
 from .XMLTools import XMLTools
+from .Exceptions import SVGInputFileException
 
 class SVGDocument(SVGObject, SVGWidthHeightObject):
 	_TAG_NAME = "svg"
@@ -50,6 +56,7 @@ class SVGDocument(SVGObject, SVGWidthHeightObject):
 			if attempt_id not in self._used_ids:
 				self._used_ids.add(attempt_id)
 				return attempt_id
+			ctr += 1
 
 	@functools.cached_property
 	def defs(self):
@@ -58,6 +65,72 @@ class SVGDocument(SVGObject, SVGWidthHeightObject):
 		except StopIteration:
 			return self.add(SVGDefs.new())
 
+	@functools.cached_property
+	def style_resolver(self):
+		return SVGStyleResolver(self)
+
+	def invalidate_style(self, node):
+		# Only notify the resolver if it was actually instanciated.
+		if "style_resolver" in self.__dict__:
+			self.style_resolver.invalidate(node)
+
+	@functools.cached_property
+	def reference_graph(self):
+		return SVGReferenceGraph(self)
+
+	@functools.cached_property
+	def instance_extents(self):
+		# Extents of the content referenced by <use> elements, see SVGUse.
+		# Dropped together with the reference graph.
+		return { }
+
+	def invalidate_references(self):
+		self.__dict__.pop("reference_graph", None)
+		self.__dict__.pop("instance_extents", None)
+
+	# Modifications through the object model update an instanciated reference
+	# graph incrementally instead of discarding it.
+	def references_added(self, node):
+		if "reference_graph" in self.__dict__:
+			self.reference_graph.add_subtree(node)
+		self.invalidate_instance_extents()
+
+	def references_removed(self, node):
+		# Called before the node is removed from the document
+		if "reference_graph" in self.__dict__:
+			self.reference_graph.remove_subtree(node)
+		self.invalidate_instance_extents()
+
+	def id_changed(self, node, old_id: str | None):
+		if "reference_graph" in self.__dict__:
+			self.reference_graph.change_id(node, old_id)
+		self.invalidate_instance_extents()
+
+	def references_changed(self, node):
+		if "reference_graph" in self.__dict__:
+			self.reference_graph.update_references(node)
+		self.invalidate_instance_extents()
+
+	def invalidate_instance_extents(self):
+		# Geometry changed somewhere, possibly within content that is
+		# referenced by <use> elements.
+		self.__dict__.pop("instance_extents", None)
+
+	def gc_defs(self):
+		# Removes all definitions that are not referenced (directly or
+		# indirectly) by any content, e.g., text flow rectangles of deleted
+		# text or unused gradients. Returns the number of removed elements.
+		# This is a full pass anyways, so the reference graph is rebuilt
+		# to also catch direct DOM modifications.
+		self.invalidate_references()
+		removed = list(self.reference_graph.unreachable_definitions())
+		for node in removed:
+			node.parentNode.removeChild(node)
+			node.unlink()
+		if len(removed) > 0:
+			self.invalidate_references()
+		return len(removed)
+
 	@classmethod
 	def new(cls):
 		doc = xml.dom.minidom.Document()
@@ -69,38 +142,69 @@ class SVGDocument(SVGObject, SVGWidthHeightObject):
 		return cls(svg_node = root)
 
 	@classmethod
-	def frombytes(cls, bytes_data):
-		doc = xml.dom.minidom.parseString(bytes_data)
-		root = XMLTools.find_first_element(doc, "svg")
+	def _fromdom(cls, doc):
+		try:
+			root = XMLTools.find_first_element(doc, "svg")
+		except StopIteration:
+			raise SVGInputFileException("XML document does not have a <svg> root element.")
 		return cls(root)
 
+	@classmethod
+	def frombytes(cls, bytes_data):
+		return cls._fromdom(xml.dom.minidom.parseString(bytes_data))
+
 	@classmethod
 	def read(cls, f):
-		doc = xml.dom.minidom.parse(f)
-		root = XMLTools.find_first_element(doc, "svg")
-		return cls(root)
+		return cls._fromdom(xml.dom.minidom.parse(f))
 
 	@classmethod
 	def readfile(cls, filename):
 		with open(filename, "rb") as f:
 			return cls.read(f)
 
+	def clone(self):
+		# Deep copy of the whole DOM, much cheaper than parsing again.
+		doc = self.node.ownerDocument.cloneNode(True)
+		return self.__class__(XMLTools.find_first_element(doc, "svg"))
+
 	def asbytes(self):
 		return self.node.ownerDocument.toxml(encoding = "utf-8")
 
-	def write(self, f):
-		self.node.ownerDocument.writexml(f)
+	def write(self, f, optimizer: SVGOptimizer | None = None):
+		# With an optimizer, the minified document is streamed out without
+		# modifying the document itself.
+		if optimizer is None:
+			self.node.ownerDocument.writexml(f)
+		else:
+			optimizer.write(f)
 
-	def writefile(self, filename):
+	def writefile(self, filename, optimizer: SVGOptimizer | None = None):
 		with open(filename, "w") as f:
-			self.write(f)
+			self.write(f, optimizer = optimizer)
+
+	def optimize(self, precision: int = 3, strip_metadata: bool = True, strip_defaults: bool = True, collapse_groups: bool = True, gc_defs: bool = True):
+		SVGOptimizer(self, precision = precision, strip_metadata = strip_metadata, strip_defaults = strip_defaults, collapse_groups = collapse_groups, gc_defs = gc_defs).optimize()
+		return self
+
+	def deduplicate_styles(self, threshold = 2):
+		return SVGStyleDeduplication(self, threshold = threshold).extract()
+
+	def inline_styles(self):
+		return SVGStyleDeduplication(self).inline()
+
+	def instance_repeated_subtrees(self, threshold = 2, min_elements = 2, discard_ids = False):
+		return SVGInstancing(self, threshold = threshold, min_elements = min_elements, discard_ids = discard_ids).instance()
+
+	def contains(self, node):
+		return any(element is self.node for element in XMLTools.all_parent_elements(node))
 
 	def get_element_by_id(self, element_id):
-		constraint = lambda node: node.getAttribute("id") == element_id
-		try:
-			return next(XMLTools.walk_elements(self.node, constraint = constraint))
-		except StopIteration:
-			return None
+		node = self.reference_graph.resolve(element_id)
+		if (node is not None) and (not self.contains(node)):
+			# Removed by a direct DOM modification, the graph is stale
+			self.invalidate_references()
+			node = self.reference_graph.resolve(element_id)
+		return node
 
 	def __str__(self):
 		return f"SVGDocument<{self.extents.x:.0f} x {self.extents.y:.0f}>"
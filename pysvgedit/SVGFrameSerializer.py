@@ -0,0 +1,155 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import io
+import hashlib
+import functools
+from .SVGStyle import SVGStyle
+
+class SVGFrameSerializer():
+	# Produces the serialized frames of an SVGAnimation without serializing
+	# the document again for every frame: the document is serialized once
+	# into fragments, split at the start tags of the considered layers. For
+	# every layer, the start tag is serialized once in its visible and once
+	# in its hidden state. A frame is then the concatenation of the cached
+	# fragments. The document must not be modified after the fragments
+	# were created.
+	def __init__(self, animation):
+		self._animation = animation
+
+	@property
+	def animation(self):
+		return self._animation
+
+	@functools.cached_property
+	def _layer_start_tags(self):
+		start_tags = [ ]
+		for layer in self._animation.considered_layers:
+			# Render the start tags from a shallow copy so the document is
+			# left untouched
+			node = layer.node.cloneNode(False)
+			style = SVGStyle.from_node(node, auto_sync = True)
+			style.hide()
+			hidden = self._encode(self._start_tag(node, has_children = layer.node.hasChildNodes()))
+			style.show()
+			visible = self._encode(self._start_tag(node, has_children = layer.node.hasChildNodes()))
+			start_tags.append((hidden, visible))
+		return start_tags
+
+	@staticmethod
+	def _encode(text: str):
+		return text.encode("utf-8", errors = "xmlcharrefreplace")
+
+	@staticmethod
+	def _start_tag(node, has_children: bool):
+		tag = node.cloneNode(False).toxml()
+		if has_children:
+			tag = tag[:-2] + ">"
+		return tag
+
+	@functools.cached_property
+	def _segments(self):
+		# List of (fragment, layer) tuples. A fragment is either a byte string
+		# or an integer i that stands for the start tag of
+		# considered_layers[i]. For byte strings, layer is the index of the
+		# layer whose content the fragment is, or None if it belongs to the
+		# rest of the document.
+		layer_index = { layer.node: index for (index, layer) in enumerate(self._animation.considered_layers) }
+		layer_ancestors = set()
+		for node in layer_index:
+			while node is not None:
+				layer_ancestors.add(node)
+				node = node.parentNode
+
+		segments = [ ]
+		buffer = io.StringIO()
+
+		def flush(layer):
+			if buffer.tell() > 0:
+				segments.append((self._encode(buffer.getvalue()), layer))
+				buffer.seek(0)
+				buffer.truncate()
+
+		def serialize(node, layer = None):
+			if node not in layer_ancestors:
+				node.writexml(buffer)
+				return
+			if node in layer_index:
+				flush(layer)
+				segments.append((layer_index[node], None))
+				for child in node.childNodes:
+					serialize(child, layer_index[node])
+				flush(layer_index[node])
+			else:
+				buffer.write(self._start_tag(node, has_children = True))
+				for child in node.childNodes:
+					serialize(child, layer)
+			if node.hasChildNodes():
+				buffer.write(f"</{node.tagName}>")
+
+		document = self._animation.svg_document.node.ownerDocument
+		buffer.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>")
+		for node in document.childNodes:
+			serialize(node)
+		flush(None)
+		return segments
+
+	def frame_fragments(self, frameno: int):
+		bitset = self._animation.frame_bitsets[frameno]
+		start_tags = self._layer_start_tags
+		for (fragment, layer) in self._segments:
+			if isinstance(fragment, int):
+				yield start_tags[fragment][(bitset >> fragment) & 1]
+			else:
+				yield fragment
+
+	@functools.cached_property
+	def _segment_digests(self):
+		digests = [ ]
+		for (fragment, layer) in self._segments:
+			if isinstance(fragment, int):
+				digests.append(tuple(hashlib.sha256(start_tag).digest() for start_tag in self._layer_start_tags[fragment]))
+			else:
+				digests.append(hashlib.sha256(fragment).digest())
+		return digests
+
+	def frame_digest(self, frameno: int, visible_only: bool = False):
+		# Hash of the frame computed from the hashes of its fragments, without
+		# serializing it. With visible_only, the content of hidden layers
+		# does not contribute, i.e., the hash only changes when the rendered
+		# appearance of the frame may have changed.
+		bitset = self._animation.frame_bitsets[frameno]
+		hashval = hashlib.sha256()
+		for ((fragment, layer), digest) in zip(self._segments, self._segment_digests):
+			if isinstance(fragment, int):
+				hashval.update(digest[(bitset >> fragment) & 1])
+			elif (not visible_only) or (layer is None) or ((bitset >> layer) & 1):
+				hashval.update(digest)
+		return hashval.hexdigest()
+
+	def frame_bytes(self, frameno: int):
+		return b"".join(self.frame_fragments(frameno))
+
+	def write_frame(self, frameno: int, f):
+		f.writelines(self.frame_fragments(frameno))
+
+	def write_frame_file(self, frameno: int, filename: str):
+		with open(filename, "wb") as f:
+			self.write_frame(frameno, f)
@@ -0,0 +1,172 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import hashlib
+import collections
+from .SVGSymbol import SVGSymbol
+from .SVGUse import SVGUse
+from .SVGStyleSheet import SVGStyleSheet
+from .SVGStyleResolver import SVGSelector
+from .XMLTools import XMLTools
+
+class SVGInstancing():
+	# Finds subtrees that occur at least "threshold" times and that only
+	# differ in their IDs and the "transform" of their root element. Every
+	# such subtree is hoisted once into a <symbol> inside the defs and all
+	# occurrences are replaced by <use> elements that keep the original
+	# transformation (and the ID of the subtree root). Since the content of
+	# a <use> inherits styles from the <use> element, the rendering does not
+	# change. Subtrees that contain IDs which are referenced somewhere
+	# (including stylesheet ID selectors) or layers are never instanced.
+	# IDs of elements below the subtree root cannot be retained since the
+	# <symbol> content is shared; such subtrees are only instanced if
+	# "discard_ids" is set, which removes these IDs from the document.
+	_XLINK_NAMESPACE = "http://www.w3.org/1999/xlink"
+	_INSTANCEABLE_TAGS = set([ "g", "a", "path", "rect", "circle", "ellipse", "line", "polyline", "polygon", "text", "image", "use" ])
+
+	# Content of these elements is either not rendered directly or its
+	# rendering depends on where it is located
+	_EXCLUDED_CONTAINERS = set([ "defs", "symbol", "clipPath", "mask", "pattern", "marker", "switch", "metadata", "sodipodi:namedview" ])
+	_NON_INSTANCEABLE_TAGS = set([ "style", "script" ])
+
+	# Whitespace in these elements is significant
+	_TEXT_CONTENT_TAGS = set([ "text", "tspan", "textPath", "flowRoot", "flowPara", "flowSpan", "title", "desc" ])
+
+	def __init__(self, svg_document, threshold: int = 2, min_elements: int = 2, discard_ids: bool = False):
+		self._svg_document = svg_document
+		self._threshold = threshold
+		self._min_elements = min_elements
+		self._discard_ids = discard_ids
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	def _protected_ids(self):
+		# Returns the IDs that must be retained, or None if the document
+		# cannot be instanced at all: selectors with combinators (or ones
+		# that are not understood) could match an element in its original
+		# place, but not anymore inside of the <symbol>.
+		protected_ids = self.svg_document.reference_graph.referenced_ids()
+		for stylesheet in self.svg_document.walk(SVGStyleSheet):
+			for rule in stylesheet.rules:
+				selector = SVGSelector.parse(rule.selector)
+				if (selector is None) or selector.has_combinators:
+					return None
+				if selector.subject.svgid is not None:
+					protected_ids.add(selector.subject.svgid)
+		return protected_ids
+
+	@classmethod
+	def _hash_field(cls, hasher, kind: bytes, value: str):
+		# Length-prefixed, so that concatenated fields are unambiguous
+		value = value.encode("utf-8")
+		hasher.update(kind + str(len(value)).encode() + b":" + value)
+
+	def _analyze(self, node, protected_ids, excluded, keys):
+		# Hashes the subtree bottom-up and returns a tuple of (digest, number
+		# of elements, instanceable). The canonical key of every candidate,
+		# which does not include the transformation of the subtree root, is
+		# recorded in "keys".
+		size = 1
+		instanceable = (node.tagName not in self._NON_INSTANCEABLE_TAGS) and (node.getAttribute("inkscape:groupmode") != "layer")
+		if node.hasAttribute("id") and (node.getAttribute("id") in protected_ids):
+			instanceable = False
+
+		content = hashlib.sha256()
+		child_excluded = excluded or (node.tagName in self._EXCLUDED_CONTAINERS)
+		for child in node.childNodes:
+			if child.nodeType == child.ELEMENT_NODE:
+				(child_digest, child_size, child_instanceable) = self._analyze(child, protected_ids, child_excluded, keys)
+				content.update(b"e" + child_digest)
+				size += child_size
+				instanceable = instanceable and child_instanceable and (self._discard_ids or (not child.hasAttribute("id")))
+			elif child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE):
+				if (node.tagName in self._TEXT_CONTENT_TAGS) or (child.data.strip() != ""):
+					self._hash_field(content, b"t", child.data)
+
+		hasher = hashlib.sha256()
+		self._hash_field(hasher, b"n", node.tagName)
+		for (name, value) in sorted(node.attributes.items()):
+			if name not in ("id", "transform"):
+				self._hash_field(hasher, b"a", name)
+				self._hash_field(hasher, b"v", value)
+		hasher.update(b"c" + content.digest())
+		key = hasher.digest()
+		if (not excluded) and instanceable and (size >= self._min_elements) and (node.tagName in self._INSTANCEABLE_TAGS):
+			keys[node] = key
+
+		if node.hasAttribute("transform"):
+			self._hash_field(hasher, b"a", "transform")
+			self._hash_field(hasher, b"v", node.getAttribute("transform"))
+		return (hasher.digest(), size, instanceable)
+
+	def _select(self, node, keys, counts, occurrences):
+		# Top-down, so the largest repeated subtree wins and nothing within an
+		# instanced subtree is considered again.
+		for child in XMLTools.find_all_elements(node):
+			key = keys.get(child)
+			if (key is not None) and (counts[key] >= self._threshold):
+				occurrences[key].append(child)
+			else:
+				self._select(child, keys, counts, occurrences)
+
+	def _instance_nodes(self, nodes):
+		# The ID of the root is retained by the <use> element; IDs below the
+		# root can only be present if "discard_ids" is set.
+		template = nodes[0].cloneNode(True)
+		for element in XMLTools.walk_elements(template):
+			XMLTools.try_remove_attribute(element, "id")
+		XMLTools.try_remove_attribute(template, "transform")
+		symbol = self.svg_document.defs.add(SVGSymbol.new())
+		symbol.node.appendChild(template)
+
+		for node in nodes:
+			use = SVGUse.new(symbol)
+			XMLTools.adopt(use.node, node.ownerDocument)
+			for attribute in ("id", "transform"):
+				if node.hasAttribute(attribute):
+					use.node.setAttribute(attribute, node.getAttribute(attribute))
+			self.svg_document.invalidate_style(node)
+			node.parentNode.replaceChild(use.node, node)
+			node.unlink()
+
+	def instance(self):
+		# Returns the number of created symbols.
+		protected_ids = self._protected_ids()
+		if protected_ids is None:
+			return 0
+
+		keys = { }
+		self._analyze(self.svg_document.node, protected_ids, excluded = False, keys = keys)
+		counts = collections.Counter(keys.values())
+		occurrences = collections.defaultdict(list)
+		self._select(self.svg_document.node, keys, counts, occurrences)
+
+		symbol_count = 0
+		for nodes in occurrences.values():
+			if len(nodes) >= self._threshold:
+				self._instance_nodes(nodes)
+				symbol_count += 1
+		if symbol_count > 0:
+			if not self.svg_document.node.hasAttribute("xmlns:xlink"):
+				self.svg_document.node.setAttribute("xmlns:xlink", self._XLINK_NAMESPACE)
+			self.svg_document.invalidate_references()
+		return symbol_count
@@ -21,6 +21,7 @@
 from .XMLTools import XMLTools
 from .SVGStyle import SVGStyle
 from .Vector2D import Vector2D, SVGTransform
+from .NumberFormatter import NumberFormatter
 
 class SVGXYObject():
 	_X_ATTRIBUTE_NAME = "x"
@@ -32,8 +33,10 @@ class SVGXYObject():
 
 	@pos.setter
 	def pos(self, value: Vector2D):
-		self.node.setAttribute(self._X_ATTRIBUTE_NAME, str(value.x))
-		self.node.setAttribute(self._Y_ATTRIBUTE_NAME, str(value.y))
+		fmt = NumberFormatter.default()
+		self.node.setAttribute(self._X_ATTRIBUTE_NAME, fmt.format(value.x))
+		self.node.setAttribute(self._Y_ATTRIBUTE_NAME, fmt.format(value.y))
+		self._geometry_changed()
 
 class SVGWidthHeightObject():
 	_DEFAULT_WIDTH = 0
@@ -54,8 +57,10 @@ class SVGWidthHeightObject():
 
 	@extents.setter
 	def extents(self, value: Vector2D):
-		self.node.setAttribute("width", str(value.x))
-		self.node.setAttribute("height", str(value.y))
+		fmt = NumberFormatter.default()
+		self.node.setAttribute("width", fmt.format(value.x))
+		self.node.setAttribute("height", fmt.format(value.y))
+		self._geometry_changed()
 
 
 class SVGStyleObject():
@@ -63,6 +68,10 @@ class SVGStyleObject():
 	def style(self):
 		return SVGStyle.from_node(self.node, auto_sync = True)
 
+	@property
+	def computed_style(self):
+		return self.svg_document.style_resolver.get(self.node)
+
 
 class SVGObject():
 	_TAG_NAME = None
@@ -87,7 +96,10 @@ class SVGObject():
 
 	@svgid.setter
 	def svgid(self, value):
+		old_id = self.svgid
 		self.node.setAttribute("id", value)
+		if self.svg_document is not None:
+			self.svg_document.id_changed(self.node, old_id)
 
 	@property
 	def label(self):
@@ -97,9 +109,26 @@ class SVGObject():
 	def label(self, value: str):
 		self.node.setAttribute("inkscape:label", value)
 
+	@property
+	def css_classes(self):
+		return self._default_get_attribute("class", "").split()
+
+	@css_classes.setter
+	def css_classes(self, value: list):
+		if len(value) == 0:
+			XMLTools.try_remove_attribute(self.node, "class")
+		else:
+			self.node.setAttribute("class", " ".join(value))
+		if self.svg_document is not None:
+			self.svg_document.invalidate_style(self.node)
+
 	def hull_vertices(self, max_interpolation_count = 100):
 		yield from iter(())
 
+	def _geometry_changed(self):
+		if self.svg_document is not None:
+			self.svg_document.invalidate_instance_extents()
+
 	@property
 	def transformation_matrix(self):
 		if self.node.hasAttribute("transform"):
@@ -130,8 +159,15 @@ class SVGObject():
 		return XMLTools.new_element(cls.get_tagname())
 
 	def add(self, svg_object):
+		moved = (svg_object.node.parentNode is not None)
 		self.node.appendChild(svg_object.node)
-		svg_object.node.ownerDocument = self.node.ownerDocument
+		XMLTools.adopt(svg_object.node, self.node.ownerDocument)
+		if self.svg_document is not None:
+			if moved:
+				# Moved within the document, indexed under its old location
+				self.svg_document.invalidate_references()
+			else:
+				self.svg_document.references_added(svg_object.node)
 		if svg_object.svgid is None:
 			svg_object.svgid = self.svg_document.get_unused_id()
 		if hasattr(svg_object, "post_add_hook"):
@@ -139,6 +175,14 @@ class SVGObject():
 			svg_object.post_add_hook = None
 		return svg_object
 
+	def remove(self):
+		# Removes the object including all of its children from the document;
+		# it can be added again afterwards.
+		if self.svg_document is not None:
+			self.svg_document.references_removed(self.node)
+			self.svg_document.invalidate_style(self.node)
+		self.node.parentNode.removeChild(self.node)
+
 	@classmethod
 	def get_tagname(cls):
 		assert(cls._TAG_NAME is not None)
@@ -189,6 +233,7 @@ class SVGObject():
 		else:
 			matrix = matrix * transformation_matrix
 		self.node.setAttribute("transform", SVGTransform.to_svg(matrix))
+		self._geometry_changed()
 
 	@classmethod
 	def register(cls, svg_object_class):
@@ -203,6 +248,8 @@ class SVGObject():
 
 	@classmethod
 	def attempt_handle(cls, node):
+		if node.nodeType != node.ELEMENT_NODE:
+			return None
 		handler = cls._REGISTERED_CLASSES.get(node.tagName)
 		if handler is None:
 			return None
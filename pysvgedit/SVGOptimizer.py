@@ -0,0 +1,520 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+from .SVGStyle import SVGStyle
+from .SVGStyleResolver import SVGStyleResolver
+from .SVGStyleSheet import SVGStyleSheet
+from .Vector2D import SVGTransform
+from .XMLTools import XMLTools
+from .NumberFormatter import NumberFormatter
+
+class SVGOptimizer():
+	# Minifies a document: numbers are rounded to a fixed number of decimal
+	# places, path data is re-encoded in the shortest mix of absolute and
+	# relative commands, editor metadata and declarations that equal their
+	# default are removed and groups without an effect are collapsed. The
+	# result can either replace the document content (optimize()) or be
+	# written out directly without modifying the document (write()).
+	_METADATA_TAGS = set([ "metadata", "sodipodi:namedview" ])
+	_METADATA_PREFIXES = ( "inkscape:", "sodipodi:" )
+	_TRANSFORM_ATTRIBUTES = set([ "transform", "gradientTransform", "patternTransform" ])
+	_NUMERIC_PROPERTIES = set([
+		"x", "y", "width", "height", "cx", "cy", "r", "rx", "ry", "x1", "y1", "x2", "y2", "dx", "dy",
+		"fx", "fy", "offset", "opacity", "fill-opacity", "stroke-opacity", "stop-opacity", "flood-opacity",
+		"stroke-width", "stroke-miterlimit", "stroke-dashoffset", "font-size", "letter-spacing", "word-spacing",
+	])
+	_NUMBER_LIST_PROPERTIES = set([ "viewBox", "points", "stroke-dasharray" ])
+
+	# Geometry attributes that default to zero, only for those elements where
+	# this is actually the case (e.g., not for <pattern> or <mask>)
+	_DEFAULT_ATTRIBUTES = {
+		"rect":		set([ "x", "y" ]),
+		"image":	set([ "x", "y" ]),
+		"use":		set([ "x", "y" ]),
+		"circle":	set([ "cx", "cy" ]),
+		"ellipse":	set([ "cx", "cy" ]),
+	}
+
+	# Initial values of style properties
+	_INITIAL_VALUES = {
+		"clip-path":			set([ "none" ]),
+		"clip-rule":			set([ "nonzero" ]),
+		"direction":			set([ "ltr" ]),
+		"display":				set([ "inline" ]),
+		"fill":					set([ "#000000", "#000", "black" ]),
+		"fill-opacity":			set([ "1" ]),
+		"fill-rule":			set([ "nonzero" ]),
+		"filter":				set([ "none" ]),
+		"font-stretch":			set([ "normal" ]),
+		"font-style":			set([ "normal" ]),
+		"font-variant":			set([ "normal" ]),
+		"font-weight":			set([ "normal", "400" ]),
+		"letter-spacing":		set([ "normal" ]),
+		"mask":					set([ "none" ]),
+		"opacity":				set([ "1" ]),
+		"stop-opacity":			set([ "1" ]),
+		"stroke":				set([ "none" ]),
+		"stroke-dasharray":		set([ "none" ]),
+		"stroke-dashoffset":	set([ "0" ]),
+		"stroke-linecap":		set([ "butt" ]),
+		"stroke-linejoin":		set([ "miter" ]),
+		"stroke-miterlimit":	set([ "4" ]),
+		"stroke-opacity":		set([ "1" ]),
+		"stroke-width":			set([ "1", "1px" ]),
+		"text-anchor":			set([ "start" ]),
+		"visibility":			set([ "visible" ]),
+		"word-spacing":			set([ "normal" ]),
+	}
+
+	# Elements in which whitespace is significant
+	_TEXT_CONTENT_TAGS = set([ "text", "tspan", "textPath", "flowRoot", "flowPara", "flowSpan", "flowDiv", "style", "script", "title", "desc" ])
+
+	# Number of coordinates and which of them are x/y coordinates that are
+	# affected by relative commands
+	_PATH_COMMANDS = {
+		"M":	"xy",
+		"L":	"xy",
+		"T":	"xy",
+		"H":	"x",
+		"V":	"y",
+		"C":	"xyxyxy",
+		"S":	"xyxy",
+		"Q":	"xyxy",
+		"A":	"...ffxy",
+		"Z":	"",
+	}
+
+	_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+	_UNIT_VALUE_RE = re.compile(r"(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?P<unit>[a-zA-Z%]*)")
+	_PATH_SEPARATOR_RE = re.compile(r"[\s,]*")
+	_FLAG_RE = re.compile(r"[\s,]*(?P<flag>[01])")
+
+	def __init__(self, svg_document, precision: int = 3, strip_metadata: bool = True, strip_defaults: bool = True, collapse_groups: bool = True, gc_defs: bool = True):
+		self._svg_document = svg_document
+		self._precision = precision
+		self._strip_metadata = strip_metadata
+		self._strip_defaults = strip_defaults
+		self._collapse_groups = collapse_groups
+		self._gc_defs = gc_defs
+		self._formatter = NumberFormatter(precision = precision, strip_leading_zero = True)
+
+		# The linear part of transformations needs a higher precision
+		self._linear_formatter = NumberFormatter(precision = precision + 3, strip_leading_zero = True)
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	def format_number(self, value: float):
+		return self._formatter.format(value)
+
+	@classmethod
+	def _join_numbers(cls, numbers, previous_number = None):
+		# A separator is only required if the next number could otherwise be
+		# read as part of the previous one.
+		result = [ ]
+		for number in numbers:
+			if (previous_number is not None) and (not number.startswith("-")) and (not (number.startswith(".") and ("." in previous_number))):
+				result.append(" ")
+			result.append(number)
+			previous_number = number
+		return "".join(result)
+
+	def _format_unit_value(self, value: str):
+		rematch = self._UNIT_VALUE_RE.fullmatch(value.strip())
+		if rematch is None:
+			return value
+		return self.format_number(float(rematch["number"])) + rematch["unit"]
+
+	def _format_number_list(self, value: str):
+		items = value.replace(",", " ").split()
+		if not all(self._NUMBER_RE.fullmatch(item) for item in items):
+			return value
+		return " ".join(self.format_number(float(item)) for item in items)
+
+	def _format_value(self, name: str, value: str):
+		if name in self._NUMERIC_PROPERTIES:
+			return self._format_unit_value(value)
+		elif name in self._NUMBER_LIST_PROPERTIES:
+			return self._format_number_list(value)
+		return value
+
+	def _parse_path(self, d: str):
+		# Returns a list of (command, absolute arguments) tuples. All
+		# commands are converted to absolute uppercase commands.
+		segments = [ ]
+		pos = 0
+		cmd = None
+		(x, y) = (0, 0)
+		(start_x, start_y) = (0, 0)
+		while True:
+			pos = self._PATH_SEPARATOR_RE.match(d, pos).end()
+			if pos == len(d):
+				break
+			if d[pos].isalpha():
+				cmd = d[pos]
+				pos += 1
+			elif cmd is None:
+				raise ValueError(f"Path data does not start with a command: {d}")
+			elif cmd in "Mm":
+				cmd = "L" if (cmd == "M") else "l"
+			elif cmd in "Zz":
+				raise ValueError(f"Arguments after closepath: {d}")
+			upper_cmd = cmd.upper()
+			if upper_cmd not in self._PATH_COMMANDS:
+				raise ValueError(f"Unknown path command: {cmd}")
+
+			args = [ ]
+			for kind in self._PATH_COMMANDS[upper_cmd]:
+				if kind == "f":
+					rematch = self._FLAG_RE.match(d, pos)
+					if rematch is None:
+						raise ValueError(f"Invalid arc flag in path data: {d}")
+					args.append(int(rematch["flag"]))
+				else:
+					pos = self._PATH_SEPARATOR_RE.match(d, pos).end()
+					rematch = self._NUMBER_RE.match(d, pos)
+					if rematch is None:
+						raise ValueError(f"Invalid number in path data: {d}")
+					value = float(rematch.group(0))
+					if cmd.islower():
+						if kind == "x":
+							value += x
+						elif kind == "y":
+							value += y
+					args.append(value)
+				pos = rematch.end()
+
+			if upper_cmd == "Z":
+				(x, y) = (start_x, start_y)
+			elif upper_cmd == "H":
+				x = args[0]
+			elif upper_cmd == "V":
+				y = args[0]
+			else:
+				(x, y) = args[-2:]
+				if upper_cmd == "M":
+					(start_x, start_y) = (x, y)
+			segments.append((upper_cmd, args))
+		return segments
+
+	def _encode_segment(self, cmd: str, args: list, x: float, y: float):
+		# Returns the (absolute, relative) encodings of a segment, each as a
+		# list of formatted arguments. Arguments are rounded first so that
+		# relative coordinates do not accumulate rounding errors.
+		absolute = [ ]
+		relative = [ ]
+		for (kind, value) in zip(self._PATH_COMMANDS[cmd], args):
+			if kind == "f":
+				absolute.append(str(value))
+				relative.append(str(value))
+				continue
+			value = round(value, self._precision)
+			absolute.append(self.format_number(value))
+			if kind == "x":
+				relative.append(self.format_number(value - x))
+			elif kind == "y":
+				relative.append(self.format_number(value - y))
+			else:
+				relative.append(self.format_number(value))
+		return (absolute, relative)
+
+	def optimize_path(self, d: str):
+		try:
+			segments = self._parse_path(d)
+		except ValueError:
+			return d
+
+		output = [ ]
+		previous_cmd = None
+		previous_number = None
+		(x, y) = (0, 0)
+		(start_x, start_y) = (0, 0)
+		for (cmd, args) in segments:
+			if cmd == "Z":
+				output.append("z")
+				(previous_cmd, previous_number) = ("z", None)
+				(x, y) = (start_x, start_y)
+				continue
+
+			if cmd == "L":
+				# Lines that are horizontal or vertical after rounding
+				if round(args[1], self._precision) == y:
+					(cmd, args) = ("H", args[:1])
+				elif round(args[0], self._precision) == x:
+					(cmd, args) = ("V", args[1:])
+
+			(absolute, relative) = self._encode_segment(cmd, args, x, y)
+			candidates = [ ]
+			for (encoded_cmd, encoded_args) in ((cmd, absolute), (cmd.lower(), relative)):
+				if encoded_cmd == previous_cmd:
+					candidates.append((self._join_numbers(encoded_args, previous_number), encoded_cmd))
+				else:
+					candidates.append((encoded_cmd + self._join_numbers(encoded_args), encoded_cmd))
+			(encoded, encoded_cmd) = min(candidates, key = lambda candidate: len(candidate[0]))
+			output.append(encoded)
+			previous_number = absolute[-1] if encoded_cmd.isupper() else relative[-1]
+
+			# Command repeats implicitly, a moveto as a lineto
+			previous_cmd = { "M": "L", "m": "l" }.get(encoded_cmd, encoded_cmd)
+			if cmd == "H":
+				x = round(args[0], self._precision)
+			elif cmd == "V":
+				y = round(args[0], self._precision)
+			else:
+				(x, y) = (round(args[-2], self._precision), round(args[-1], self._precision))
+				if cmd == "M":
+					(start_x, start_y) = (x, y)
+		return "".join(output)
+
+	def optimize_transform(self, value: str):
+		# Returns the shortest equivalent transformation or None if it is the
+		# identity.
+		try:
+			matrix = SVGTransform.parse(value)
+		except ValueError:
+			return value
+		(a, b, c, d) = (round(value, self._linear_formatter.precision) for value in matrix.aslist[:4])
+		(e, f) = (round(value, self._precision) for value in matrix.aslist[4:])
+		if (a, b, c, d) == (1, 0, 0, 1):
+			if (e, f) == (0, 0):
+				return None
+			elif f == 0:
+				return f"translate({self.format_number(e)})"
+			return f"translate({self.format_number(e)} {self.format_number(f)})"
+		elif (b, c, e, f) == (0, 0, 0, 0):
+			if a == d:
+				return f"scale({self._linear_formatter.format(a)})"
+			return f"scale({self._linear_formatter.format(a)} {self._linear_formatter.format(d)})"
+		values = [ self._linear_formatter.format(value) for value in (a, b, c, d) ] + [ self.format_number(e), self.format_number(f) ]
+		return f"matrix({' '.join(values)})"
+
+	def _prepare(self):
+		root = self._svg_document.node
+		reference_graph = self._svg_document.reference_graph
+		self._resolver = self._svg_document.style_resolver
+		self._has_stylesheets = any(True for _ in XMLTools.walk_elements(root, SVGStyleSheet.get_tagname()))
+		self._instantiated_ids = reference_graph.instantiated_ids()
+		self._referenced_ids = reference_graph.referenced_ids()
+		self._removed_definitions = set(reference_graph.unreachable_definitions()) if self._gc_defs else set()
+		self._unused_prefixes = self._unused_namespace_prefixes(root)
+
+	def _is_removed(self, node):
+		if node in self._removed_definitions:
+			return True
+		if self._strip_metadata and ((node.tagName in self._METADATA_TAGS) or node.tagName.startswith(self._METADATA_PREFIXES)):
+			return True
+		return False
+
+	def _unused_namespace_prefixes(self, root):
+		# Namespace declarations of the root element that are not needed by
+		# any element or attribute that remains.
+		declared = set(name[6:] for name in root.attributes.keys() if name.startswith("xmlns:"))
+		used = set()
+		pending = [ root ]
+		while len(pending) > 0:
+			node = pending.pop()
+			if self._is_removed(node):
+				continue
+			if ":" in node.tagName:
+				used.add(node.tagName.split(":")[0])
+			for name in node.attributes.keys():
+				if (":" in name) and (not name.startswith("xmlns:")) and (not (self._strip_metadata and name.startswith(self._METADATA_PREFIXES))):
+					used.add(name.split(":")[0])
+			pending += XMLTools.find_all_elements(node)
+		return declared - used
+
+	def _is_default_declaration(self, node, key: str, value: str, in_instance: bool):
+		# Only safe without stylesheets, which could otherwise take effect
+		# once the inline declaration is gone, and outside of content that
+		# is instantiated by <use> (which inherits from the <use> instead).
+		if self._has_stylesheets or in_instance or node.hasAttribute(key):
+			return False
+		if key in SVGStyleResolver.INHERITED_PROPERTIES:
+			parent = node.parentNode
+			parent_value = None
+			if (parent is not None) and (parent.nodeType == parent.ELEMENT_NODE):
+				parent_value = self._resolver.get_property(parent, key)
+			if parent_value is not None:
+				return self._format_value(key, parent_value) == value
+		return value in self._INITIAL_VALUES.get(key, ())
+
+	def _optimize_style(self, node, style_value: str, in_instance: bool):
+		optimized = { }
+		for (key, value) in SVGStyle.from_style_str(style_value):
+			if self._strip_metadata and key.startswith("-inkscape-"):
+				continue
+			value = self._format_value(key, value)
+			if self._strip_defaults and self._is_default_declaration(node, key, value, in_instance):
+				continue
+			optimized[key] = value
+		return SVGStyle(optimized).serialize()
+
+	def _optimized_attributes(self, node, in_instance: bool, parent_transform = None):
+		# Returns the list of (name, value) attributes of the node, with a
+		# transformation of a collapsed parent group merged in.
+		attributes = [ ]
+		default_attributes = self._DEFAULT_ATTRIBUTES.get(node.tagName, ()) if self._strip_defaults else ()
+		have_transform = False
+		for (name, value) in node.attributes.items():
+			if self._strip_metadata and name.startswith(self._METADATA_PREFIXES):
+				continue
+			if name.startswith("xmlns:") and (name[6:] in self._unused_prefixes):
+				continue
+			if name == "d":
+				value = self.optimize_path(value)
+			elif name in self._TRANSFORM_ATTRIBUTES:
+				if (name == "transform") and (parent_transform is not None):
+					value = SVGTransform.to_svg(SVGTransform.parse(value) * parent_transform)
+					have_transform = True
+				value = self.optimize_transform(value)
+			elif name == "style":
+				value = self._optimize_style(node, value, in_instance)
+				if value == "":
+					value = None
+			else:
+				value = self._format_value(name, value)
+				if (name in default_attributes) and (value == "0"):
+					value = None
+			if value is not None:
+				attributes.append((name, value))
+		if (parent_transform is not None) and (not have_transform):
+			value = self.optimize_transform(SVGTransform.to_svg(parent_transform))
+			if value is not None:
+				attributes.append(("transform", value))
+		return attributes
+
+	def _collapsible(self, node, attributes):
+		# Returns the transformation to push down into the children if the
+		# group can be replaced by its children, False otherwise.
+		if (not self._collapse_groups) or (node.tagName != "g") or self._has_stylesheets:
+			return False
+		if (node.parentNode is None) or (node.parentNode.nodeType != node.ELEMENT_NODE) or (node.parentNode.tagName == "switch"):
+			return False
+		names = [ name for (name, value) in attributes if not ((name == "id") and (value not in self._referenced_ids)) ]
+		if len(names) == 0:
+			return None
+		if names == [ "transform" ]:
+			children = [ child for child in node.childNodes if not self._is_dropped_child(child) ]
+			if (len(children) == 1) and (children[0].nodeType == children[0].ELEMENT_NODE):
+				return SVGTransform.parse(dict(attributes)["transform"])
+		return False
+
+	def _is_dropped_child(self, node):
+		if node.nodeType == node.ELEMENT_NODE:
+			return self._is_removed(node)
+		elif node.nodeType == node.TEXT_NODE:
+			return (node.data.strip() == "") and (node.parentNode.tagName not in self._TEXT_CONTENT_TAGS)
+		elif node.nodeType == node.CDATA_SECTION_NODE:
+			return False
+		return True
+
+	def _events(self, node, in_instance = False, parent_transform = None):
+		# Yields ("start", tagname, attributes), ("end", tagname), ("text",
+		# data) and ("cdata", data) events of the optimized subtree.
+		in_instance = in_instance or (node.tagName == "defs") or (node.getAttribute("id") in self._instantiated_ids)
+		attributes = self._optimized_attributes(node, in_instance, parent_transform = parent_transform)
+		collapse = self._collapsible(node, attributes)
+		if collapse is False:
+			yield ("start", node.tagName, attributes)
+			child_transform = None
+		else:
+			child_transform = collapse
+		for child in node.childNodes:
+			if self._is_dropped_child(child):
+				continue
+			if child.nodeType == child.ELEMENT_NODE:
+				yield from self._events(child, in_instance = in_instance, parent_transform = child_transform)
+			elif child.nodeType == child.TEXT_NODE:
+				yield ("text", child.data)
+			else:
+				yield ("cdata", child.data)
+		if collapse is False:
+			yield ("end", node.tagName)
+
+	@classmethod
+	def _escape(cls, text: str, attribute: bool = False):
+		text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+		if attribute:
+			text = text.replace("\"", "&quot;").replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+		return text
+
+	def write(self, f):
+		# Streams the optimized document to the text file f; the document
+		# itself is left unchanged.
+		self._prepare()
+		f.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>")
+		pending_start = None
+		for event in self._events(self._svg_document.node):
+			if pending_start is not None:
+				# Elements without content are written as empty-element tags
+				f.write("/>" if (event[0] == "end") else ">")
+				pending_start = None
+				if event[0] == "end":
+					continue
+			match event:
+				case ("start", tagname, attributes):
+					f.write(f"<{tagname}")
+					for (name, value) in attributes:
+						f.write(f" {name}=\"{self._escape(value, attribute = True)}\"")
+					pending_start = tagname
+				case ("end", tagname):
+					f.write(f"</{tagname}>")
+				case ("text", data):
+					f.write(self._escape(data))
+				case ("cdata", data):
+					f.write(f"<![CDATA[{data}]]>")
+
+	def _optimize_node(self, node, in_instance = False, parent_transform = None):
+		# Same decisions as _events(), but applied to the DOM. Children are
+		# handled before the attributes of the node itself are replaced, so
+		# that the style resolver still sees the original ancestors.
+		in_instance = in_instance or (node.tagName == "defs") or (node.getAttribute("id") in self._instantiated_ids)
+		attributes = self._optimized_attributes(node, in_instance, parent_transform = parent_transform)
+		collapse = self._collapsible(node, attributes)
+		child_transform = None if (collapse is False) else collapse
+		for child in list(node.childNodes):
+			if self._is_dropped_child(child):
+				node.removeChild(child)
+				child.unlink()
+			elif child.nodeType == child.ELEMENT_NODE:
+				self._optimize_node(child, in_instance = in_instance, parent_transform = child_transform)
+
+		if collapse is False:
+			for name in list(node.attributes.keys()):
+				node.removeAttribute(name)
+			for (name, value) in attributes:
+				node.setAttribute(name, value)
+		else:
+			parent = node.parentNode
+			for child in list(node.childNodes):
+				parent.insertBefore(child, node)
+			parent.removeChild(node)
+			node.unlink()
+
+	def optimize(self):
+		# Optimizes the document in place: elements that remain are modified,
+		# not recreated, so existing SVGObject instances stay valid (except
+		# for those of removed elements and collapsed groups).
+		self._prepare()
+		self._optimize_node(self._svg_document.node)
+		self._svg_document.invalidate_references()
+		self._svg_document.style_resolver.invalidate_all()
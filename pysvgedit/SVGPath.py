@@ -24,6 +24,7 @@ import contextlib
 import dataclasses
 from .SVGObject import SVGObject, SVGStyleObject
 from .Vector2D import Vector2D
+from .NumberFormatter import NumberFormatter
 
 @dataclasses.dataclass
 class SVGPathElementClose():
@@ -44,7 +45,7 @@ class SVGPathElementBasic():
 	relative: bool
 
 	def serialize(self):
-		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {self.pos.x} {self.pos.y}"
+		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {NumberFormatter.default().format_vector(self.pos)}"
 
 	def apply(self, pos):
 		if self.relative:
@@ -79,7 +80,8 @@ class SVGPathElementArc():
 	relative: bool
 
 	def serialize(self):
-		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {self.radius.x} {self.radius.y} {self.xrotation} {1 if self.large_arc else 0} {1 if self.sweep else 0} {self.pos.x} {self.pos.y}"
+		fmt = NumberFormatter.default()
+		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {fmt.format_vector(self.radius)} {fmt.format(self.xrotation)} {1 if self.large_arc else 0} {1 if self.sweep else 0} {fmt.format_vector(self.pos)}"
 
 	def apply(self, pos):
 		if self.relative:
@@ -139,7 +141,8 @@ class SVGPathElementBezier():
 	relative: bool
 
 	def serialize(self):
-		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {self.p1.x} {self.p1.y} {self.p2.x} {self.p2.y} {self.p3.x} {self.p3.y}"
+		fmt = NumberFormatter.default()
+		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {fmt.format_vector(self.p1)} {fmt.format_vector(self.p2)} {fmt.format_vector(self.p3)}"
 
 	def apply(self, pos):
 		if self.relative:
@@ -175,7 +178,7 @@ class SVGPathElementHorizontal():
 	relative: bool
 
 	def serialize(self):
-		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {self.x}"
+		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {NumberFormatter.default().format(self.x)}"
 
 	def apply(self, pos):
 		if self.relative:
@@ -195,7 +198,7 @@ class SVGPathElementVertical():
 	relative: bool
 
 	def serialize(self):
-		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {self.y}"
+		return f"{self._IDENTIFIER if self.relative else self._IDENTIFIER.upper()} {NumberFormatter.default().format(self.y)}"
 
 	def apply(self, pos):
 		if self.relative:
@@ -208,9 +211,9 @@ class SVGPathElementVertical():
 		yield self.apply(p0)
 
 class SVGPathParser():
-	_CMD_BEGIN = re.compile(r"^[,\s]*(?P<cmd>[a-zA-Z])(?P<tail>.*)")
-	_FLOAT = re.compile(r"^[,\s]*(?P<float>-?(\d*)?(\.\d*)?([eE]-?\d+)?)(?P<tail>.*)")
-	_INT = re.compile(r"^[,\s]*(?P<int>-?\d+)(?P<tail>.*)")
+	_CMD_BEGIN = re.compile(r"^[,\s]*(?P<cmd>[a-zA-Z])(?P<tail>.*)", flags = re.DOTALL)
+	_FLOAT = re.compile(r"^[,\s]*(?P<float>-?(\d*)?(\.\d*)?([eE]-?\d+)?)(?P<tail>.*)", flags = re.DOTALL)
+	_INT = re.compile(r"^[,\s]*(?P<int>-?\d+)(?P<tail>.*)", flags = re.DOTALL)
 
 	def __init__(self):
 		self._cmds = [ ]
@@ -219,8 +222,14 @@ class SVGPathParser():
 	def cmds(self):
 		return self._cmds
 
-	def _parse_begin(self, text):
+	def _parse_begin(self, text, previous_cmd):
 		rematch = self._CMD_BEGIN.fullmatch(text)
+		if rematch is None:
+			# Command letter may be omitted if the command is repeated; a
+			# moveto is then followed by implicit lineto commands.
+			if previous_cmd is None:
+				raise ValueError(f"Path data does not start with a command: {text}")
+			return ({ "M": "L", "m": "l" }.get(previous_cmd, previous_cmd), text)
 		rematch = rematch.groupdict()
 		return (rematch["cmd"], rematch["tail"])
 
@@ -244,8 +253,9 @@ class SVGPathParser():
 		return (Vector2D(x, y), text)
 
 	def parse(self, text):
-		while len(text) > 0:
-			(cmd, text) = self._parse_begin(text)
+		cmd = None
+		while len(text.strip(", \t\r\n")) > 0:
+			(cmd, text) = self._parse_begin(text, cmd)
 			if cmd in "mM":
 				(pos, text) = self._parse_pos(text)
 				self._cmds.append(SVGPathElementMove(pos, relative = cmd.islower()))
@@ -301,12 +311,14 @@ class SVGPath(SVGObject, SVGStyleObject):
 
 	def clear(self, pos):
 		self._pos = pos
-		self.node.setAttribute("d", f"M {pos.x} {pos.y}")
+		self.node.setAttribute("d", f"M {NumberFormatter.default().format_vector(pos)}")
+		self._geometry_changed()
 		return self
 
 	def __append_path(self, cmd):
 		self._pos = cmd.apply(self._pos)
 		self.node.setAttribute("d", f"{self.node.getAttribute('d')} {cmd.serialize()}")
+		self._geometry_changed()
 		return self
 
 	def horizontal(self, x, relative = False):
@@ -348,6 +360,6 @@ class SVGPath(SVGObject, SVGStyleObject):
 	def new(cls, pos):
 		path = cls(cls._new_element())
 		path._pos = pos
-		path.node.setAttribute("d", f"M {pos.x} {pos.y}")
+		path.node.setAttribute("d", f"M {NumberFormatter.default().format_vector(pos)}")
 		path.style.default_path()
 		return path
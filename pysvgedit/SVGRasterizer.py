@@ -0,0 +1,380 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import math
+import zlib
+import struct
+import logging
+from .SVGObject import SVGObject
+from .SVGPath import SVGPathElementMove, SVGPathElementClose
+from .Vector2D import Vector2D, TransformationMatrix, SVGTransform
+from .XMLTools import XMLTools
+
+_log = logging.getLogger(__spec__.name)
+
+class SVGRasterizer():
+	# Quick raster previews without Inkscape: fills and strokes rects,
+	# circles and paths, also when instanced by <use> (with transformations,
+	# opacity and solid colors) by scanline filling the flattened geometry,
+	# anti-aliased by supersampling. Everything else (text, images, gradients, clipping,
+	# ...) is ignored, so this is no replacement for a real renderer.
+	_NON_RENDERED_TAGS = set([ "defs", "clipPath", "mask", "marker", "pattern", "symbol", "metadata", "sodipodi:namedview", "style", "script", "title", "desc" ])
+	_NAMED_COLORS = {
+		"black":	(0, 0, 0),
+		"white":	(255, 255, 255),
+		"red":		(255, 0, 0),
+		"lime":		(0, 255, 0),
+		"green":	(0, 128, 0),
+		"blue":		(0, 0, 255),
+		"yellow":	(255, 255, 0),
+		"cyan":		(0, 255, 255),
+		"aqua":		(0, 255, 255),
+		"magenta":	(255, 0, 255),
+		"fuchsia":	(255, 0, 255),
+		"gray":		(128, 128, 128),
+		"grey":		(128, 128, 128),
+		"silver":	(192, 192, 192),
+		"maroon":	(128, 0, 0),
+		"olive":	(128, 128, 0),
+		"navy":		(0, 0, 128),
+		"purple":	(128, 0, 128),
+		"teal":		(0, 128, 128),
+		"orange":	(255, 165, 0),
+	}
+
+	def __init__(self, svg_document, width: int | None = None, height: int | None = None, supersampling: int = 4, background: str | None = None):
+		# NumPy is only required when rasterizing
+		import numpy
+		self._np = numpy
+		self._svg_document = svg_document
+		self._supersampling = supersampling
+		self._background = background
+		self._instantiated = set()
+		(self._viewbox_pos, self._viewbox_size) = self._viewbox()
+		(self._width, self._height) = self._output_size(width, height)
+
+	@property
+	def width(self):
+		return self._width
+
+	@property
+	def height(self):
+		return self._height
+
+	def _viewbox(self):
+		root = self._svg_document.node
+		if root.hasAttribute("viewBox"):
+			(x, y, width, height) = [ float(value) for value in root.getAttribute("viewBox").replace(",", " ").split() ]
+			return (Vector2D(x, y), Vector2D(width, height))
+		return (Vector2D(0, 0), self._svg_document.extents)
+
+	def _output_size(self, width, height):
+		extents = self._svg_document.extents
+		if (width is None) and (height is None):
+			(width, height) = (extents.x, extents.y)
+		elif width is None:
+			width = height * extents.x / extents.y
+		elif height is None:
+			height = width * extents.y / extents.x
+		return (max(1, round(width)), max(1, round(height)))
+
+	@property
+	def _view_matrix(self):
+		# Maps user units of the root element to supersampled pixels
+		# (viewBox with the default preserveAspectRatio "xMidYMid meet")
+		scale = min(self._width / self._viewbox_size.x, self._height / self._viewbox_size.y)
+		offset = Vector2D((self._width - scale * self._viewbox_size.x) / 2, (self._height - scale * self._viewbox_size.y) / 2)
+		return TransformationMatrix.translate(-self._viewbox_pos) * TransformationMatrix.scale(scale) * TransformationMatrix.translate(offset) * TransformationMatrix.scale(self._supersampling)
+
+	@classmethod
+	def parse_color(cls, color: str | None):
+		# Returns an (r, g, b) tuple or None if no solid color is given
+		if color is None:
+			return None
+		color = color.strip().lower()
+		if color.startswith("#") and (len(color) == 4):
+			return tuple(17 * int(char, 16) for char in color[1:])
+		elif color.startswith("#") and (len(color) == 7):
+			return tuple(int(color[i : i + 2], 16) for i in (1, 3, 5))
+		elif color.startswith("rgb(") and color.endswith(")"):
+			values = [ value.strip() for value in color[4 : -1].split(",") ]
+			return tuple(round(float(value[:-1]) * 2.55) if value.endswith("%") else int(value) for value in values)
+		return cls._NAMED_COLORS.get(color)
+
+	@staticmethod
+	def _parse_float(value: str | None, default_value: float):
+		if value is None:
+			return default_value
+		try:
+			if value.endswith("%"):
+				return float(value[:-1]) / 100
+			return float(value.rstrip("px"))
+		except ValueError:
+			return default_value
+
+	def _subpaths(self, svg_object, pixel_scale: float):
+		# Flattened geometry as lists of vertices in user units
+		tag_name = svg_object.node.tagName
+		if tag_name == "rect":
+			(pos, extents) = (svg_object.pos, svg_object.extents)
+			return [ [ pos, Vector2D(pos.x + extents.x, pos.y), pos + extents, Vector2D(pos.x, pos.y + extents.y) ] ]
+		elif tag_name == "circle":
+			(pos, radius) = (svg_object.pos, svg_object.radius)
+			vertex_count = max(8, min(256, round(2 * math.pi * radius * pixel_scale / 2)))
+			return [ [ pos + radius * Vector2D.angled(2 * math.pi * i / vertex_count) for i in range(vertex_count) ] ]
+		elif tag_name == "path":
+			subpaths = [ ]
+			pos = Vector2D()
+			start = pos
+			for cmd in svg_object.parsed:
+				if isinstance(cmd, SVGPathElementMove):
+					pos = cmd.apply(pos)
+					start = pos
+					subpaths.append([ pos ])
+				elif isinstance(cmd, SVGPathElementClose):
+					if len(subpaths) > 0:
+						subpaths[-1].append(start)
+					pos = start
+					subpaths.append([ pos ])
+				else:
+					if len(subpaths) == 0:
+						subpaths.append([ pos ])
+					subpaths[-1] += list(cmd.hull_vertices(pos))
+					pos = cmd.apply(pos)
+			return [ subpath for subpath in subpaths if len(subpath) > 1 ]
+		return [ ]
+
+	def _transform(self, subpaths, matrix):
+		np = self._np
+		return [ np.array([ (vertex.x, vertex.y) for vertex in (matrix.apply(vertex) for vertex in subpath) ], dtype = float) for subpath in subpaths ]
+
+	def _polygon_edges(self, polygons):
+		# All polygons are implicitly closed
+		np = self._np
+		starts = np.concatenate([ polygon for polygon in polygons ])
+		ends = np.concatenate([ np.roll(polygon, -1, axis = 0) for polygon in polygons ])
+		return (starts, ends)
+
+	def _stroke_polygons(self, polylines, half_width: float, closed: bool):
+		# Each segment becomes a quadrilateral and each vertex a small polygon
+		# for the join; all of them have the same orientation, so filling
+		# them with the nonzero rule yields their union.
+		np = self._np
+		polygons = [ ]
+		join_vertices = max(4, min(32, round(half_width)))
+		angles = -2 * math.pi * np.arange(join_vertices) / join_vertices
+		join = half_width * np.stack([ np.cos(angles), np.sin(angles) ], axis = 1)
+		for polyline in polylines:
+			if closed:
+				polyline = np.vstack([ polyline, polyline[:1] ])
+			p0 = polyline[:-1]
+			p1 = polyline[1:]
+			direction = p1 - p0
+			length = np.hypot(direction[:, 0], direction[:, 1])
+			valid = length > 0
+			(p0, p1, direction, length) = (p0[valid], p1[valid], direction[valid], length[valid])
+			normal = np.stack([ -direction[:, 1], direction[:, 0] ], axis = 1) * (half_width / length)[:, None]
+			quads = np.stack([ p0 + normal, p1 + normal, p1 - normal, p0 - normal ], axis = 1)
+			polygons += list(quads)
+			if half_width > 0.75:
+				polygons += [ vertex + join for vertex in polyline ]
+		return polygons
+
+	def _coverage(self, polygons, even_odd: bool):
+		# Returns (x, y, alpha) of the covered output pixel region, where
+		# alpha has the shape of the region; None if nothing is covered.
+		np = self._np
+		ss = self._supersampling
+		if len(polygons) == 0:
+			return None
+		(starts, ends) = self._polygon_edges(polygons)
+		(sample_width, sample_height) = (self._width * ss, self._height * ss)
+
+		# Restrict to the bounding box, aligned to output pixels
+		vertices = np.vstack([ starts, ends ])
+		(min_x, min_y) = np.floor(vertices.min(axis = 0) / ss).astype(int)
+		(max_x, max_y) = np.ceil(vertices.max(axis = 0) / ss).astype(int)
+		(min_x, min_y) = (max(min_x, 0), max(min_y, 0))
+		(max_x, max_y) = (min(max_x, self._width), min(max_y, self._height))
+		if (min_x >= max_x) or (min_y >= max_y):
+			return None
+		(region_width, region_height) = ((max_x - min_x) * ss, (max_y - min_y) * ss)
+		starts = starts - (min_x * ss, min_y * ss)
+		ends = ends - (min_x * ss, min_y * ss)
+
+		# Sample rows r (centers at r + 0.5) that every edge crosses
+		(y0, y1) = (starts[:, 1], ends[:, 1])
+		direction = np.where(y1 > y0, 1, -1)
+		(lo, hi) = (np.minimum(y0, y1), np.maximum(y0, y1))
+		first_row = np.clip(np.ceil(lo - 0.5), 0, region_height).astype(int)
+		end_row = np.clip(np.ceil(hi - 0.5), 0, region_height).astype(int)
+		row_count = end_row - first_row
+		edges = np.nonzero(row_count > 0)[0]
+		if len(edges) == 0:
+			return None
+		edge_index = np.repeat(edges, row_count[edges])
+		rows = np.arange(len(edge_index)) - np.repeat(np.cumsum(row_count[edges]) - row_count[edges], row_count[edges]) + first_row[edge_index]
+
+		# Intersection of every crossed row with its edge
+		(x0, x1) = (starts[edge_index, 0], ends[edge_index, 0])
+		(ey0, ey1) = (y0[edge_index], y1[edge_index])
+		xs = x0 + (rows + 0.5 - ey0) * (x1 - x0) / (ey1 - ey0)
+		order = np.lexsort((xs, rows))
+		(rows, xs, winding) = (rows[order], xs[order], direction[edge_index][order])
+
+		# Between two consecutive crossings of the same row, the winding
+		# number is the sum of all crossing directions to their left
+		if even_odd:
+			inside = (np.cumsum(np.ones_like(winding)) % 2) == 1
+		else:
+			inside = np.cumsum(winding) != 0
+		span = inside[:-1] & (rows[:-1] == rows[1:])
+		span_rows = rows[:-1][span]
+		span_start = np.clip(np.ceil(xs[:-1][span] - 0.5), 0, region_width).astype(int)
+		span_end = np.clip(np.ceil(xs[1:][span] - 0.5), 0, region_width).astype(int)
+
+		difference = np.zeros((region_height, region_width + 1), dtype = np.int32)
+		np.add.at(difference, (span_rows, span_start), 1)
+		np.add.at(difference, (span_rows, span_end), -1)
+		samples = np.cumsum(difference[:, :-1], axis = 1) > 0
+		alpha = samples.reshape(region_height // ss, ss, region_width // ss, ss).mean(axis = (1, 3))
+		return (min_x, min_y, alpha)
+
+	def _composite(self, canvas, coverage, color, opacity):
+		if coverage is None:
+			return
+		(x, y, alpha) = coverage
+		(height, width) = alpha.shape
+		alpha = alpha * opacity
+		region = canvas[y : y + height, x : x + width]
+		region[:, :, :3] = region[:, :, :3] * (1 - alpha[:, :, None]) + (self._np.array(color) / 255) * alpha[:, :, None]
+		region[:, :, 3] = region[:, :, 3] * (1 - alpha) + alpha
+
+	def _render_shape(self, canvas, svg_object, matrix, opacity, instance_chain):
+		resolver = self._svg_document.style_resolver
+		style = resolver.get(svg_object.node, instance_chain = instance_chain)
+		pixel_scale = math.sqrt(abs(matrix.a * matrix.d - matrix.b * matrix.c))
+		subpaths = self._subpaths(svg_object, pixel_scale)
+		if len(subpaths) == 0:
+			return
+		polylines = self._transform(subpaths, matrix)
+		opacity *= self._parse_float(style["opacity"], 1)
+
+		fill = style["fill"] or "black"
+		fill_color = self.parse_color(fill)
+		if fill_color is not None:
+			even_odd = (style["fill-rule"] == "evenodd")
+			self._composite(canvas, self._coverage(polylines, even_odd = even_odd), fill_color, opacity * self._parse_float(style["fill-opacity"], 1))
+		elif fill != "none":
+			_log.debug("Rasterizer ignores unsupported fill of %s: %s", svg_object.svgid, fill)
+
+		stroke_color = self.parse_color(style["stroke"])
+		stroke_width = self._parse_float(style["stroke-width"], 1) * pixel_scale
+		if (stroke_color is not None) and (stroke_width > 0):
+			closed = svg_object.node.tagName in ("rect", "circle")
+			polygons = self._stroke_polygons(polylines, stroke_width / 2, closed = closed)
+			self._composite(canvas, self._coverage(polygons, even_odd = False), stroke_color, opacity * self._parse_float(style["stroke-opacity"], 1))
+
+	def _render_instance(self, canvas, node, matrix, opacity, instance_chain):
+		use = SVGObject.attempt_handle(node)
+		referenced = use.referenced_node
+		if (referenced is None) or (referenced in self._instantiated):
+			return
+		instance_matrix = use.instance_matrix
+		if instance_matrix is not None:
+			matrix = instance_matrix * matrix
+		instance_chain = instance_chain + (node, )
+		self._instantiated.add(referenced)
+		try:
+			if referenced.tagName == "symbol":
+				for child in XMLTools.find_all_elements(referenced):
+					self._render_node(canvas, child, matrix, opacity, instance_chain)
+			else:
+				self._render_node(canvas, referenced, matrix, opacity, instance_chain)
+		finally:
+			self._instantiated.remove(referenced)
+
+	def _render_node(self, canvas, node, matrix, opacity, instance_chain = ()):
+		# instance_chain holds the <use> elements through which the node is
+		# rendered, their content inherits styles from them.
+		if node.tagName in self._NON_RENDERED_TAGS:
+			return
+		resolver = self._svg_document.style_resolver
+		if resolver.get_property(node, "display", instance_chain = instance_chain) == "none":
+			return
+		if node.hasAttribute("transform") and (node is not self._svg_document.node):
+			try:
+				matrix = SVGTransform.parse(node.getAttribute("transform")) * matrix
+			except ValueError as e:
+				_log.warning("Rasterizer skips element %s with unparsable transform: %s", node.getAttribute("id"), e)
+				return
+
+		if node.tagName in ("rect", "circle", "path"):
+			try:
+				self._render_shape(canvas, SVGObject.attempt_handle(node), matrix, opacity, instance_chain)
+			except (NotImplementedError, ValueError, ZeroDivisionError) as e:
+				_log.warning("Rasterizer skips element %s: %s", node.getAttribute("id"), e)
+		elif node.tagName == "use":
+			self._render_instance(canvas, node, matrix, opacity * self._parse_float(resolver.get_property(node, "opacity", instance_chain = instance_chain), 1), instance_chain)
+		else:
+			# Group opacity is approximated by applying it to every child
+			if node is not self._svg_document.node:
+				opacity *= self._parse_float(resolver.get_property(node, "opacity", instance_chain = instance_chain), 1)
+			for child in XMLTools.find_all_elements(node):
+				self._render_node(canvas, child, matrix, opacity, instance_chain)
+
+	def render(self):
+		# Returns an RGBA image as an uint8 array of shape (height, width, 4)
+		np = self._np
+		canvas = np.zeros((self._height, self._width, 4), dtype = float)
+		background = self.parse_color(self._background)
+		if background is not None:
+			canvas[:, :, :3] = np.array(background) / 255
+			canvas[:, :, 3] = 1
+		self._render_node(canvas, self._svg_document.node, self._view_matrix, 1)
+
+		# Colors are premultiplied by alpha while compositing
+		alpha = canvas[:, :, 3:]
+		rgb = np.divide(canvas[:, :, :3], alpha, out = np.zeros_like(canvas[:, :, :3]), where = alpha > 0)
+		return np.round(np.concatenate([ rgb, alpha ], axis = 2) * 255).clip(0, 255).astype(np.uint8)
+
+	@classmethod
+	def encode_png(cls, pixels):
+		# pixels is an uint8 array of shape (height, width, 4)
+		(height, width, _) = pixels.shape
+
+		def chunk(chunk_type: bytes, data: bytes):
+			return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+		# Every scanline is prefixed with filter type 0 (none)
+		scanlines = b"".join(b"\x00" + row.tobytes() for row in pixels)
+		return b"".join([
+			b"\x89PNG\r\n\x1a\n",
+			chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+			chunk(b"IDAT", zlib.compress(scanlines, 6)),
+			chunk(b"IEND", b""),
+		])
+
+	def png(self):
+		return self.encode_png(self.render())
+
+	def write_png(self, filename: str):
+		with open(filename, "wb") as f:
+			f.write(self.png())
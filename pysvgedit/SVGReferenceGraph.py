@@ -0,0 +1,221 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+import collections
+from .XMLTools import XMLTools
+
+class SVGReferenceGraph():
+	# Index of which element references which other element by its ID, either
+	# through url(#id) values (in presentation attributes, style attributes
+	# and stylesheets), through xlink:href/href or through Inkscape's "#id"
+	# attributes (e.g., inkscape:path-effect). The graph is built in a single
+	# traversal; the SVGDocument then keeps it up to date incrementally when
+	# it is modified through the object model (elements are removed through
+	# SVGObject.remove()). Direct DOM modifications need to call
+	# SVGDocument.invalidate_references().
+	_URL_REFERENCE_RE = re.compile(r"url\(\s*['\"]?#(?P<id>[^)'\"\s]+)['\"]?\s*\)")
+	_HREF_ATTRIBUTES = ( "xlink:href", "href" )
+
+	# Inkscape attributes that hold "#id" references (semicolon separated);
+	# others, such as inkscape:pagecolor, contain "#rrggbb" colors instead.
+	_INKSCAPE_REFERENCE_ATTRIBUTES = ( "inkscape:path-effect", "inkscape:perspectiveID", "inkscape:connection-start", "inkscape:connection-end" )
+
+	# Definitions that are never garbage collected even when unreferenced
+	_KEEP_DEFS = ( "style", "script" )
+
+	def __init__(self, svg_document):
+		self._svg_document = svg_document
+		self._elements_by_id = { }
+		self._references = { }
+		self._referrers = { }
+		self._definitions = [ ]
+		self._root_references = collections.Counter()
+		self._build(svg_document.node, in_defs = False)
+
+	@classmethod
+	def parse_url(cls, value: str):
+		# "url(#foo)" -> "foo"
+		if value is None:
+			return None
+		rematch = cls._URL_REFERENCE_RE.fullmatch(value.strip())
+		if rematch is None:
+			return None
+		return rematch["id"]
+
+	@classmethod
+	def parse_references(cls, name: str, value: str):
+		# Yields all IDs referenced by an attribute
+		if name in cls._HREF_ATTRIBUTES:
+			if value.startswith("#"):
+				yield value[1:]
+		elif (name in cls._INKSCAPE_REFERENCE_ATTRIBUTES) and value.startswith("#"):
+			for reference in value.split(";"):
+				if reference.startswith("#"):
+					yield reference[1:]
+		elif "url(" in value:
+			for rematch in cls._URL_REFERENCE_RE.finditer(value):
+				yield rematch["id"]
+
+	def _add_reference(self, node, attribute, referenced_id, in_defs):
+		self._references.setdefault(node, [ ]).append((attribute, referenced_id))
+		self._referrers.setdefault(referenced_id, [ ]).append((node, attribute))
+		if not in_defs:
+			self._root_references[referenced_id] += 1
+
+	def _remove_references(self, node, in_defs):
+		for (attribute, referenced_id) in self._references.pop(node, [ ]):
+			referrers = self._referrers[referenced_id]
+			referrers.remove((node, attribute))
+			if len(referrers) == 0:
+				del self._referrers[referenced_id]
+			if not in_defs:
+				self._root_references[referenced_id] -= 1
+				if self._root_references[referenced_id] <= 0:
+					del self._root_references[referenced_id]
+
+	def _add_node(self, node, in_defs):
+		if node.hasAttribute("id"):
+			self._elements_by_id.setdefault(node.getAttribute("id"), node)
+		for (name, value) in node.attributes.items():
+			for referenced_id in self.parse_references(name, value):
+				self._add_reference(node, name, referenced_id, in_defs)
+		if node.tagName == "style":
+			css_text = "".join(text_node.data for text_node in XMLTools.walk_text_nodes(node))
+			for rematch in self._URL_REFERENCE_RE.finditer(css_text):
+				self._add_reference(node, None, rematch["id"], in_defs)
+
+	def _build(self, node, in_defs):
+		if node.tagName in self._KEEP_DEFS:
+			# Stylesheets and scripts always apply, wherever they are located
+			in_defs = False
+		self._add_node(node, in_defs)
+		for child in XMLTools.find_all_elements(node):
+			if node.tagName == "defs":
+				self._definitions.append(child)
+			self._build(child, in_defs = in_defs or (node.tagName == "defs"))
+
+	def _in_defs(self, node):
+		for element in XMLTools.all_parent_elements(node):
+			if element.tagName in self._KEEP_DEFS:
+				return False
+			if (element.tagName == "defs") and (element is not node):
+				return True
+		return False
+
+	def add_subtree(self, node):
+		# Indexes a subtree that was inserted into the document.
+		parent = node.parentNode
+		if (parent is not None) and (parent.nodeType == parent.ELEMENT_NODE) and (parent.tagName == "defs"):
+			self._definitions.append(node)
+		self._build(node, in_defs = self._in_defs(node))
+
+	def remove_subtree(self, node):
+		# Drops a subtree that is about to be removed from the document.
+		self._remove_subtree(node, in_defs = self._in_defs(node))
+
+	def _remove_subtree(self, node, in_defs):
+		if node.tagName in self._KEEP_DEFS:
+			in_defs = False
+		self._remove_references(node, in_defs)
+		if node.hasAttribute("id") and (self._elements_by_id.get(node.getAttribute("id")) is node):
+			del self._elements_by_id[node.getAttribute("id")]
+		parent = node.parentNode
+		if (parent is not None) and (parent.nodeType == parent.ELEMENT_NODE) and (parent.tagName == "defs"):
+			self._definitions.remove(node)
+		for child in XMLTools.find_all_elements(node):
+			self._remove_subtree(child, in_defs = in_defs or (node.tagName == "defs"))
+
+	def change_id(self, node, old_id: str | None):
+		if (old_id is not None) and (self._elements_by_id.get(old_id) is node):
+			del self._elements_by_id[old_id]
+		if node.hasAttribute("id"):
+			self._elements_by_id.setdefault(node.getAttribute("id"), node)
+
+	def update_references(self, node):
+		# Re-reads the references of a single element after its attributes
+		# (or, for a stylesheet, its text) changed.
+		in_defs = self._in_defs(node)
+		self._remove_references(node, in_defs)
+		self._add_node(node, in_defs)
+
+	def resolve(self, element_id: str):
+		return self._elements_by_id.get(element_id)
+
+	def resolve_url(self, value: str):
+		element_id = self.parse_url(value)
+		if element_id is None:
+			return None
+		return self.resolve(element_id)
+
+	def references(self, node):
+		# IDs that the node references, as (attribute, id) tuples; the
+		# attribute is None for references made from stylesheet text.
+		return list(self._references.get(node, [ ]))
+
+	def referrers(self, element_id: str):
+		# Elements that reference the given ID, as (node, attribute) tuples
+		return list(self._referrers.get(element_id, [ ]))
+
+	def referenced_ids(self):
+		return set(self._referrers)
+
+	def instantiated_ids(self):
+		# IDs of elements that are instantiated by <use> elements. Their
+		# content inherits styles from the <use> element and not from their
+		# parents in the document.
+		return set(referenced_id for (referenced_id, referrers) in self._referrers.items() if any((node.tagName == "use") and (attribute in self._HREF_ATTRIBUTES) for (node, attribute) in referrers))
+
+	def dangling_references(self):
+		for (referenced_id, referrers) in self._referrers.items():
+			if referenced_id not in self._elements_by_id:
+				for (node, attribute) in referrers:
+					yield (node, attribute, referenced_id)
+
+	def reachable_ids(self):
+		# All IDs that are referenced, directly or transitively, from content
+		# outside of <defs>. A definition that is reachable keeps everything
+		# its subtree references alive as well.
+		reachable = set()
+		pending = list(self._root_references)
+		while len(pending) > 0:
+			element_id = pending.pop()
+			if element_id in reachable:
+				continue
+			reachable.add(element_id)
+			node = self._elements_by_id.get(element_id)
+			if node is None:
+				continue
+			for child in XMLTools.walk_elements(node):
+				for (attribute, referenced_id) in self._references.get(child, [ ]):
+					if referenced_id not in reachable:
+						pending.append(referenced_id)
+		return reachable
+
+	def unreachable_definitions(self):
+		# Direct children of <defs> elements that cannot be reached. Children
+		# without an ID cannot be referenced, but are kept nevertheless.
+		reachable = self.reachable_ids()
+		for node in self._definitions:
+			if (not node.hasAttribute("id")) or (node.tagName in self._KEEP_DEFS):
+				continue
+			subtree_ids = (child.getAttribute("id") for child in XMLTools.walk_elements(node) if child.hasAttribute("id"))
+			if not any(element_id in reachable for element_id in subtree_ids):
+				yield node
@@ -49,6 +49,12 @@ class SVGStyle():
 	def shape_inside(self, obj):
 		self["shape-inside"] = f"url(#{obj.svgid})"
 
+	@property
+	def canonical(self):
+		# Order-independent representation of all declarations, usable as a
+		# dictionary key to find identical styles.
+		return tuple(sorted(self._style.items()))
+
 	@property
 	def is_visible(self):
 		if "display" in self._style:
@@ -96,6 +102,10 @@ class SVGStyle():
 			self._node.removeAttribute("style")
 		else:
 			self._node.setAttribute("style", self.serialize())
+		svg_document = getattr(self._node.ownerDocument, "_pysvgedit", None)
+		if svg_document is not None:
+			svg_document.invalidate_style(self._node)
+			svg_document.references_changed(self._node)
 
 	def serialize(self):
 		return ";".join("%s:%s" % (key, value) for (key, value) in self._style.items())
@@ -139,9 +149,10 @@ class SVGStyle():
 
 	def _setitem(self, key, value):
 		changed = False
-		if (value is None) and (key in self._style):
-			del self._style[key]
-			changed = True
+		if value is None:
+			if key in self._style:
+				del self._style[key]
+				changed = True
 		else:
 			changed = self[key] != value
 			self._style[key] = value
@@ -161,5 +172,11 @@ class SVGStyle():
 				value = value[1 : -1]
 		return value
 
+	def __len__(self):
+		return len(self._style)
+
+	def __iter__(self):
+		return iter(self._style.items())
+
 	def __str__(self):
 		return f"SVGStyle<{self._style}>"
@@ -0,0 +1,190 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+import collections
+from .SVGStyle import SVGStyle
+from .SVGStyleSheet import SVGStyleSheet
+from .SVGStyleResolver import SVGStyleResolver, SVGSelector
+from .XMLTools import XMLTools
+
+class SVGStyleDeduplication():
+	# Moves inline "style" attributes that occur at least "threshold" times
+	# into a shared <style> element inside the defs and references them by
+	# "class" attribute instead. Elements that already carry a "class"
+	# attribute are left untouched, since adding another class could change
+	# the outcome of the cascade; so are elements that existing stylesheet
+	# rules apply to, since these could then override the moved declarations.
+	_SELECTOR_CLASS_RE = re.compile(r"\.(?P<name>-?[_a-zA-Z][-_a-zA-Z0-9]*)")
+	_CLASS_SPECIFICITY = (0, 1, 0)
+
+	def __init__(self, svg_document, threshold: int = 2, class_prefix: str = "s"):
+		self._svg_document = svg_document
+		self._threshold = threshold
+		self._class_prefix = class_prefix
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	def _stylesheet(self):
+		defs = self.svg_document.defs
+		try:
+			return SVGStyleSheet(XMLTools.find_first_element(defs.node, SVGStyleSheet.get_tagname()))
+		except StopIteration:
+			return defs.add(SVGStyleSheet.new())
+
+	def _stylesheet_rules(self):
+		# All rules of all stylesheets in cascade order as (rule, selector,
+		# declarations) tuples. The selector is None if the resolver cannot
+		# interpret it; declarations map keys to (value, important) tuples.
+		return [ (rule, SVGSelector.parse(rule.selector), { key: SVGStyleResolver.split_important(value) for (key, value) in rule.style }) for stylesheet in self.svg_document.walk(SVGStyleSheet) for rule in stylesheet.rules ]
+
+	@classmethod
+	def _may_apply(cls, node, selector, declarations, keys):
+		# Selectors that cannot be interpreted might apply to anything.
+		if not any(key in keys for key in declarations):
+			return False
+		return (selector is None) or selector.matches(node)
+
+	def _used_class_names(self):
+		used_class_names = set()
+		for node in XMLTools.walk_elements(self.svg_document.node, constraint = lambda node: node.hasAttribute("class")):
+			used_class_names |= set(node.getAttribute("class").split())
+		for stylesheet in self.svg_document.walk(SVGStyleSheet):
+			for rule in stylesheet.rules:
+				used_class_names |= set(rematch["name"] for rematch in self._SELECTOR_CLASS_RE.finditer(rule.selector))
+		return used_class_names
+
+	def _generate_class_names(self):
+		used_class_names = self._used_class_names()
+		ctr = 0
+		while True:
+			ctr += 1
+			class_name = f"{self._class_prefix}{ctr}"
+			if class_name not in used_class_names:
+				yield class_name
+
+	def extract(self):
+		stylesheet_rules = self._stylesheet_rules()
+		nodes_by_style = collections.defaultdict(list)
+		for node in XMLTools.walk_elements(self.svg_document.node, constraint = lambda node: node.hasAttribute("style") and (not node.hasAttribute("class"))):
+			style = SVGStyle.from_node(node)
+			if len(style) == 0:
+				continue
+			keys = set(key for (key, value) in style)
+			if any(self._may_apply(node, selector, declarations, keys) for (_, selector, declarations) in stylesheet_rules):
+				continue
+			nodes_by_style[style.canonical].append(node)
+
+		class_names = self._generate_class_names()
+		rules = [ ]
+		for (canonical, nodes) in nodes_by_style.items():
+			if len(nodes) < self._threshold:
+				continue
+			class_name = next(class_names)
+			rules.append((f".{class_name}", SVGStyle(dict(canonical))))
+			for node in nodes:
+				node.removeAttribute("style")
+				node.setAttribute("class", class_name)
+				self.svg_document.references_changed(node)
+
+		if len(rules) > 0:
+			stylesheet = self._stylesheet()
+			for (selector, style) in rules:
+				stylesheet.add_rule(selector, style)
+		return len(rules)
+
+	def _overrides_class_rules(self, node, selector, declarations, order, winners):
+		# Determines if a foreign rule takes precedence over the winning
+		# class rule declaration of any property.
+		if not self._may_apply(node, selector, declarations, winners):
+			return False
+		specificity = (selector.specificity if (selector is not None) else self._CLASS_SPECIFICITY)
+		for (key, (_, important)) in declarations.items():
+			if key not in winners:
+				continue
+			(_, class_important, class_order) = winners[key]
+			if (important, specificity, order) > (class_important, self._CLASS_SPECIFICITY, class_order):
+				return True
+		return False
+
+	def inline(self):
+		# Reverse operation of extract(): plain class selector rules are
+		# removed from the stylesheets and inlined into the elements that
+		# reference them. Elements for which another rule would override a
+		# class declaration keep their classes (and the rules are kept), and
+		# so do classes that other selectors refer to.
+		class_rules = collections.defaultdict(list)
+		foreign_rules = [ ]
+		referenced_class_names = set()
+		for (order, (rule, selector, declarations)) in enumerate(self._stylesheet_rules()):
+			if rule.class_name is not None:
+				class_rules[rule.class_name].append((order, rule.style, declarations))
+			else:
+				foreign_rules.append((order, selector, declarations))
+				referenced_class_names |= set(rematch["name"] for rematch in self._SELECTOR_CLASS_RE.finditer(rule.selector))
+		for class_name in referenced_class_names:
+			class_rules.pop(class_name, None)
+		if len(class_rules) == 0:
+			return 0
+
+		inlined_count = 0
+		kept_class_names = set()
+		for node in list(XMLTools.walk_elements(self.svg_document.node, constraint = lambda node: node.hasAttribute("class"))):
+			classes = node.getAttribute("class").split()
+			inlined_classes = set(class_name for class_name in classes if class_name in class_rules)
+			if len(inlined_classes) == 0:
+				continue
+
+			# All plain class rules have the same specificity, so the last
+			# (important) declaration of each property wins.
+			winners = { }
+			for (order, style, declarations) in sorted((entry for class_name in inlined_classes for entry in class_rules[class_name]), key = lambda entry: entry[0]):
+				for (key, value) in style:
+					important = declarations[key][1]
+					if (key not in winners) or important or (not winners[key][1]):
+						winners[key] = (value, important, order)
+			if any(self._overrides_class_rules(node, selector, declarations, order, winners) for (order, selector, declarations) in foreign_rules):
+				kept_class_names |= inlined_classes
+				continue
+
+			style_dict = { key: value for (key, (value, _, _)) in winners.items() }
+			for (key, value) in SVGStyle.from_node(node):
+				if (key in winners) and winners[key][1] and (not SVGStyleResolver.split_important(value)[1]):
+					continue
+				style_dict[key] = value
+			style = SVGStyle(style_dict)
+			style.node = node
+			style.sync_node_style()
+			remaining_classes = [ class_name for class_name in classes if class_name not in inlined_classes ]
+			if len(remaining_classes) == 0:
+				node.removeAttribute("class")
+			else:
+				node.setAttribute("class", " ".join(remaining_classes))
+			inlined_count += 1
+
+		removed_class_names = set(class_rules) - kept_class_names
+		if len(removed_class_names) > 0:
+			for stylesheet in list(self.svg_document.walk(SVGStyleSheet)):
+				if stylesheet.remove_class_rules(removed_class_names) > 0:
+					if stylesheet.css_text.strip() == "":
+						stylesheet.remove()
+		return inlined_count
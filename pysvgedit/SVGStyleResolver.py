@@ -0,0 +1,334 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+import dataclasses
+from .SVGStyle import SVGStyle
+from .SVGStyleSheet import SVGStyleSheet
+from .XMLTools import XMLTools
+
+@dataclasses.dataclass
+class SVGSelectorCompound():
+	tagname: str | None
+	svgid: str | None
+	classes: tuple
+
+	def matches(self, node):
+		if (self.tagname is not None) and (node.tagName != self.tagname):
+			return False
+		if (self.svgid is not None) and (node.getAttribute("id") != self.svgid):
+			return False
+		if len(self.classes) > 0:
+			node_classes = node.getAttribute("class").split()
+			if not all(class_name in node_classes for class_name in self.classes):
+				return False
+		return True
+
+class SVGSelector():
+	_TOKEN_RE = re.compile(r"\s*(?P<token>>|[^\s>]+)")
+	_COMPOUND_RE = re.compile(r"(?P<tagname>\*|[a-zA-Z][-_a-zA-Z0-9]*)?(?P<qualifiers>(?:[.#]-?[_a-zA-Z][-_a-zA-Z0-9]*)*)")
+	_QUALIFIER_RE = re.compile(r"(?P<kind>[.#])(?P<name>-?[_a-zA-Z][-_a-zA-Z0-9]*)")
+
+	def __init__(self, parts):
+		# Parts are stored right-to-left, i.e., the subject of the selector
+		# comes first. Each part is a (combinator, compound) tuple, where the
+		# combinator describes the relationship to the part to its left.
+		self._parts = parts
+
+	@property
+	def subject(self):
+		return self._parts[0][1]
+
+	@property
+	def has_combinators(self):
+		return len(self._parts) > 1
+
+	@property
+	def specificity(self):
+		ids = sum(1 for (_, compound) in self._parts if compound.svgid is not None)
+		classes = sum(len(compound.classes) for (_, compound) in self._parts)
+		tags = sum(1 for (_, compound) in self._parts if compound.tagname is not None)
+		return (ids, classes, tags)
+
+	@classmethod
+	def _parse_compound(cls, text):
+		rematch = cls._COMPOUND_RE.fullmatch(text)
+		if (rematch is None) or (text == ""):
+			return None
+		tagname = rematch["tagname"]
+		if tagname == "*":
+			tagname = None
+		svgid = None
+		classes = [ ]
+		for qualifier in cls._QUALIFIER_RE.finditer(rematch["qualifiers"]):
+			if qualifier["kind"] == "#":
+				svgid = qualifier["name"]
+			else:
+				classes.append(qualifier["name"])
+		return SVGSelectorCompound(tagname = tagname, svgid = svgid, classes = tuple(classes))
+
+	@classmethod
+	def parse(cls, selector_text: str):
+		# Only type, class, ID and universal selectors combined by descendant
+		# or child combinators are supported; returns None for everything
+		# else (attribute selectors, pseudo-classes, ...).
+		parts = [ ]
+		combinator = " "
+		for token in cls._TOKEN_RE.findall(selector_text):
+			if token == ">":
+				if (len(parts) == 0) or (combinator == ">"):
+					return None
+				combinator = ">"
+				continue
+			compound = cls._parse_compound(token)
+			if compound is None:
+				return None
+			parts.append((combinator, compound))
+			combinator = " "
+		if (len(parts) == 0) or (combinator == ">"):
+			return None
+
+		# Match right-to-left, i.e., the subject of the selector comes first.
+		return cls(list(reversed(parts)))
+
+	def _matches_from(self, part_index, node):
+		(combinator, compound) = self._parts[part_index]
+		if not compound.matches(node):
+			return False
+		if part_index + 1 == len(self._parts):
+			return True
+
+		parent = node.parentNode
+		if combinator == ">":
+			return (parent is not None) and (parent.nodeType == parent.ELEMENT_NODE) and self._matches_from(part_index + 1, parent)
+		while (parent is not None) and (parent.nodeType == parent.ELEMENT_NODE):
+			if self._matches_from(part_index + 1, parent):
+				return True
+			parent = parent.parentNode
+		return False
+
+	def matches(self, node):
+		return self._matches_from(0, node)
+
+class SVGStyleResolver():
+	# Properties that are inherited from the parent element if they are not
+	# specified for an element itself.
+	INHERITED_PROPERTIES = set([
+		"clip-rule", "color", "color-interpolation", "color-rendering", "cursor", "direction",
+		"fill", "fill-opacity", "fill-rule", "font", "font-family", "font-size", "font-size-adjust",
+		"font-stretch", "font-style", "font-variant", "font-variant-ligatures", "font-feature-settings",
+		"font-weight", "glyph-orientation-horizontal", "glyph-orientation-vertical", "image-rendering",
+		"letter-spacing", "line-height", "marker", "marker-end", "marker-mid", "marker-start",
+		"paint-order", "pointer-events", "shape-rendering", "stroke", "stroke-dasharray",
+		"stroke-dashoffset", "stroke-linecap", "stroke-linejoin", "stroke-miterlimit",
+		"stroke-opacity", "stroke-width", "text-align", "text-anchor", "text-rendering",
+		"visibility", "white-space", "word-spacing", "writing-mode",
+	])
+
+	# Properties that may also be given as an attribute of the same name
+	# ("presentation attributes"). They have the lowest precedence.
+	PRESENTATION_ATTRIBUTES = INHERITED_PROPERTIES | set([
+		"alignment-baseline", "baseline-shift", "clip", "clip-path", "display", "dominant-baseline",
+		"filter", "flood-color", "flood-opacity", "lighting-color", "mask", "opacity", "overflow",
+		"stop-color", "stop-opacity", "text-decoration", "transform-origin", "unicode-bidi",
+		"vector-effect",
+	]) - set([ "font", "line-height", "text-align", "white-space" ])
+
+	_IMPORTANT_RE = re.compile(r"\s*!\s*important\s*$", flags = re.IGNORECASE)
+
+	def __init__(self, svg_document):
+		self._svg_document = svg_document
+		self._cache = { }
+		self._instance_cache = { }
+		self._rules = None
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	def _index_rules(self):
+		rules = {
+			"id":		{ },
+			"class":	{ },
+			"tag":		{ },
+			"any":		[ ],
+		}
+		order = 0
+		for stylesheet in self.svg_document.walk(SVGStyleSheet):
+			for rule in stylesheet.rules:
+				selector = SVGSelector.parse(rule.selector)
+				if selector is None:
+					continue
+				declarations = { key: self.split_important(value) for (key, value) in rule.style }
+				entry = (selector.specificity, order, selector, declarations)
+				order += 1
+
+				subject = selector.subject
+				if subject.svgid is not None:
+					rules["id"].setdefault(subject.svgid, [ ]).append(entry)
+				elif len(subject.classes) > 0:
+					rules["class"].setdefault(subject.classes[0], [ ]).append(entry)
+				elif subject.tagname is not None:
+					rules["tag"].setdefault(subject.tagname, [ ]).append(entry)
+				else:
+					rules["any"].append(entry)
+		return rules
+
+	@property
+	def rules(self):
+		if self._rules is None:
+			self._rules = self._index_rules()
+		return self._rules
+
+	@classmethod
+	def split_important(cls, value: str):
+		# "red !important" -> ("red", True)
+		rematch = cls._IMPORTANT_RE.search(value)
+		if rematch is None:
+			return (value, False)
+		return (value[:rematch.start()], True)
+
+	def _matching_rules(self, node):
+		rules = self.rules
+		candidates = list(rules["any"])
+		candidates += rules["tag"].get(node.tagName, [ ])
+		if node.hasAttribute("id"):
+			candidates += rules["id"].get(node.getAttribute("id"), [ ])
+		if node.hasAttribute("class"):
+			for class_name in set(node.getAttribute("class").split()):
+				candidates += rules["class"].get(class_name, [ ])
+		candidates.sort(key = lambda entry: (entry[0], entry[1]))
+		return (declarations for (_, _, selector, declarations) in candidates if selector.matches(node))
+
+	def _cascade(self, node):
+		# Returns all declarations that apply to the node itself, in order of
+		# increasing precedence: presentation attributes, stylesheet rules,
+		# inline style, !important stylesheet rules, !important inline style.
+		declared = { }
+		important = { }
+		important_inline = { }
+		if node.attributes is not None:
+			for (name, value) in node.attributes.items():
+				if name in self.PRESENTATION_ATTRIBUTES:
+					declared[name] = value.strip()
+		for declarations in self._matching_rules(node):
+			for (key, (value, is_important)) in declarations.items():
+				(important if is_important else declared)[key] = value
+		if node.hasAttribute("style"):
+			for (key, value) in SVGStyle.from_style_str(node.getAttribute("style")):
+				(value, is_important) = self.split_important(value)
+				(important_inline if is_important else declared)[key] = value
+		declared.update(important)
+		declared.update(important_inline)
+		return declared
+
+	def _compute(self, node, parent_computed):
+		computed = { key: value for (key, value) in parent_computed.items() if key in self.INHERITED_PROPERTIES }
+		for (key, value) in self._cascade(node).items():
+			if value == "inherit":
+				if key in parent_computed:
+					computed[key] = parent_computed[key]
+				else:
+					computed.pop(key, None)
+			else:
+				computed[key] = value
+		return computed
+
+	def _resolve(self, node):
+		# Climb up until we find a cached (or the root) element, then compute
+		# all styles downwards. This keeps a full document traversal linear.
+		if node in self._cache:
+			return self._cache[node]
+		uncached = [ ]
+		parent_computed = { }
+		for element in XMLTools.all_parent_elements(node):
+			if element in self._cache:
+				parent_computed = self._cache[element]
+				break
+			uncached.append(element)
+		for element in reversed(uncached):
+			parent_computed = self._compute(element, parent_computed)
+			self._cache[element] = parent_computed
+		return parent_computed
+
+	def _referenced_by(self, use_node):
+		for name in ("xlink:href", "href"):
+			if use_node.getAttribute(name).startswith("#"):
+				return self.svg_document.reference_graph.resolve(use_node.getAttribute(name)[1:])
+		return None
+
+	def _resolve_instance(self, node, instance_chain):
+		# Content instantiated by a <use> element inherits from the <use> and
+		# not from where it is defined. instance_chain holds the <use>
+		# elements through which the node is rendered, outermost first.
+		if len(instance_chain) == 0:
+			return self._resolve(node)
+		key = (node, instance_chain)
+		if key in self._instance_cache:
+			return self._instance_cache[key]
+
+		referenced = self._referenced_by(instance_chain[-1])
+		uncached = [ ]
+		for element in XMLTools.all_parent_elements(node):
+			uncached.append(element)
+			if element is referenced:
+				break
+		else:
+			# Not part of the instantiated content
+			return self._resolve(node)
+
+		parent_computed = self._resolve_instance(instance_chain[-1], instance_chain[:-1])
+		for element in reversed(uncached):
+			element_key = (element, instance_chain)
+			if element_key not in self._instance_cache:
+				self._instance_cache[element_key] = self._compute(element, parent_computed)
+			parent_computed = self._instance_cache[element_key]
+		return parent_computed
+
+	def get(self, node, instance_chain: tuple = ()):
+		return SVGStyle(dict(self._resolve_instance(node, instance_chain)))
+
+	def get_property(self, node, key: str, unstringify = False, instance_chain: tuple = ()):
+		value = self._resolve_instance(node, instance_chain).get(key)
+		if unstringify and (value is not None):
+			value = SVGStyle({ key: value }).get(key, unstringify = True)
+		return value
+
+	def is_displayed(self, node):
+		# "display" is not inherited, but an element is not rendered if any of
+		# its ancestors has "display:none".
+		return all(self._resolve(element).get("display") != "none" for element in XMLTools.all_parent_elements(node))
+
+	def invalidate(self, node):
+		# Drop the cached computed style of the node and its entire subtree,
+		# all other cached values remain valid.
+		if node.nodeType != node.ELEMENT_NODE:
+			return
+		self._instance_cache = { }
+		if node.tagName == SVGStyleSheet.get_tagname():
+			self.invalidate_all()
+			return
+		for element in XMLTools.walk_elements(node):
+			self._cache.pop(element, None)
+
+	def invalidate_all(self):
+		self._cache = { }
+		self._instance_cache = { }
+		self._rules = None
@@ -0,0 +1,174 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import re
+import dataclasses
+from .SVGObject import SVGObject
+from .SVGStyle import SVGStyle
+
+@dataclasses.dataclass
+class SVGStyleSheetRule():
+	selector: str
+	style: SVGStyle
+
+	@property
+	def class_name(self):
+		# Returns the class name if the selector is a plain class selector
+		# (e.g., ".foo"), None otherwise.
+		if SVGStyleSheet.CLASS_SELECTOR_RE.fullmatch(self.selector):
+			return self.selector[1:]
+		return None
+
+	def serialize(self):
+		return f"{self.selector}{{{self.style.serialize()}}}"
+
+@SVGObject.register
+class SVGStyleSheet(SVGObject):
+	_TAG_NAME = "style"
+	_COMMENT_RE = re.compile(r"/\*.*?\*/", flags = re.DOTALL)
+	_RULE_RE = re.compile(r"(?P<selectors>[^{}]+)\{(?P<declarations>[^{}]*)\}")
+	CLASS_SELECTOR_RE = re.compile(r"\.-?[_a-zA-Z][-_a-zA-Z0-9]*")
+
+	@property
+	def css_text(self):
+		return "".join(child.data for child in self.node.childNodes if child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE))
+
+	@css_text.setter
+	def css_text(self, value: str):
+		for child in list(self.node.childNodes):
+			self.node.removeChild(child)
+		self.node.appendChild(self.node.ownerDocument.createTextNode(value))
+		if self.svg_document is not None:
+			self.svg_document.invalidate_style(self.node)
+			self.svg_document.references_changed(self.node)
+
+	@classmethod
+	def _at_rule_end(cls, css_text: str, pos: int):
+		# Returns the position after the at-rule that starts at "pos",
+		# including its possibly nested block.
+		depth = 0
+		while pos < len(css_text):
+			char = css_text[pos]
+			pos += 1
+			if char == "{":
+				depth += 1
+			elif char == "}":
+				depth -= 1
+				if depth <= 0:
+					break
+			elif (char == ";") and (depth == 0):
+				break
+		return pos
+
+	@classmethod
+	def _remove_at_rules(cls, css_text: str):
+		# At-rules (@media, @keyframes, ...) are not interpreted; they are
+		# removed including their possibly nested blocks.
+		remaining = [ ]
+		pos = 0
+		while (start := css_text.find("@", pos)) != -1:
+			remaining.append(css_text[pos : start])
+			pos = cls._at_rule_end(css_text, start)
+		remaining.append(css_text[pos:])
+		return "".join(remaining)
+
+	@classmethod
+	def parse_css(cls, css_text: str):
+		css_text = cls._remove_at_rules(cls._COMMENT_RE.sub("", css_text))
+		rules = [ ]
+		for rematch in cls._RULE_RE.finditer(css_text):
+			selectors = rematch["selectors"].strip()
+			style = SVGStyle.from_style_str(rematch["declarations"])
+			for selector in selectors.split(","):
+				selector = " ".join(selector.split())
+				if selector != "":
+					rules.append(SVGStyleSheetRule(selector = selector, style = style))
+		return rules
+
+	@property
+	def rules(self):
+		return self.parse_css(self.css_text)
+
+	@property
+	def class_rules(self):
+		return { rule.class_name: rule.style for rule in self.rules if rule.class_name is not None }
+
+	def add_rules(self, rules):
+		css_text = self.css_text.rstrip("\n")
+		lines = [ css_text ] if (css_text != "") else [ ]
+		lines += [ rule.serialize() for rule in rules ]
+		self.css_text = "\n".join(lines) + "\n"
+
+	def add_rule(self, selector: str, style: SVGStyle):
+		self.add_rules([ SVGStyleSheetRule(selector = selector, style = style) ])
+
+	def remove_class_rules(self, class_names: set):
+		# Removes the plain class selectors (e.g., ".foo") of the given classes
+		# from the stylesheet. Everything else, including comments and
+		# at-rules, is kept verbatim. Returns the number of removed selectors.
+		css_text = self.css_text
+		remaining = [ ]
+		removed_count = 0
+		pos = 0
+		scan = 0
+		while scan < len(css_text):
+			if css_text[scan].isspace():
+				scan += 1
+				continue
+			if css_text.startswith("/*", scan):
+				comment_end = css_text.find("*/", scan + 2)
+				scan = len(css_text) if (comment_end == -1) else (comment_end + 2)
+				continue
+			if css_text[scan] == "@":
+				scan = self._at_rule_end(css_text, scan)
+				continue
+			block_start = css_text.find("{", scan)
+			if block_start == -1:
+				break
+			block_end = css_text.find("}", block_start)
+			block_end = len(css_text) if (block_end == -1) else (block_end + 1)
+
+			selectors = [ " ".join(selector.split()) for selector in self._COMMENT_RE.sub("", css_text[scan : block_start]).split(",") ]
+			kept_selectors = [ selector for selector in selectors if not (self.CLASS_SELECTOR_RE.fullmatch(selector) and (selector[1:] in class_names)) ]
+			if len(kept_selectors) < len(selectors):
+				removed_count += len(selectors) - len(kept_selectors)
+				prefix = css_text[pos : scan]
+				if len(kept_selectors) > 0:
+					remaining += [ prefix, ", ".join(kept_selectors) + " " ]
+					pos = block_start
+				else:
+					# Drop the entire rule, including its line
+					if (prefix.rstrip(" \t") == "") or prefix.rstrip(" \t").endswith("\n"):
+						prefix = prefix.rstrip(" \t")
+					if css_text.startswith("\n", block_end):
+						block_end += 1
+					remaining.append(prefix)
+					pos = block_end
+			scan = block_end
+		if removed_count > 0:
+			remaining.append(css_text[pos:])
+			self.css_text = "".join(remaining)
+		return removed_count
+
+	@classmethod
+	def new(cls):
+		stylesheet = cls(cls._new_element())
+		stylesheet.node.setAttribute("type", "text/css")
+		return stylesheet
@@ -0,0 +1,152 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import logging
+import dataclasses
+from .SVGDocument import SVGDocument
+from .SVGStyle import SVGStyle
+from .MakoTemplateCache import MakoTemplateCache
+from .XMLTools import XMLTools
+
+_log = logging.getLogger(__spec__.name)
+
+@dataclasses.dataclass
+class SVGTemplateHole():
+	tspan: object
+	text: str
+	template: object
+	referenced_variables: tuple | None
+	previous_values: tuple | None = None
+	previous_text: str | None = None
+
+class SVGTemplate():
+	# A document prepared for repeated Mako rendering: all templated tspans
+	# ("holes") are determined and compiled once and all elements that can
+	# be targeted by style patches are indexed by their ID. Rendering only
+	# mutates the holes, serializes the document and then restores the
+	# original state, so the same object can render any number of datasets.
+	#
+	# Each hole knows which top-level variables its template reads. When
+	# those compare equal to the ones of the previous render, the previously
+	# rendered text is reused without evaluating the template. Values that
+	# are modified in-place between two renders are therefore not detected.
+	_UNSET = object()
+
+	def __init__(self, svg_document: SVGDocument, template_cache: MakoTemplateCache | None = None, ignore_errors: bool = False, patch_style: bool = False):
+		self._svg_document = svg_document
+		self._template_cache = template_cache if (template_cache is not None) else MakoTemplateCache.default()
+		self._ignore_errors = ignore_errors
+		self._patch_style = patch_style
+		self._holes = [ ]
+		for tspan in svg_document.walk("tspan"):
+			text = tspan.text
+			if text != "":
+				referenced_variables = self._template_cache.referenced_variables(text)
+				if referenced_variables is not None:
+					referenced_variables = tuple(sorted(referenced_variables))
+				self._holes.append(SVGTemplateHole(tspan = tspan, text = text, template = self._template_cache.get(text), referenced_variables = referenced_variables))
+		self._evaluation_count = 0
+		self._elements_by_id = { node.getAttribute("id"): node for node in XMLTools.walk_elements(svg_document.node) if node.hasAttribute("id") }
+
+	@classmethod
+	def readfile(cls, filename: str, **kwargs):
+		return cls(SVGDocument.readfile(filename), **kwargs)
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	@property
+	def hole_count(self):
+		return len(self._holes)
+
+	@property
+	def evaluation_count(self):
+		return self._evaluation_count
+
+	def _render_text(self, text, template, template_data):
+		try:
+			return template.render(**template_data)
+		except Exception as e:
+			if not self._ignore_errors:
+				raise
+			rendered_text = f"{e.__class__.__name__}: {e}"
+			_log.info("Error rendering %s: %s", text, rendered_text)
+			return rendered_text
+
+	def _evaluate_hole(self, hole, template_data):
+		if hole.referenced_variables is None:
+			self._evaluation_count += 1
+			return self._render_text(hole.text, hole.template, template_data)
+
+		values = tuple(template_data.get(variable, self._UNSET) for variable in hole.referenced_variables)
+		if (hole.previous_values is not None) and (values == hole.previous_values):
+			return hole.previous_text
+
+		self._evaluation_count += 1
+		hole.previous_values = None
+		rendered_text = self._render_text(hole.text, hole.template, template_data)
+		hole.previous_values = values
+		hole.previous_text = rendered_text
+		return rendered_text
+
+	def _fill_holes(self, template_data, undo):
+		for hole in self._holes:
+			rendered_text = self._evaluate_hole(hole, template_data)
+			if rendered_text != hole.text:
+				_log.debug("%s -> %s", hole.text, rendered_text)
+				# Setting the text removes the x/y position, keep it for undo
+				tspan = hole.tspan
+				undo.append((tspan, hole.text, tspan.node.getAttribute("x") if tspan.node.hasAttribute("x") else None, tspan.node.getAttribute("y") if tspan.node.hasAttribute("y") else None))
+				tspan.text = rendered_text
+
+	def _apply_style_patches(self, template_data, undo):
+		for (style_id, style_update) in template_data.get("svg_style_patches", { }).items():
+			node = self._elements_by_id.get(style_id)
+			if node is None:
+				_log.warning("Style update of '%s' requested, but no such element found.", style_id)
+				continue
+			undo.append((node, node.getAttribute("style") if node.hasAttribute("style") else None))
+			style = SVGStyle.from_node(node, auto_sync = True)
+			style.update(style_update)
+
+	def _restore(self, text_undo, style_undo):
+		for (tspan, text, x, y) in reversed(text_undo):
+			tspan.text = text
+			if x is not None:
+				tspan.node.setAttribute("x", x)
+			if y is not None:
+				tspan.node.setAttribute("y", y)
+		for (node, style_str) in reversed(style_undo):
+			if style_str is None:
+				XMLTools.try_remove_attribute(node, "style")
+			else:
+				node.setAttribute("style", style_str)
+			self._svg_document.invalidate_style(node)
+
+	def render(self, template_data: dict):
+		(text_undo, style_undo) = ([ ], [ ])
+		try:
+			self._fill_holes(template_data, text_undo)
+			if self._patch_style:
+				self._apply_style_patches(template_data, style_undo)
+			return self._svg_document.asbytes()
+		finally:
+			self._restore(text_undo, style_undo)
@@ -18,8 +18,11 @@
 #	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+from .Vector2D import Vector2D
 from .SVGRect import SVGRect
 from .SVGObject import SVGObject, SVGXYObject, SVGStyleObject
+from .SVGTextExtents import SVGTextExtents
+from .SVGTextLayout import SVGTextLayout
 from .XMLTools import XMLTools
 
 @SVGObject.register
@@ -53,8 +56,29 @@ class SVGTextSpan(SVGObject, SVGXYObject, SVGStyleObject):
 		# If text is replaced, we need to remove the X/Y coordinates
 		XMLTools.try_remove_attribute(self.node, "x")
 		XMLTools.try_remove_attribute(self.node, "y")
+		self._geometry_changed()
+		if value == "":
+			# replaceWholeText("") would detach our text node, so that the span
+			# could never be filled again; keep it, but empty.
+			self._text_node.replaceWholeText(" ")
+			self._text_node.data = ""
+			return self._text_node
 		return self._text_node.replaceWholeText(value)
 
+	@property
+	def svg_text(self):
+		for node in XMLTools.all_parent_elements(self.node):
+			if node.tagName == SVGText.get_tagname():
+				return SVGText(node)
+		return None
+
+	def text_extents(self, inventory = None):
+		svg_text = self.svg_text
+		if svg_text is None:
+			return None
+		fragments = svg_text.text_fragments(inventory = inventory)
+		return SVGTextExtents.bounding_box(fragment for fragment in fragments if self.node in XMLTools.all_parent_elements(fragment.node))
+
 	def __repr__(self):
 		return f"tspan<{self.text}>"
 
@@ -81,16 +105,83 @@ class SVGText(SVGObject, SVGStyleObject):
 		svg_text.add_span(SVGTextSpan.new(pos = pos, text = text))
 		return svg_text
 
+	def text_fragments(self, inventory = None):
+		return SVGTextExtents(self, inventory = inventory).fragments
+
+	def text_extents(self, inventory = None):
+		return SVGTextExtents.bounding_box(self.text_fragments(inventory = inventory))
+
+	@property
+	def text(self):
+		# Inkscape stores every line of multi-line text in a tspan with
+		# sodipodi:role="line"; these become paragraphs separated by newlines.
+		parts = [ ]
+		for child in self.node.childNodes:
+			if child.nodeType == child.ELEMENT_NODE:
+				if (child.getAttribute("sodipodi:role") == "line") and (len(parts) > 0):
+					parts.append("\n")
+				parts += (node.data for node in XMLTools.walk_text_nodes(child))
+			elif child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE):
+				parts.append(child.data)
+		return "".join(parts)
+
+	def layout(self, inventory = None):
+		# Line-breaking layout of flowed text; only rectangular shapes are
+		# supported. Per-tspan style differences are not considered, the
+		# computed style of the <text> element determines the layout.
+		inside_shape = self.svg_document.defs.get(self.style.shape_inside)
+		if not isinstance(inside_shape, SVGRect):
+			return None
+		style = self.computed_style
+		text_layout = SVGTextLayout.from_style(style, width = inside_shape.extents.x, inventory = inventory)
+		return text_layout.layout(self.text, pos = inside_shape.pos, extents = inside_shape.extents)
+
+	def apply_layout(self, layout_result = None):
+		# Replace flowed text by explicitly positioned tspans, one per line.
+		if layout_result is None:
+			layout_result = self.layout()
+			if layout_result is None:
+				return None
+		for tspan in list(self.tspans):
+			tspan.remove()
+		for node in list(self.node.childNodes):
+			if node.nodeType == node.TEXT_NODE:
+				self.node.removeChild(node)
+
+		(text_anchor, anchor_x) = {
+			"center":	("middle", lambda line: line.pos.x + line.width / 2),
+			"right":	("end", lambda line: line.pos.x + line.width),
+		}.get(layout_result.text_align, ("start", lambda line: line.pos.x))
+		self.style.update({
+			"shape-inside":		None,
+			"text-anchor":		text_anchor,
+		})
+		for line in layout_result.lines:
+			tspan = self.add_span(SVGTextSpan.new(text = line.text))
+			tspan.node.setAttribute("sodipodi:role", "line")
+			tspan.pos = Vector2D(anchor_x(line), line.pos.y)
+			if line.word_spacing != 0:
+				tspan.style["word-spacing"] = f"{line.word_spacing}px"
+		return layout_result
+
 	def hull_vertices(self, max_interpolation_count = 4):
 		inside_shape = self.svg_document.defs.get(self.style.shape_inside)
 		if inside_shape is not None:
-			# If inside shape is defined, all is well; otherwise we would need
-			# to render the actual text/glyphs to determine the extents, which
-			# we don't do.
+			# If inside shape is defined, all is well; it determines the
+			# extents of the flowed text.
 			yield from inside_shape.hull_vertices(max_interpolation_count = max_interpolation_count)
+		else:
+			# Otherwise, approximate the glyph boxes using font metrics.
+			for fragment in self.text_fragments():
+				yield fragment.p1
+				yield Vector2D(fragment.p1.x, fragment.p2.y)
+				yield fragment.p2
+				yield Vector2D(fragment.p2.x, fragment.p1.y)
 
 	def add_span(self, svg_text_span: SVGTextSpan):
 		self.node.appendChild(svg_text_span.node)
+		XMLTools.adopt(svg_text_span.node, self.node.ownerDocument)
+		self._geometry_changed()
 		return svg_text_span
 
 	@property
@@ -0,0 +1,152 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import functools
+import dataclasses
+from .Vector2D import Vector2D
+from .FontMetrics import FontMetrics
+
+@dataclasses.dataclass
+class SVGTextFragment():
+	node: object
+	text: str
+	pos: Vector2D
+	width: float
+	ascent: float
+	descent: float
+
+	@property
+	def p1(self):
+		return Vector2D(self.pos.x, self.pos.y - self.ascent)
+
+	@property
+	def p2(self):
+		return Vector2D(self.pos.x + self.width, self.pos.y + self.descent)
+
+class SVGTextExtents():
+	# Approximates the layout of a <text> element (without text wrapping)
+	# by means of font metrics, so that its extents can be determined without
+	# rendering. Each run of characters on one line within one element becomes
+	# a fragment; text chunks are shifted according to their "text-anchor".
+	_ANCHOR_FROM_ALIGN = {
+		"center":	"middle",
+		"end":		"end",
+		"right":	"end",
+	}
+
+	def __init__(self, svg_text, inventory = None):
+		self._svg_text = svg_text
+		self._inventory = inventory
+		self._resolver = svg_text.svg_document.style_resolver
+		self._fragments = [ ]
+		self._chunk = [ ]
+		self._chunk_anchor = "start"
+		self._line_start_x = 0
+		self._pos = Vector2D(0, 0)
+
+	@classmethod
+	def _float_attribute(cls, node, name):
+		# Only the first value of a coordinate list is considered.
+		if not node.hasAttribute(name):
+			return None
+		values = node.getAttribute(name).replace(",", " ").split()
+		if len(values) == 0:
+			return None
+		return FontMetrics.parse_length(values[0])
+
+	def _text_anchor(self, style):
+		text_anchor = style.get("text-anchor")
+		if text_anchor is None:
+			text_anchor = self._ANCHOR_FROM_ALIGN.get(style.get("text-align"), "start")
+		return text_anchor
+
+	def _flush_chunk(self):
+		if len(self._chunk) > 0:
+			chunk_width = max(fragment.pos.x + fragment.width for fragment in self._chunk) - min(fragment.pos.x for fragment in self._chunk)
+			shift = {
+				"middle":	-chunk_width / 2,
+				"end":		-chunk_width,
+			}.get(self._chunk_anchor, 0)
+			for fragment in self._chunk:
+				fragment.pos = Vector2D(fragment.pos.x + shift, fragment.pos.y)
+			self._fragments += self._chunk
+		self._chunk = [ ]
+
+	def _position(self, node, style):
+		x = self._float_attribute(node, "x")
+		y = self._float_attribute(node, "y")
+		if (x is not None) or (y is not None):
+			# Absolute position starts a new text chunk
+			self._flush_chunk()
+			self._chunk_anchor = self._text_anchor(style)
+			if x is not None:
+				self._line_start_x = x
+			self._pos = Vector2D(x if (x is not None) else self._pos.x, y if (y is not None) else self._pos.y)
+
+	def _is_preserved(self, node, style):
+		white_space = style.get("white-space")
+		if white_space in ("pre", "pre-wrap", "pre-line", "break-spaces"):
+			return True
+		for element in (node, self._svg_text.node):
+			if element.getAttribute("xml:space") == "preserve":
+				return True
+		return False
+
+	def _add_text(self, node, text, style):
+		metrics = FontMetrics.from_style(style, inventory = self._inventory)
+		if not self._is_preserved(node, style):
+			text = " ".join(text.split())
+		line_height = FontMetrics.parse_line_height(style.get("line-height"), metrics.font_size)
+		for (lineno, line) in enumerate(text.split("\n")):
+			if lineno > 0:
+				# Explicit line break
+				self._flush_chunk()
+				self._chunk_anchor = self._text_anchor(style)
+				self._pos = Vector2D(self._line_start_x, self._pos.y + line_height)
+			if line == "":
+				continue
+			width = metrics.text_width(line)
+			self._chunk.append(SVGTextFragment(node = node, text = line, pos = self._pos, width = width, ascent = metrics.ascent, descent = metrics.descent))
+			self._pos = Vector2D(self._pos.x + width, self._pos.y)
+
+	def _layout_element(self, node):
+		style = self._resolver.get(node)
+		self._position(node, style)
+		for child in node.childNodes:
+			if child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE):
+				self._add_text(node, child.data, style)
+			elif (child.nodeType == child.ELEMENT_NODE) and (child.tagName == "tspan"):
+				self._layout_element(child)
+
+	@functools.cached_property
+	def fragments(self):
+		self._chunk_anchor = self._text_anchor(self._resolver.get(self._svg_text.node))
+		self._layout_element(self._svg_text.node)
+		self._flush_chunk()
+		return self._fragments
+
+	@classmethod
+	def bounding_box(cls, fragments):
+		fragments = list(fragments)
+		if len(fragments) == 0:
+			return None
+		p1 = Vector2D(min(fragment.p1.x for fragment in fragments), min(fragment.p1.y for fragment in fragments))
+		p2 = Vector2D(max(fragment.p2.x for fragment in fragments), max(fragment.p2.y for fragment in fragments))
+		return (p1, p2)
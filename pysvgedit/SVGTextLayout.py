@@ -0,0 +1,139 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import functools
+import dataclasses
+from .Vector2D import Vector2D
+from .FontMetrics import FontMetrics
+
+@dataclasses.dataclass
+class SVGTextLine():
+	text: str
+	pos: Vector2D			# Start of the baseline
+	width: float
+	ascent: float
+	descent: float
+	word_spacing: float = 0
+
+	@property
+	def p1(self):
+		return Vector2D(self.pos.x, self.pos.y - self.ascent)
+
+	@property
+	def p2(self):
+		return Vector2D(self.pos.x + self.width, self.pos.y + self.descent)
+
+@dataclasses.dataclass
+class SVGTextLayoutResult():
+	lines: list
+	pos: Vector2D
+	extents: Vector2D
+	line_height: float
+	text_align: str
+	overflow: bool
+
+	@property
+	def height(self):
+		return len(self.lines) * self.line_height
+
+	@property
+	def overflowing_lines(self):
+		return [ line for line in self.lines if (line.p2.y > self.pos.y + self.extents.y) or (line.width > self.extents.x) ]
+
+class SVGTextLayout():
+	# Greedy line-breaking layout for flowed text (i.e., text with a
+	# "shape-inside" rectangle), mimicking what Inkscape does. Explicit
+	# newlines are honored, lines are broken at spaces only and a word that
+	# does not fit into an entire line overflows horizontally.
+	_ALIGN = {
+		"start":	"left",
+		"left":		"left",
+		"center":	"center",
+		"middle":	"center",
+		"end":		"right",
+		"right":	"right",
+		"justify":	"justify",
+	}
+
+	def __init__(self, metrics: FontMetrics, width: float, text_align: str = "left", line_height: float | None = None):
+		self._metrics = metrics
+		self._width = width
+		self._text_align = self._ALIGN.get(text_align, "left")
+		self._line_height = line_height if (line_height is not None) else FontMetrics.parse_line_height(None, metrics.font_size)
+
+	@classmethod
+	def _split_words(cls, paragraph):
+		# Words including their trailing whitespace
+		words = [ ]
+		word = ""
+		for char in paragraph:
+			if (char == " ") or (word == "") or (word[-1] != " "):
+				word += char
+			else:
+				words.append(word)
+				word = char
+		if word != "":
+			words.append(word)
+		return words
+
+	@classmethod
+	@functools.lru_cache(maxsize = 4096)
+	def break_lines(cls, text: str, metrics: FontMetrics, width: float):
+		# Returns a tuple of (line text, line width, is last line of paragraph)
+		# tuples. Cached, since it is the expensive part of the layout.
+		lines = [ ]
+		for paragraph in text.split("\n"):
+			line = ""
+			for word in cls._split_words(paragraph):
+				candidate = line + word
+				if (line != "") and (metrics.text_width(candidate.rstrip(" ")) > width):
+					lines.append((line.rstrip(" "), False))
+					line = word
+				else:
+					line = candidate
+			lines.append((line.rstrip(" "), True))
+		return tuple((line, metrics.text_width(line), paragraph_end) for (line, paragraph_end) in lines)
+
+	def layout(self, text: str, pos: Vector2D, extents: Vector2D):
+		metrics = self._metrics
+		half_leading = (self._line_height - (metrics.ascent + metrics.descent)) / 2
+		lines = [ ]
+		for (lineno, (line, line_width, paragraph_end)) in enumerate(self.break_lines(text, metrics, self._width)):
+			baseline = pos.y + (lineno * self._line_height) + half_leading + metrics.ascent
+			x = pos.x
+			word_spacing = 0
+			if self._text_align == "center":
+				x += (extents.x - line_width) / 2
+			elif self._text_align == "right":
+				x += extents.x - line_width
+			elif (self._text_align == "justify") and (not paragraph_end) and (line.count(" ") > 0):
+				word_spacing = (extents.x - line_width) / line.count(" ")
+			if word_spacing != 0:
+				line_width = extents.x
+			lines.append(SVGTextLine(text = line, pos = Vector2D(x, baseline), width = line_width, ascent = metrics.ascent, descent = metrics.descent, word_spacing = word_spacing))
+
+		overflow = (len(lines) * self._line_height > extents.y) or any(line.width > extents.x for line in lines)
+		return SVGTextLayoutResult(lines = lines, pos = pos, extents = extents, line_height = self._line_height, text_align = self._text_align, overflow = overflow)
+
+	@classmethod
+	def from_style(cls, style, width: float, inventory = None):
+		metrics = FontMetrics.from_style(style, inventory = inventory)
+		line_height = FontMetrics.parse_line_height(style.get("line-height"), metrics.font_size)
+		return cls(metrics = metrics, width = width, text_align = style.get("text-align") or "left", line_height = line_height)
@@ -18,6 +18,10 @@
 #	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import re
+import string
+import functools
+
 class SVGTransformation():
 	_IDENTIFIER = None
 
@@ -32,6 +36,52 @@ class SVGTransformation():
 		raise NotImplementedError(self.__class__.__name__)
 
 
+class CompiledFormatTemplate():
+	# Records all tspans below an object that contain str.format() templates
+	# together with the original template text and the names of the
+	# variables it references. The template can then be applied any number
+	# of times; only tspans whose referenced variables changed (by equality)
+	# since the last application are re-formatted.
+	_FORMATTER = string.Formatter()
+	_FIELD_NAME_SPLIT_RE = re.compile(r"[.\[]")
+	_UNSET = object()
+
+	def __init__(self, svg_object):
+		self._holes = [ ]
+		for tspan in svg_object.walk("tspan"):
+			text = tspan.text
+			if ("{" not in text) and ("}" not in text):
+				continue
+			self._holes.append([ tspan, text, tuple(sorted(self.referenced_variables(text))), self._UNSET ])
+
+	@property
+	def hole_count(self):
+		return len(self._holes)
+
+	@classmethod
+	def referenced_variables(cls, template_text):
+		variables = set()
+		for (_, field_name, format_spec, _) in cls._FORMATTER.parse(template_text):
+			if field_name is not None:
+				variables.add(cls._FIELD_NAME_SPLIT_RE.split(field_name, maxsplit = 1)[0])
+			if format_spec:
+				# Nested replacement fields, e.g., "{value:{width}}"
+				variables |= cls.referenced_variables(format_spec)
+		return variables
+
+	def apply(self, template_vars: dict):
+		changed_count = 0
+		for hole in self._holes:
+			(tspan, template_text, variables, previous_values) = hole
+			values = tuple(template_vars.get(variable, self._UNSET) for variable in variables)
+			if values == previous_values:
+				continue
+			tspan.text = template_text.format(**template_vars)
+			hole[3] = values
+			changed_count += 1
+		return changed_count
+
+
 class FormatTextTransformation(SVGTransformation):
 	_IDENTIFIER = "format_text"
 
@@ -39,9 +89,24 @@ class FormatTextTransformation(SVGTransformation):
 		super().__init__(svg_object)
 		self._template_vars = template_vars
 
-	def apply(self):
-		for tspan in self.svg_object.walk("tspan"):
-			tspan.text = tspan.text.format(**self._template_vars)
+	@property
+	def template_vars(self):
+		return self._template_vars
+
+	@template_vars.setter
+	def template_vars(self, value: dict):
+		self._template_vars = value
+
+	@functools.cached_property
+	def compiled(self):
+		return CompiledFormatTemplate(self.svg_object)
+
+	def apply(self, template_vars = None):
+		# Can be applied repeatedly with different variables, since the
+		# original template text is retained by the compiled template.
+		if template_vars is not None:
+			self._template_vars = template_vars
+		self.compiled.apply(self._template_vars)
 
 
 class ChangeVisibilityTransformation(SVGTransformation):
@@ -51,6 +116,10 @@ class ChangeVisibilityTransformation(SVGTransformation):
 		super().__init__(svg_object)
 		self._visible = visible
 
+	@property
+	def visible(self):
+		return self._visible
+
 	def apply(self):
 		if self._visible:
 			self.svg_object.style.show()
@@ -0,0 +1,124 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+from .Vector2D import Vector2D, TransformationMatrix
+from .SVGObject import SVGObject, SVGXYObject, SVGStyleObject
+from .Convenience import Convenience
+from .XMLTools import XMLTools
+
+@SVGObject.register
+class SVGUse(SVGObject, SVGXYObject, SVGStyleObject):
+	_TAG_NAME = "use"
+	_HREF_ATTRIBUTES = ( "xlink:href", "href" )
+
+	@property
+	def href(self):
+		for attribute in self._HREF_ATTRIBUTES:
+			if self.node.hasAttribute(attribute):
+				return self.node.getAttribute(attribute)
+		return None
+
+	@href.setter
+	def href(self, value: str):
+		XMLTools.try_remove_attribute(self.node, "href")
+		self.node.setAttribute("xlink:href", value)
+		if self.svg_document is not None:
+			self.svg_document.references_changed(self.node)
+
+	@property
+	def referenced_id(self):
+		href = self.href
+		if (href is None) or (not href.startswith("#")):
+			return None
+		return href[1:]
+
+	@property
+	def referenced_node(self):
+		referenced_id = self.referenced_id
+		if (referenced_id is None) or (self.svg_document is None):
+			return None
+		return self.svg_document.get_element_by_id(referenced_id)
+
+	@property
+	def referenced_object(self):
+		node = self.referenced_node
+		if node is None:
+			return None
+		return SVGObject.attempt_handle(node)
+
+	@property
+	def instance_matrix(self):
+		# Maps the coordinates of the referenced content into the coordinate
+		# system of the <use> element itself (i.e., before its "transform").
+		pos = self.pos
+		if (pos.x == 0) and (pos.y == 0):
+			return None
+		return TransformationMatrix.translate(pos)
+
+	def _referenced_extents(self, max_interpolation_count):
+		# Bounding box (minx, miny, maxx, maxy) of the referenced content. It
+		# is computed only once per referenced element and cached in the
+		# document until the reference graph is invalidated, so that thousands
+		# of instances of the same symbol do not walk its content every time.
+		referenced_id = self.referenced_id
+		referenced = self.referenced_object
+		if referenced is None:
+			return None
+		cache = self.svg_document.instance_extents
+		key = (referenced_id, max_interpolation_count)
+		if key in cache:
+			# None while the extents are being computed, i.e., for a cyclic
+			# reference
+			return cache[key]
+		cache[key] = None
+		(minx, miny, maxx, maxy) = (None, None, None, None)
+		for vertex in Convenience.interpolate_extents(referenced, max_interpolation_count = max_interpolation_count):
+			if (minx is None) or (vertex.x < minx):
+				minx = vertex.x
+			if (maxx is None) or (vertex.x > maxx):
+				maxx = vertex.x
+			if (miny is None) or (vertex.y < miny):
+				miny = vertex.y
+			if (maxy is None) or (vertex.y > maxy):
+				maxy = vertex.y
+		if minx is not None:
+			cache[key] = (minx, miny, maxx, maxy)
+		return cache[key]
+
+	def hull_vertices(self, max_interpolation_count = 100):
+		extents = self._referenced_extents(max_interpolation_count)
+		if extents is None:
+			return
+		(minx, miny, maxx, maxy) = extents
+		offset = self.pos
+		yield Vector2D(minx, miny) + offset
+		yield Vector2D(minx, maxy) + offset
+		yield Vector2D(maxx, maxy) + offset
+		yield Vector2D(maxx, miny) + offset
+
+	@classmethod
+	def new(cls, target, pos: Vector2D | None = None):
+		# The target object needs to have an ID, i.e., it needs to have been
+		# added to the document before.
+		use = cls(cls._new_element())
+		use.node.setAttribute("xlink:href", f"#{target.svgid}")
+		if pos is not None:
+			use.pos = pos
+		return use
@@ -21,8 +21,10 @@
 
 import enum
 import logging
-import functools
-import subprocess
+import dataclasses
+from .XMLTools import XMLTools
+from .FontInventory import FontInventory
+from .SVGReferenceGraph import SVGReferenceGraph
 from .Exceptions import SVGValidationException
 
 _log = logging.getLogger(__spec__.name)
@@ -32,34 +34,228 @@ class SVGValidatorErrorClass(enum.IntEnum):
 	EmitWarning = 1
 	ThrowException = 2
 
-class SVGValidator():
-	def __init__(self, check_missing_fonts: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning):
-		self._check_missing_fonts = check_missing_fonts
+@dataclasses.dataclass(frozen = True)
+class SVGValidationFinding():
+	rule: str
+	severity: SVGValidatorErrorClass
+	message: str
+	element_id: str | None = None
 
-	@functools.lru_cache(maxsize = 1000)
-	def _have_font(self, font_family):
-		return len(subprocess.check_output([ "fc-list", font_family ])) > 0
+class SVGValidationContext():
+	# State of one validation run that is shared between all rules.
+	def __init__(self, validator, svg_document):
+		self._validator = validator
+		self._svg_document = svg_document
+		self._elements_by_id = { }
+		self._findings = [ ]
 
-	def _check_font(self, font_name, missing_fonts):
-		if font_name is None:
-			return
-		if font_name in missing_fonts:
+	@property
+	def validator(self):
+		return self._validator
+
+	@property
+	def svg_document(self):
+		return self._svg_document
+
+	@property
+	def elements_by_id(self):
+		# Only complete once the traversal has finished, i.e., inside
+		# SVGValidationRule.finish()
+		return self._elements_by_id
+
+	@property
+	def findings(self):
+		return self._findings
+
+	def report(self, rule, message: str, node = None):
+		element_id = None if (node is None) else XMLTools.default_get_attribute(node, "id")
+		finding = SVGValidationFinding(rule = rule.name, severity = rule.severity, message = message, element_id = element_id)
+		self._findings.append(finding)
+		if finding.severity == SVGValidatorErrorClass.EmitWarning:
+			_log.warning("%s", message)
+
+class SVGValidationRule():
+	# Rules are only visited for elements whose tag is contained in _TAGS
+	# (None means all elements) and which carry at least one of the
+	# attributes in _ATTRIBUTES (None means no restriction).
+	_NAME = None
+	_TAGS = None
+	_ATTRIBUTES = None
+
+	def __init__(self, severity: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning):
+		self._severity = severity
+
+	@property
+	def name(self):
+		assert(self._NAME is not None)
+		return self._NAME
+
+	@property
+	def severity(self):
+		return self._severity
+
+	@property
+	def tags(self):
+		return self._TAGS
+
+	@property
+	def attributes(self):
+		return self._ATTRIBUTES
+
+	def start(self, context: SVGValidationContext):
+		pass
+
+	def visit(self, node, context: SVGValidationContext):
+		pass
+
+	def finish(self, context: SVGValidationContext):
+		pass
+
+class MissingFontRule(SVGValidationRule):
+	_NAME = "missing-font"
+	_TAGS = ( "text", "tspan" )
+
+	def start(self, context):
+		self._resolver = context.svg_document.style_resolver
+		self._reported = set()
+
+	def _have_font(self, font_family, font_inventory):
+		# Only the primary family of a font-family list counts; if it is
+		# missing, the text is rendered in one of the fallback fonts.
+		families = FontInventory.split_family_list(font_family)
+		return (len(families) == 0) or font_inventory.has_family(families[0])
+
+	def visit(self, node, context):
+		# Computed styles are used so that inherited fonts (e.g., from a
+		# surrounding group or a stylesheet) are considered as well.
+		font_name = self._resolver.get_property(node, "font-family", unstringify = True)
+		if (font_name is None) or (font_name in self._reported):
 			# Report only once.
 			return
-		if not self._have_font(font_name):
-			missing_fonts.add(font_name)
-			if self._check_missing_fonts == SVGValidatorErrorClass.EmitWarning:
-				_log.warning("SVG document is referencing missing font: %s", font_name)
-			elif self._check_missing_fonts == SVGValidatorErrorClass.ThrowException:
-				raise SVGValidationException(f"SVG document is referencing missing font: {font_name}")
-
-	def _validate_fonts(self, svg_document):
-		missing_fonts = set()
-		for svg_text in svg_document.walk("text"):
-			self._check_font(svg_text.style.get("font-family", unstringify = True), missing_fonts)
-			for tspan in svg_text.tspans:
-				self._check_font(tspan.style.get("font-family", unstringify = True), missing_fonts)
-
-	def validate(self, svg_document):
-		if self._check_missing_fonts != SVGValidatorErrorClass.CheckDisabled:
-			self._validate_fonts(svg_document)
+		if not self._have_font(font_name, context.validator.font_inventory):
+			self._reported.add(font_name)
+			context.report(self, f"SVG document is referencing missing font: {font_name}", node)
+
+class DanglingReferenceRule(SVGValidationRule):
+	_NAME = "dangling-reference"
+
+	def start(self, context):
+		self._references = [ ]
+
+	def visit(self, node, context):
+		# References may point forward, so they are only resolved once all
+		# IDs are known.
+		for (name, value) in node.attributes.items():
+			for referenced_id in SVGReferenceGraph.parse_references(name, value):
+				self._references.append((node, name, referenced_id))
+
+	def finish(self, context):
+		for (node, name, referenced_id) in self._references:
+			if referenced_id not in context.elements_by_id:
+				context.report(self, f"<{node.tagName}> element references non-existent element #{referenced_id} in \"{name}\" attribute.", node)
+
+class DuplicateIdRule(SVGValidationRule):
+	_NAME = "duplicate-id"
+	_TAGS = ( )
+
+	def finish(self, context):
+		for (element_id, nodes) in context.elements_by_id.items():
+			if len(nodes) > 1:
+				context.report(self, f"ID {element_id} is used by {len(nodes)} elements.", nodes[1])
+
+class MissingLayerIdRule(SVGValidationRule):
+	# SVGAnimation identifies layers by their IDs.
+	_NAME = "missing-layer-id"
+	_TAGS = ( "g", )
+	_ATTRIBUTES = ( "inkscape:groupmode", )
+
+	def visit(self, node, context):
+		if (node.getAttribute("inkscape:groupmode") == "layer") and (not node.hasAttribute("id")):
+			label = XMLTools.default_get_attribute(node, "inkscape:label")
+			context.report(self, f"Layer {label if label is not None else '(unlabeled)'} does not have an ID assigned.", node)
+
+class OversizeImageRule(SVGValidationRule):
+	_NAME = "oversize-image"
+	_TAGS = ( "image", )
+	_ATTRIBUTES = ( "xlink:href", "href" )
+
+	def __init__(self, severity: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, max_size: int = 4 * 1024 * 1024):
+		super().__init__(severity = severity)
+		self._max_size = max_size
+
+	def visit(self, node, context):
+		for name in self._ATTRIBUTES:
+			value = node.getAttribute(name)
+			if not value.startswith("data:"):
+				continue
+			(header, _, payload) = value.partition(",")
+			if header.endswith(";base64"):
+				# Estimate without decoding, padding and whitespace aside
+				size = len(payload) * 3 // 4
+			else:
+				size = len(payload)
+			if size > self._max_size:
+				context.report(self, f"Embedded image has approximately {size} bytes, exceeding the limit of {self._max_size} bytes.", node)
+
+class SVGValidator():
+	def __init__(self, check_missing_fonts: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, check_references: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, check_duplicate_ids: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, check_layer_ids: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, check_image_size: SVGValidatorErrorClass = SVGValidatorErrorClass.EmitWarning, max_image_size: int = 4 * 1024 * 1024, font_inventory: FontInventory | None = None, rules: list | None = None):
+		self._font_inventory = font_inventory
+		self._rules = [
+			MissingFontRule(severity = check_missing_fonts),
+			DanglingReferenceRule(severity = check_references),
+			DuplicateIdRule(severity = check_duplicate_ids),
+			MissingLayerIdRule(severity = check_layer_ids),
+			OversizeImageRule(severity = check_image_size, max_size = max_image_size),
+		]
+		if rules is not None:
+			self._rules += rules
+		self._rules = [ rule for rule in self._rules if rule.severity != SVGValidatorErrorClass.CheckDisabled ]
+
+	@property
+	def font_inventory(self):
+		# Built (or loaded from the on-disk cache) only once it is needed
+		if self._font_inventory is None:
+			self._font_inventory = FontInventory.default()
+		return self._font_inventory
+
+	@property
+	def rules(self):
+		return iter(self._rules)
+
+	def _dispatch_table(self):
+		# tag -> rules, None holds the rules that want to see every element
+		table = { None: [ ] }
+		for rule in self._rules:
+			if rule.tags is None:
+				table[None].append(rule)
+			else:
+				for tag in rule.tags:
+					table.setdefault(tag, [ ]).append(rule)
+		return table
+
+	@classmethod
+	def _wants(cls, rule, node):
+		return (rule.attributes is None) or any(node.hasAttribute(name) for name in rule.attributes)
+
+	def validate(self, svg_document, raise_on_fatal: bool = True):
+		# All rules are run in a single traversal of the document. Returns
+		# the list of findings and, unless raise_on_fatal is False, raises
+		# SVGValidationException after the traversal if any of them is
+		# fatal.
+		context = SVGValidationContext(self, svg_document)
+		table = self._dispatch_table()
+		for rule in self._rules:
+			rule.start(context)
+		for node in XMLTools.walk_elements(svg_document.node):
+			if node.hasAttribute("id"):
+				context.elements_by_id.setdefault(node.getAttribute("id"), [ ]).append(node)
+			for rule in table.get(node.tagName, [ ]) + table[None]:
+				if self._wants(rule, node):
+					rule.visit(node, context)
+		for rule in self._rules:
+			rule.finish(context)
+
+		fatal = [ finding for finding in context.findings if finding.severity == SVGValidatorErrorClass.ThrowException ]
+		if raise_on_fatal and (len(fatal) > 0):
+			raise SVGValidationException("\n".join(finding.message for finding in fatal))
+		return context.findings
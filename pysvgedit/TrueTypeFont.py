@@ -0,0 +1,412 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import struct
+import functools
+from .Exceptions import SVGFontException
+
+class TrueTypeFont():
+	# Minimal reader for TrueType/OpenType (also TTC collection) font files
+	# that extracts the information needed to compute text extents: global
+	# metrics, the character map, advance widths and pair kerning (from the
+	# legacy "kern" table or the GPOS "kern" feature).
+	_WEIGHT_NAMES = {
+		"thin":			100,
+		"extralight":	200,
+		"ultralight":	200,
+		"light":		300,
+		"regular":		400,
+		"book":			400,
+		"medium":		500,
+		"semibold":		600,
+		"demibold":		600,
+		"bold":			700,
+		"extrabold":	800,
+		"ultrabold":	800,
+		"black":		900,
+		"heavy":		900,
+	}
+
+	def __init__(self, filename: str, font_index: int = 0):
+		self._filename = filename
+		self._font_index = font_index
+		with open(filename, "rb") as f:
+			self._data = f.read()
+		self._tables = self._parse_table_directory()
+		self._kerning_cache = { }
+
+	@property
+	def filename(self):
+		return self._filename
+
+	@property
+	def font_index(self):
+		return self._font_index
+
+	@classmethod
+	def font_count(cls, filename: str):
+		with open(filename, "rb") as f:
+			header = f.read(12)
+		if header[:4] == b"ttcf":
+			return struct.unpack(">L", header[8 : 12])[0]
+		return 1
+
+	def _unpack(self, fmt, offset):
+		try:
+			return struct.unpack_from(fmt, self._data, offset)
+		except struct.error as e:
+			raise SVGFontException(f"Truncated font file {self.filename}: {e}") from e
+
+	def _parse_table_directory(self):
+		offset = 0
+		if self._data[:4] == b"ttcf":
+			(font_count, ) = self._unpack(">L", 8)
+			if self._font_index >= font_count:
+				raise SVGFontException(f"Font collection {self.filename} has only {font_count} fonts, cannot access index {self._font_index}.")
+			(offset, ) = self._unpack(">L", 12 + (4 * self._font_index))
+		(sfnt_version, table_count) = self._unpack(">4sH", offset)
+		if sfnt_version not in (b"\x00\x01\x00\x00", b"OTTO", b"true"):
+			raise SVGFontException(f"Not a TrueType/OpenType font file: {self.filename}")
+		tables = { }
+		for i in range(table_count):
+			(tag, _, table_offset, length) = self._unpack(">4sLLL", offset + 12 + (16 * i))
+			tables[tag.decode("latin1")] = (table_offset, length)
+		return tables
+
+	def _table_offset(self, tag, required = True):
+		if tag not in self._tables:
+			if required:
+				raise SVGFontException(f"Font file {self.filename} has no '{tag}' table.")
+			return None
+		return self._tables[tag][0]
+
+	@functools.cached_property
+	def units_per_em(self):
+		return self._unpack(">H", self._table_offset("head") + 18)[0]
+
+	@functools.cached_property
+	def _hhea(self):
+		offset = self._table_offset("hhea")
+		(ascender, descender, line_gap) = self._unpack(">hhh", offset + 4)
+		(hmetric_count, ) = self._unpack(">H", offset + 34)
+		return (ascender, descender, line_gap, hmetric_count)
+
+	@property
+	def ascender(self):
+		return self._hhea[0]
+
+	@property
+	def descender(self):
+		# Negative value for glyphs extending below the baseline.
+		return self._hhea[1]
+
+	@property
+	def line_gap(self):
+		return self._hhea[2]
+
+	def _decode_name(self, platform_id, raw):
+		if platform_id in (0, 3):
+			return raw.decode("utf-16-be", errors = "replace")
+		return raw.decode("latin1")
+
+	@functools.cached_property
+	def names(self):
+		offset = self._table_offset("name", required = False)
+		if offset is None:
+			return { }
+		(_, count, string_offset) = self._unpack(">HHH", offset)
+		candidates = { }
+		for i in range(count):
+			(platform_id, encoding_id, language_id, name_id, length, str_offset) = self._unpack(">HHHHHH", offset + 6 + (12 * i))
+			if platform_id not in (0, 1, 3):
+				continue
+			start = offset + string_offset + str_offset
+			# Prefer Windows/English names, then Unicode, then Macintosh.
+			priority = {
+				(3, 0x409):	0,
+				(0, None):	1,
+				(1, 0):		2,
+			}.get((platform_id, language_id if platform_id != 0 else None), 3)
+			if (name_id not in candidates) or (priority < candidates[name_id][0]):
+				candidates[name_id] = (priority, self._decode_name(platform_id, self._data[start : start + length]))
+		return { name_id: value for (name_id, (_, value)) in candidates.items() }
+
+	@property
+	def family_name(self):
+		# Typographic family name takes precedence over the legacy one.
+		return self.names.get(16, self.names.get(1))
+
+	@property
+	def family_names(self):
+		# All distinct family names, e.g., "Noto Sans" and "Noto Sans Light"
+		return list(dict.fromkeys(name for name in (self.names.get(16), self.names.get(1)) if name is not None))
+
+	@property
+	def subfamily_name(self):
+		return self.names.get(17, self.names.get(2, "Regular"))
+
+	@functools.cached_property
+	def weight(self):
+		offset = self._table_offset("OS/2", required = False)
+		if offset is not None:
+			return self._unpack(">H", offset + 4)[0]
+		subfamily = self.subfamily_name.lower().replace(" ", "").replace("-", "")
+		for (name, weight) in sorted(self._WEIGHT_NAMES.items(), key = lambda item: -len(item[0])):
+			if name in subfamily:
+				return weight
+		return 400
+
+	@functools.cached_property
+	def italic(self):
+		offset = self._table_offset("OS/2", required = False)
+		if (offset is not None) and (self._tables["OS/2"][1] >= 64):
+			(fs_selection, ) = self._unpack(">H", offset + 62)
+			return (fs_selection & ((1 << 0) | (1 << 9))) != 0
+		subfamily = self.subfamily_name.lower()
+		return ("italic" in subfamily) or ("oblique" in subfamily)
+
+	def _parse_cmap_format4(self, offset):
+		(seg_count_x2, ) = self._unpack(">H", offset + 6)
+		seg_count = seg_count_x2 // 2
+		end_codes = self._unpack(f">{seg_count}H", offset + 14)
+		start_codes = self._unpack(f">{seg_count}H", offset + 16 + seg_count_x2)
+		id_deltas = self._unpack(f">{seg_count}h", offset + 16 + (2 * seg_count_x2))
+		id_range_offsets_offset = offset + 16 + (3 * seg_count_x2)
+		id_range_offsets = self._unpack(f">{seg_count}H", id_range_offsets_offset)
+		cmap = { }
+		for (i, (start, end, delta, range_offset)) in enumerate(zip(start_codes, end_codes, id_deltas, id_range_offsets)):
+			if start == 0xffff:
+				continue
+			for codepoint in range(start, end + 1):
+				if range_offset == 0:
+					glyph_id = (codepoint + delta) & 0xffff
+				else:
+					glyph_offset = id_range_offsets_offset + (2 * i) + range_offset + (2 * (codepoint - start))
+					(glyph_id, ) = self._unpack(">H", glyph_offset)
+					if glyph_id != 0:
+						glyph_id = (glyph_id + delta) & 0xffff
+				if glyph_id != 0:
+					cmap[codepoint] = glyph_id
+		return cmap
+
+	def _parse_cmap_format12(self, offset):
+		(group_count, ) = self._unpack(">L", offset + 12)
+		cmap = { }
+		for i in range(group_count):
+			(start, end, start_glyph_id) = self._unpack(">LLL", offset + 16 + (12 * i))
+			for codepoint in range(start, end + 1):
+				cmap[codepoint] = start_glyph_id + (codepoint - start)
+		return cmap
+
+	@functools.cached_property
+	def cmap(self):
+		offset = self._table_offset("cmap")
+		(_, subtable_count) = self._unpack(">HH", offset)
+		subtables = { }
+		for i in range(subtable_count):
+			(platform_id, encoding_id, subtable_offset) = self._unpack(">HHL", offset + 4 + (8 * i))
+			(subtable_format, ) = self._unpack(">H", offset + subtable_offset)
+			subtables[(platform_id, encoding_id, subtable_format)] = offset + subtable_offset
+
+		# Prefer full Unicode tables over BMP-only ones.
+		for (key, parser) in (
+				((3, 10, 12), self._parse_cmap_format12),
+				((0, 4, 12), self._parse_cmap_format12),
+				((0, 6, 12), self._parse_cmap_format12),
+				((3, 1, 4), self._parse_cmap_format4),
+				((0, 3, 4), self._parse_cmap_format4),
+				((0, 1, 4), self._parse_cmap_format4),
+				((3, 0, 4), self._parse_cmap_format4),
+			):
+			if key in subtables:
+				return parser(subtables[key])
+		return { }
+
+	def glyph_id(self, char: str):
+		return self.cmap.get(ord(char), 0)
+
+	def advance_width(self, glyph_id: int):
+		hmetric_count = self._hhea[3]
+		offset = self._table_offset("hmtx")
+		if glyph_id >= hmetric_count:
+			glyph_id = hmetric_count - 1
+		return self._unpack(">H", offset + (4 * glyph_id))[0]
+
+	@functools.cached_property
+	def _kern_table_pairs(self):
+		# Legacy "kern" table, only horizontal format 0 subtables.
+		pairs = { }
+		offset = self._table_offset("kern", required = False)
+		if offset is None:
+			return pairs
+		(version, subtable_count) = self._unpack(">HH", offset)
+		if version != 0:
+			return pairs
+		offset += 4
+		for _ in range(subtable_count):
+			(_, length, coverage) = self._unpack(">HHH", offset)
+			subtable_format = coverage >> 8
+			horizontal = (coverage & 1) != 0
+			if (subtable_format == 0) and horizontal:
+				(pair_count, ) = self._unpack(">H", offset + 6)
+				for i in range(pair_count):
+					(left, right, value) = self._unpack(">HHh", offset + 14 + (6 * i))
+					pairs[(left, right)] = value
+			offset += length
+		return pairs
+
+	def _coverage_index(self, offset, glyph_id):
+		(coverage_format, count) = self._unpack(">HH", offset)
+		if coverage_format == 1:
+			glyphs = self._unpack(f">{count}H", offset + 4)
+			(low, high) = (0, count - 1)
+			while low <= high:
+				mid = (low + high) // 2
+				if glyphs[mid] == glyph_id:
+					return mid
+				elif glyphs[mid] < glyph_id:
+					low = mid + 1
+				else:
+					high = mid - 1
+		elif coverage_format == 2:
+			for i in range(count):
+				(start, end, start_index) = self._unpack(">HHH", offset + 4 + (6 * i))
+				if start <= glyph_id <= end:
+					return start_index + (glyph_id - start)
+		return None
+
+	def _class_value(self, offset, glyph_id):
+		(class_format, ) = self._unpack(">H", offset)
+		if class_format == 1:
+			(start_glyph, count) = self._unpack(">HH", offset + 2)
+			if start_glyph <= glyph_id < start_glyph + count:
+				return self._unpack(">H", offset + 6 + (2 * (glyph_id - start_glyph)))[0]
+		elif class_format == 2:
+			(count, ) = self._unpack(">H", offset + 2)
+			for i in range(count):
+				(start, end, class_value) = self._unpack(">HHH", offset + 4 + (6 * i))
+				if start <= glyph_id <= end:
+					return class_value
+		return 0
+
+	@classmethod
+	def _value_record_size(cls, value_format):
+		return 2 * bin(value_format & 0xff).count("1")
+
+	@classmethod
+	def _x_advance_offset(cls, value_format):
+		# Offset of the XAdvance field within a value record or None.
+		if (value_format & 0x0004) == 0:
+			return None
+		return 2 * bin(value_format & 0x0003).count("1")
+
+	@functools.cached_property
+	def _gpos_pair_subtables(self):
+		offset = self._table_offset("GPOS", required = False)
+		if offset is None:
+			return [ ]
+		(_, _, _, feature_list_offset, lookup_list_offset) = self._unpack(">HHHHH", offset)
+		feature_list = offset + feature_list_offset
+		lookup_list = offset + lookup_list_offset
+
+		lookup_indices = set()
+		(feature_count, ) = self._unpack(">H", feature_list)
+		for i in range(feature_count):
+			(tag, feature_offset) = self._unpack(">4sH", feature_list + 2 + (6 * i))
+			if tag == b"kern":
+				(_, lookup_index_count) = self._unpack(">HH", feature_list + feature_offset)
+				lookup_indices |= set(self._unpack(f">{lookup_index_count}H", feature_list + feature_offset + 4))
+
+		subtables = [ ]
+		for lookup_index in sorted(lookup_indices):
+			(lookup_offset, ) = self._unpack(">H", lookup_list + 2 + (2 * lookup_index))
+			lookup = lookup_list + lookup_offset
+			(lookup_type, _, subtable_count) = self._unpack(">HHH", lookup)
+			for i in range(subtable_count):
+				(subtable_offset, ) = self._unpack(">H", lookup + 6 + (2 * i))
+				subtable = lookup + subtable_offset
+				subtable_type = lookup_type
+				if lookup_type == 9:
+					# Extension positioning
+					(_, subtable_type, extension_offset) = self._unpack(">HHL", subtable)
+					subtable += extension_offset
+				if subtable_type == 2:
+					subtables.append(subtable)
+		return subtables
+
+	def _gpos_pair_kerning(self, subtable, left, right):
+		(pos_format, coverage_offset, value_format1, value_format2) = self._unpack(">HHHH", subtable)
+		coverage_index = self._coverage_index(subtable + coverage_offset, left)
+		if coverage_index is None:
+			return None
+		x_advance_offset = self._x_advance_offset(value_format1)
+		record_size = self._value_record_size(value_format1) + self._value_record_size(value_format2)
+
+		if pos_format == 1:
+			(pair_set_count, ) = self._unpack(">H", subtable + 8)
+			if coverage_index >= pair_set_count:
+				return None
+			(pair_set_offset, ) = self._unpack(">H", subtable + 10 + (2 * coverage_index))
+			pair_set = subtable + pair_set_offset
+			(pair_value_count, ) = self._unpack(">H", pair_set)
+			entry_size = 2 + record_size
+			(low, high) = (0, pair_value_count - 1)
+			while low <= high:
+				mid = (low + high) // 2
+				entry = pair_set + 2 + (entry_size * mid)
+				(second_glyph, ) = self._unpack(">H", entry)
+				if second_glyph == right:
+					if x_advance_offset is None:
+						return 0
+					return self._unpack(">h", entry + 2 + x_advance_offset)[0]
+				elif second_glyph < right:
+					low = mid + 1
+				else:
+					high = mid - 1
+			return None
+		elif pos_format == 2:
+			(class_def1_offset, class_def2_offset, class1_count, class2_count) = self._unpack(">HHHH", subtable + 8)
+			class1 = self._class_value(subtable + class_def1_offset, left)
+			class2 = self._class_value(subtable + class_def2_offset, right)
+			if (class1 >= class1_count) or (class2 >= class2_count):
+				return None
+			if x_advance_offset is None:
+				return 0
+			record = subtable + 16 + (record_size * ((class1 * class2_count) + class2))
+			return self._unpack(">h", record + x_advance_offset)[0]
+		return None
+
+	def kerning(self, left: int, right: int):
+		# Returns the horizontal kerning adjustment in font units for a glyph
+		# pair; GPOS takes precedence over the legacy kern table.
+		key = (left, right)
+		if key not in self._kerning_cache:
+			value = None
+			for subtable in self._gpos_pair_subtables:
+				value = self._gpos_pair_kerning(subtable, left, right)
+				if value is not None:
+					break
+			if value is None:
+				value = self._kern_table_pairs.get(key, 0)
+			self._kerning_cache[key] = value
+		return self._kerning_cache[key]
+
+	def __str__(self):
+		return f"TrueTypeFont<{self.family_name} {self.subfamily_name}, {self.filename}>"
@@ -20,6 +20,7 @@
 
 import re
 from math import sqrt, sin, cos, tan, isclose, pi, atan2
+from .NumberFormatter import NumberFormatter
 
 class Vector2D():
 	def __init__(self, x = 0, y = 0):
@@ -217,9 +218,15 @@ class SVGTransform():
 				case ("matrix", 6):
 					matrices.append(TransformationMatrix(*args))
 
+				case ("translate", 1):
+					matrices.append(TransformationMatrix.translate(Vector2D(args[0], 0)))
+
 				case ("translate", 2):
 					matrices.append(TransformationMatrix.translate(Vector2D(*args)))
 
+				case ("scale", 1):
+					matrices.append(TransformationMatrix(args[0], 0, 0, args[0], 0, 0))
+
 				case ("scale", 2):
 					(scale_x, scale_y) = args
 					matrices.append(TransformationMatrix(scale_x, 0, 0, scale_y, 0, 0))
@@ -252,4 +259,4 @@ class SVGTransform():
 
 	@classmethod
 	def to_svg(cls, matrix):
-		return f"matrix({' '.join(str(value) for value in matrix.aslist)})"
+		return f"matrix({NumberFormatter.default().join(matrix.aslist)})"
@@ -37,6 +37,14 @@ class XMLTools():
 			for child in node.childNodes:
 				yield from cls.walk_elements(child, tagname = tagname, constraint = constraint)
 
+	@classmethod
+	def walk_text_nodes(cls, node):
+		for child in node.childNodes:
+			if child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE):
+				yield child
+			elif child.nodeType == child.ELEMENT_NODE:
+				yield from cls.walk_text_nodes(child)
+
 	@classmethod
 	def _walk_elements_with_context(cls, node, context, transform_context_function, exclude, parent = None):
 		yield (node, context)
@@ -65,6 +73,14 @@ class XMLTools():
 		element = doc.createElement(tagname)
 		return element
 
+	@classmethod
+	def adopt(cls, node, owner_document):
+		# minidom does not update the ownerDocument when appending nodes that
+		# were created by a different document, so do it for the whole subtree.
+		node.ownerDocument = owner_document
+		for child in node.childNodes:
+			cls.adopt(child, owner_document)
+
 	@classmethod
 	def try_remove_attribute(cls, node, name):
 		if node.hasAttribute(name):
@@ -48,20 +48,41 @@ layer:
 	doc.writefile("output.svg")
 """
 
+from .NumberFormatter import NumberFormatter
 from .Vector2D import Vector2D, TransformationMatrix, SVGTransform
 from .SVGDefs import SVGDefs
 from .SVGDocument import SVGDocument
 from .SVGGroup import SVGGroup
 from .SVGStyle import SVGStyle
+from .SVGStyleSheet import SVGStyleSheet, SVGStyleSheetRule
+from .SVGStyleDeduplication import SVGStyleDeduplication
+from .SVGStyleResolver import SVGStyleResolver, SVGSelector
 from .SVGRect import SVGRect
 from .SVGCircle import SVGCircle
 from .SVGText import SVGTextSpan, SVGText
 from .SVGPath import SVGPath
+from .SVGSymbol import SVGSymbol
+from .SVGUse import SVGUse
+from .SVGInstancing import SVGInstancing
+from .TrueTypeFont import TrueTypeFont
+from .FontInventory import FontInventory, FontFace
+from .FontMetrics import FontMetrics
+from .SVGTextExtents import SVGTextExtents, SVGTextFragment
+from .SVGTextLayout import SVGTextLayout, SVGTextLayoutResult, SVGTextLine
 from .SVGImage import SVGImage
 from .SVGAnimation import SVGAnimation, SVGAnimationMode
-from .SVGValidator import SVGValidator, SVGValidatorErrorClass
-from .SVGTransformation import FormatTextTransformation, ChangeVisibilityTransformation
+from .SVGFrameSerializer import SVGFrameSerializer
+from .SVGAnimationExport import SVGAnimationExport, SVGAnimationExportFormat
+from .SVGReferenceGraph import SVGReferenceGraph
+from .SVGOptimizer import SVGOptimizer
+from .SVGValidator import SVGValidator, SVGValidatorErrorClass, SVGValidationFinding, SVGValidationRule
+from .SVGTransformation import FormatTextTransformation, ChangeVisibilityTransformation, CompiledFormatTemplate
+from .MakoTemplateCache import MakoTemplateCache
+from .SVGTemplate import SVGTemplate
+from .RenderCache import RenderCache
+from .InkscapeRenderer import InkscapeRenderer
+from .SVGRasterizer import SVGRasterizer
 from .Convenience import Convenience
-from .Exceptions import SVGException
+from .Exceptions import SVGException, SVGFontException, SVGRenderException
 
 VERSION = "0.0.6rc0"
@@ -20,14 +20,27 @@
 
 import os
 import sys
-import tempfile
-import subprocess
+import json
+import time
+import multiprocessing
+import multiprocessing.util
+import xml.parsers.expat
 import pysvgedit
 from .FriendlyArgumentParser import FriendlyArgumentParser
 
 class AnimationRendererApp():
+	_worker_app = None
+
 	def __init__(self, args):
 		self._args = args
+		self._renderer = None
+		self._load()
+
+	def _load(self):
+		self._input_mtime = os.stat(self._args.infile_svg).st_mtime_ns
+		self._doc = pysvgedit.SVGDocument.readfile(self._args.infile_svg)
+		self._anim = pysvgedit.SVGAnimation(self._doc, animation_mode = pysvgedit.SVGAnimationMode(self._args.animation_mode))
+		self._serializer = pysvgedit.SVGFrameSerializer(self._anim)
 
 	@property
 	def outdir(self):
@@ -36,31 +49,234 @@ class AnimationRendererApp():
 		else:
 			return self._args.outdir + "/"
 
-	def run(self):
-		self._doc = pysvgedit.SVGDocument.readfile(self._args.infile_svg)
-		self._anim = pysvgedit.SVGAnimation(self._doc, animation_mode = pysvgedit.SVGAnimationMode(self._args.animation_mode))
+	@property
+	def renderer(self):
+		if self._renderer is None:
+			render_cache = None if (self._args.render_cache is None) else pysvgedit.RenderCache(self._args.render_cache, max_size = self._args.render_cache_size * 1024 * 1024)
+			self._renderer = pysvgedit.InkscapeRenderer(worker_count = self._args.inkscape_workers, inkscape_binary = self._args.inkscape_binary, timeout = self._args.inkscape_timeout, mode = self._args.inkscape_mode, render_cache = render_cache)
+		return self._renderer
+
+	@property
+	def render_cache_counts(self):
+		# (hits, misses) of the render cache so far
+		if (self._renderer is None) or (self._renderer.render_cache is None):
+			return (0, 0)
+		return (self._renderer.render_cache.hits, self._renderer.render_cache.misses)
+
+	def close(self):
+		if self._renderer is not None:
+			self._renderer.close()
+			self._renderer = None
+
+	@property
+	def filename_template(self):
+		if self._args.filename_template is not None:
+			return self._args.filename_template
+		elif self._args.output_format == "frames":
+			return "{prefix}_{frameno:02d}.png" if self._args.preview else "{prefix}_{frameno:02d}.svg"
+		else:
+			return "{prefix}_{format}.svg"
+
+	@property
+	def prefix(self):
+		return os.path.splitext(self._args.infile_svg)[0]
+
+	def _frame_jobs(self):
+		# Frames can be set directly by their number, so they can be emitted
+		# in any order and by any process.
 		tvars = {
-			"prefix": os.path.splitext(self._args.infile_svg)[0],
+			"prefix": self.prefix,
 		}
-		for (frameno, frame) in enumerate(self._anim, 1):
+		for frameno in range(1, self._anim.frame_count + 1):
 			tvars["frameno"] = frameno
-			output_filename = f"{self.outdir}{self._args.filename_template.format(**tvars)}"
+			output_filename = f"{self.outdir}{self.filename_template.format(**tvars)}"
+			yield (frameno, output_filename)
+
+	def _emit_frame(self, frameno, output_filename):
+		# Returns a future when the frame is being rendered by Inkscape.
+		if self._args.preview:
+			frame = self._anim.frame(frameno - 1)
+			pysvgedit.SVGRasterizer(frame, width = self._args.preview_width).write_png(output_filename)
+			return None
+		elif not self._args.inkscape_render:
+			self._serializer.write_frame_file(frameno - 1, output_filename)
+			return None
+		else:
+			return self.renderer.submit(self._serializer.frame_bytes(frameno - 1), output_filename)
+
+	@classmethod
+	def _frame_worker_init(cls, args):
+		cls._worker_app = cls(args)
+		multiprocessing.util.Finalize(cls._worker_app, cls._worker_app.close, exitpriority = 10)
+
+	@classmethod
+	def _frame_worker_render(cls, job):
+		# Also returns the render cache hits and misses caused by this frame,
+		# the parent process sums them up.
+		(frameno, output_filename) = job
+		(hits, misses) = cls._worker_app.render_cache_counts
+		future = cls._worker_app._emit_frame(frameno, output_filename)
+		if future is not None:
+			future.result()
+		(total_hits, total_misses) = cls._worker_app.render_cache_counts
+		return (frameno, output_filename, total_hits - hits, total_misses - misses)
+
+	@property
+	def manifest_filename(self):
+		return f"{self.outdir}.{os.path.basename(self.prefix)}.manifest.json"
+
+	@property
+	def manifest_settings(self):
+		# All options that influence the output besides the frame content;
+		# when any of them changes, all frames are emitted again.
+		return {
+			"inkscape_render":	self._args.inkscape_render,
+			"inkscape_binary":	self._args.inkscape_binary,
+			"preview":			self._args.preview,
+			"preview_width":	self._args.preview_width,
+		}
+
+	def _read_manifest(self):
+		try:
+			with open(self.manifest_filename) as f:
+				return json.load(f)
+		except (FileNotFoundError, json.decoder.JSONDecodeError):
+			return { }
+
+	def _write_manifest(self, frame_digests):
+		with open(self.manifest_filename, "w") as f:
+			json.dump({ "settings": self.manifest_settings, "frames": frame_digests }, f, indent = 4, sort_keys = True)
+			f.write("\n")
+
+	def _frame_digests(self, jobs):
+		# Frames rendered through Inkscape only depend on their visible
+		# content, raw SVG frames also contain the hidden layers.
+		return { output_filename: self._serializer.frame_digest(frameno - 1, visible_only = self._args.inkscape_render) for (frameno, output_filename) in jobs }
+
+	def _run_sequential(self, jobs):
+		pending = [ ]
+		for (frameno, output_filename) in jobs:
 			if self._args.verbose >= 1:
 				print(f"Frame {frameno}: {output_filename}")
-			if not self._args.inkscape_render:
-				frame.writefile(output_filename)
+			future = self._emit_frame(frameno, output_filename)
+			if future is not None:
+				pending.append(future)
+		for future in pending:
+			future.result()
+		self._print_render_cache_counts(*self.render_cache_counts)
+
+	def _print_render_cache_counts(self, hits, misses):
+		if (self._args.render_cache is not None) and (self._args.verbose >= 1):
+			print(f"Render cache: {hits} hits, {misses} misses")
+
+	def _run_parallel(self, jobs):
+		# Every worker process parses the document once and then serializes
+		# and exports the frames it is handed.
+		(hits, misses) = (0, 0)
+		with multiprocessing.Pool(processes = self._args.jobs, initializer = self._frame_worker_init, initargs = (self._args, )) as pool:
+			for (frameno, output_filename, frame_hits, frame_misses) in pool.imap(self._frame_worker_render, jobs):
+				if self._args.verbose >= 1:
+					print(f"Frame {frameno}: {output_filename}")
+				hits += frame_hits
+				misses += frame_misses
+			pool.close()
+			pool.join()
+		self._print_render_cache_counts(hits, misses)
+
+	def _run_single_file(self):
+		# All frames go into one document, which is written only once.
+		export = pysvgedit.SVGAnimationExport(self._anim, frame_duration = self._args.frame_duration, loop = not self._args.no_loop)
+		svg_document = export.export(pysvgedit.SVGAnimationExportFormat(self._args.output_format))
+		output_filename = f"{self.outdir}{self.filename_template.format(prefix = self.prefix, format = self._args.output_format)}"
+		if self._args.verbose >= 1:
+			print(f"{self._anim.frame_count} frames: {output_filename}")
+		if not self._args.inkscape_render:
+			with open(output_filename, "wb") as f:
+				f.write(svg_document.asbytes())
+		else:
+			self.renderer.render(svg_document.asbytes(), output_filename)
+
+	def _run_frames(self):
+		jobs = list(self._frame_jobs())
+		if self._args.incremental:
+			# Only frames whose content hash differs from the one recorded in
+			# the manifest of the previous run are emitted again.
+			manifest = self._read_manifest()
+			previous_frames = manifest.get("frames", { })
+			previous_digests = previous_frames if (manifest.get("settings") == self.manifest_settings) else { }
+			frame_digests = self._frame_digests(jobs)
+			unchanged = set(output_filename for (output_filename, digest) in frame_digests.items() if (previous_digests.get(output_filename) == digest) and os.path.exists(output_filename))
+			jobs = [ (frameno, output_filename) for (frameno, output_filename) in jobs if output_filename not in unchanged ]
+			if self._args.verbose >= 1:
+				print(f"{len(jobs)} of {len(frame_digests)} frames changed.")
+
+		if self._args.jobs == 1:
+			self._run_sequential(jobs)
+		else:
+			self._run_parallel(jobs)
+
+		if self._args.incremental:
+			for output_filename in set(previous_frames) - set(frame_digests):
+				# Frame does not exist anymore
+				if os.path.exists(output_filename):
+					os.unlink(output_filename)
+			self._write_manifest(frame_digests)
+
+	def _run_once(self):
+		if self._args.output_format != "frames":
+			self._run_single_file()
+		else:
+			self._run_frames()
+
+	def _watch(self):
+		# Polls the input file; it is only parsed again once its modification
+		# time changes. Errors while the file is being edited do not end
+		# the loop.
+		self._run_once()
+		try:
+			while True:
+				time.sleep(self._args.watch_interval)
+				try:
+					if os.stat(self._args.infile_svg).st_mtime_ns == self._input_mtime:
+						continue
+					self._load()
+					self._run_once()
+				except (FileNotFoundError, xml.parsers.expat.ExpatError, pysvgedit.SVGException) as e:
+					print(f"{self._args.infile_svg}: {e.__class__.__name__}: {e}", file = sys.stderr)
+		except KeyboardInterrupt:
+			pass
+
+	def run(self):
+		try:
+			if self._args.watch:
+				self._args.incremental = True
+				self._watch()
 			else:
-				with tempfile.NamedTemporaryFile(prefix = "pysvgedit_", suffix = ".svg", mode = "w") as f:
-					frame.write(f)
-					f.flush()
-					subprocess.check_call([ "inkscape", "-o", output_filename, f.name ])
+				self._run_once()
+		finally:
+			self.close()
 
 	@classmethod
 	def main(cls):
 		parser = FriendlyArgumentParser(description = "Render an animated SVG file.")
 		parser.add_argument("-i", "--inkscape-render", action = "store_true", help = "Do not output raw SVG data, but render through Inkscape. Allows direct generation of PDF or PNG output.")
+		parser.add_argument("-P", "--preview", action = "store_true", help = "Render PNG previews of the frames with the built-in rasterizer instead of Inkscape. Only supports basic shapes, but is much faster.")
+		parser.add_argument("--preview-width", metavar = "pixels", type = int, help = "Width of preview images. Defaults to the document width.")
+		parser.add_argument("-w", "--inkscape-workers", metavar = "count", type = int, default = 1, help = "Number of Inkscape processes that render frames concurrently when rendering through Inkscape. Defaults to %(default)d.")
+		parser.add_argument("--inkscape-binary", metavar = "path", default = "inkscape", help = "Inkscape executable to use. Defaults to %(default)s.")
+		parser.add_argument("--inkscape-mode", choices = [ "shell", "pipe" ], default = "shell", help = "Run Inkscape as a persistent shell process that is reused for all frames or start one process per frame that receives data through a pipe. Can be one of %(choices)s, defaults to %(default)s.")
+		parser.add_argument("--inkscape-timeout", metavar = "secs", type = float, default = 60, help = "Time after which a hanging Inkscape process is killed and restarted. Defaults to %(default).0f seconds.")
+		parser.add_argument("-r", "--render-cache", metavar = "path", help = "Directory in which rendered frames are cached. Frames that are identical to a previously rendered one are then not passed to Inkscape again.")
+		parser.add_argument("--render-cache-size", metavar = "MiB", type = int, default = 1024, help = "Maximum size of the render cache. Defaults to %(default)d MiB.")
+		parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "Number of processes that serialize and export frames in parallel. Defaults to %(default)d.")
+		parser.add_argument("-u", "--incremental", action = "store_true", help = "Only write or render frames whose content changed since the previous run. Content hashes are kept in a manifest file in the output directory.")
+		parser.add_argument("-W", "--watch", action = "store_true", help = "Keep running, watch the input file and incrementally render again whenever it changes. Implies --incremental.")
+		parser.add_argument("--watch-interval", metavar = "secs", type = float, default = 0.5, help = "Interval in which the input file is checked for changes in watch mode. Defaults to %(default).1f seconds.")
 		parser.add_argument("-m", "--animation-mode", choices = [ "compose", "compose-all", "replace" ], default = "compose", help = "Specify the animation mode to render in. Can be one of %(choices)s, defaults to %(default)s.")
-		parser.add_argument("-n", "--filename-template", metavar = "template", default = "{prefix}_{frameno:02d}.svg", help = "Can specify a filename template. Defaults to '%(default)s'.")
+		parser.add_argument("-f", "--output-format", choices = [ "frames", "css", "smil", "multipage" ], default = "frames", help = "Write one file per frame or a single file that contains all frames, either animated through CSS or SMIL or as an Inkscape multi-page document with one page per frame (which Inkscape renders as a multi-page PDF). Can be one of %(choices)s, defaults to %(default)s.")
+		parser.add_argument("-d", "--frame-duration", metavar = "secs", type = float, default = 1, help = "For CSS or SMIL output, the time each frame is shown. Defaults to %(default).1f seconds.")
+		parser.add_argument("--no-loop", action = "store_true", help = "For CSS or SMIL output, stop at the last frame instead of repeating the animation.")
+		parser.add_argument("-n", "--filename-template", metavar = "template", help = "Can specify a filename template. Defaults to '{prefix}_{frameno:02d}.svg' when writing individual frames and '{prefix}_{format}.svg' otherwise.")
 		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Increases verbosity. Can be specified multiple times to increase.")
 		parser.add_argument("infile_svg", help = "Input SVG file.")
 		parser.add_argument("outdir", nargs = "?", help = "Output directory to render frames in. Defaults to current directory if omitted.")
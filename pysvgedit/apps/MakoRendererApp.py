@@ -18,92 +18,186 @@
 #	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import os
 import sys
 import json
-import tempfile
-import subprocess
+import logging
 import datetime
-import mako.template
+import multiprocessing
+import multiprocessing.util
 import pysvgedit
+from pysvgedit.MakoTemplateCache import MakoTemplateCache
 from .FriendlyArgumentParser import FriendlyArgumentParser
 
 class HelperClass():
 	pass
 
 class MakoRendererApp():
+	_worker_app = None
+
 	def __init__(self, args):
 		self._args = args
-		with open(self._args.datafile_json) as f:
-			self._template_data = json.load(f)
-		self._update_helper_vars()
-
-	def _update_helper_vars(self):
-		if self._args.functions != "none":
-			h = HelperClass()
-			self._template_data["h"] = h
-
-			if self._args.functions == "default":
-				h.now = datetime.datetime.now()
-
-	def _write_svg(self):
-		self._doc.writefile(self._args.outfile)
-
-	def _write_pdf(self):
-		with tempfile.NamedTemporaryFile(prefix = "pysvgedit_", suffix = ".svg", mode = "w") as f:
-			self._doc.write(f)
-			f.flush()
-			subprocess.check_call([ "inkscape", "-o", self._args.outfile, f.name])
-
-	def _replace_text(self):
-		for tspan in self._doc.walk("tspan"):
-			text = tspan.text
-			if text == "":
-				continue
-			template = mako.template.Template(text, strict_undefined = True)
-			try:
-				rendered_text = template.render(**self._template_data)
-			except Exception as e:
-				if not self._args.ignore_errors:
-					raise
-				rendered_text = f"{e.__class__.__name__}: {e}"
-				if self._args.verbose >= 1:
-					print(f"Error rendering {text}: {rendered_text}")
-			if text != rendered_text:
-				if self._args.verbose >= 2:
-					print(f"{text} -> {rendered_text}")
-				tspan.text = rendered_text
-
-	def _patch_style(self):
-		for (style_id, style_update) in self._template_data.get("svg_style_patches", { }).items():
-			node = self._doc.get_element_by_id(style_id)
-			if node is None:
-				print(f"Style update of '{style_id}' requested, but no such element found.")
-				continue
-			style = pysvgedit.SVGStyle.from_node(node, auto_sync = True)
-			style.update(style_update)
+		self._template_cache = MakoTemplateCache(module_directory = self._args.template_cache_dir)
+		self._helper = self._create_helper()
+		self._template = None
+		self._renderer = None
 
-	def run(self):
-		self._doc = pysvgedit.SVGDocument.readfile(self._args.infile_svg)
-		self._replace_text()
-		if self._args.patch_style:
-			self._patch_style()
+	def _create_helper(self):
+		if self._args.functions == "none":
+			return None
+		h = HelperClass()
+		if self._args.functions == "default":
+			h.now = datetime.datetime.now()
+		return h
+
+	def _template_data(self, data):
+		template_data = dict(data)
+		if self._helper is not None:
+			template_data["h"] = self._helper
+		return template_data
+
+	@property
+	def template(self):
+		# Parsed and compiled only once; every rendering only fills in the
+		# holes of the prepared template.
+		if self._template is None:
+			self._template = pysvgedit.SVGTemplate.readfile(self._args.infile_svg, template_cache = self._template_cache, ignore_errors = self._args.ignore_errors, patch_style = self._args.patch_style)
+		return self._template
+
+	@property
+	def renderer(self):
+		# One persistent Inkscape process per renderer process, reused for
+		# every PDF that is produced.
+		if self._renderer is None:
+			render_cache = None if (self._args.render_cache is None) else pysvgedit.RenderCache(self._args.render_cache, max_size = self._args.render_cache_size * 1024 * 1024)
+			self._renderer = pysvgedit.InkscapeRenderer(inkscape_binary = self._args.inkscape_binary, render_cache = render_cache)
+		return self._renderer
+
+	@property
+	def render_cache_hits(self):
+		if (self._renderer is None) or (self._renderer.render_cache is None):
+			return 0
+		return self._renderer.render_cache.hits
 
-		if self._args.outfile.endswith(".pdf"):
-			self._write_pdf()
+	def close(self):
+		if self._renderer is not None:
+			self._renderer.close()
+			self._renderer = None
+
+	def _write_svg(self, svg_data, outfile):
+		with open(outfile, "wb") as f:
+			f.write(svg_data)
+
+	def _write_pdf(self, svg_data, outfile):
+		self.renderer.render(svg_data, outfile)
+
+	def _write_png(self, svg_data, outfile):
+		if self._args.preview:
+			pysvgedit.SVGRasterizer(pysvgedit.SVGDocument.frombytes(svg_data)).write_png(outfile)
 		else:
-			self._write_svg()
+			self.renderer.render(svg_data, outfile)
+
+	def _write(self, svg_data, outfile):
+		if outfile.endswith(".pdf"):
+			self._write_pdf(svg_data, outfile)
+		elif outfile.endswith(".png"):
+			self._write_png(svg_data, outfile)
+		else:
+			self._write_svg(svg_data, outfile)
+
+	def _render(self, data, outfile):
+		svg_data = self.template.render(self._template_data(data))
+		self._write(svg_data, outfile)
+
+	def _batch_records(self):
+		# Yields (name, data) tuples, either from a directory that contains
+		# JSON files or from a JSONL file (one JSON record per line).
+		if os.path.isdir(self._args.datafile_json):
+			for filename in sorted(os.listdir(self._args.datafile_json)):
+				if filename.endswith(".json"):
+					with open(os.path.join(self._args.datafile_json, filename)) as f:
+						yield (os.path.splitext(filename)[0], json.load(f))
+		else:
+			with open(self._args.datafile_json) as f:
+				for (lineno, line) in enumerate(f, 1):
+					line = line.strip()
+					if line != "":
+						yield (str(lineno), json.loads(line))
+
+	def _render_batch_record(self, job):
+		(index, name, data) = job
+		outfile = self._args.outfile.format(index = index, name = name, data = data)
+		outdir = os.path.dirname(outfile)
+		if outdir != "":
+			os.makedirs(outdir, exist_ok = True)
+		hits = self.render_cache_hits
+		self._render(data, outfile)
+		return (outfile, self.render_cache_hits > hits)
+
+	@classmethod
+	def _batch_worker_init(cls, args):
+		cls._worker_app = cls(args)
+		multiprocessing.util.Finalize(cls._worker_app, cls._worker_app.close, exitpriority = 10)
+
+	@classmethod
+	def _batch_worker_render(cls, job):
+		return cls._worker_app._render_batch_record(job)
+
+	def _run_batch(self):
+		jobs = ((index, name, data) for (index, (name, data)) in enumerate(self._batch_records(), 1))
+		if self._args.jobs == 1:
+			outfiles = map(self._render_batch_record, jobs)
+			pool = None
+		else:
+			pool = multiprocessing.Pool(processes = self._args.jobs, initializer = self._batch_worker_init, initargs = (self._args, ))
+			outfiles = pool.imap(self._batch_worker_render, jobs, chunksize = 16)
+		try:
+			(hits, misses) = (0, 0)
+			for (outfile, cache_hit) in outfiles:
+				if cache_hit:
+					hits += 1
+				elif outfile.endswith(".pdf") or (outfile.endswith(".png") and not self._args.preview):
+					misses += 1
+				if self._args.verbose >= 1:
+					print(outfile)
+			if (self._args.render_cache is not None) and (self._args.verbose >= 1):
+				print(f"Render cache: {hits} hits, {misses} misses")
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+
+	def run(self):
+		try:
+			if self._args.batch:
+				self._run_batch()
+			else:
+				with open(self._args.datafile_json) as f:
+					data = json.load(f)
+				self._render(data, self._args.outfile)
+		finally:
+			self.close()
 
 	@classmethod
 	def main(cls):
 		parser = FriendlyArgumentParser(description = "Render text blocks in SVG files using Mako.")
 		parser.add_argument("-i", "--ignore-errors", action = "store_true", help = "By default, rendering is refused if there are errors. This will continue rendering and replace tpspans with the encountered issues instead.")
 		parser.add_argument("-p", "--patch-style", action = "store_true", help = "Interpret an 'svg_style_patches' dictionary as elements for which style should be updated.")
+		parser.add_argument("-c", "--template-cache-dir", metavar = "path", help = "Directory in which compiled Mako templates are persisted, so that repeated renders of the same SVG do not need to compile them again.")
 		parser.add_argument("-f", "--functions", choices = [ "none", "default" ], default = "default", help = "Special functions to supply using the 'h' variable. Can be one of %(choices)s, defaults to %(default)s.")
+		parser.add_argument("-b", "--batch", action = "store_true", help = "Batch mode. The data file is then either a JSONL file (one record per line) or a directory containing JSON files and the output file is a filename template that may reference the variables 'index', 'name' and 'data', e.g., 'out_{index:05d}.pdf'.")
+		parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "In batch mode, number of worker processes to render with. Defaults to %(default)d.")
+		parser.add_argument("-r", "--render-cache", metavar = "path", help = "Directory in which rendered PDFs are cached. Documents that are identical to a previously rendered one are then not passed to Inkscape again.")
+		parser.add_argument("--render-cache-size", metavar = "MiB", type = int, default = 1024, help = "Maximum size of the render cache. Defaults to %(default)d MiB.")
+		parser.add_argument("-P", "--preview", action = "store_true", help = "Render PNG output with the built-in rasterizer instead of Inkscape. Only supports basic shapes, but is much faster.")
+		parser.add_argument("--inkscape-binary", metavar = "path", default = "inkscape", help = "Inkscape executable to use for PDF output. Defaults to %(default)s.")
 		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Increases verbosity. Can be specified multiple times to increase.")
 		parser.add_argument("datafile_json", help = "JSON file that contains the data that will be used as template variables.")
 		parser.add_argument("infile_svg", help = "Input SVG file.")
-		parser.add_argument("outfile", help = "Output file. If the extension is '.pdf', will be directly rendered to PDF using Inkscape. Otherwise, SVG is produced.")
+		parser.add_argument("outfile", help = "Output file. If the extension is '.pdf' or '.png', will be directly rendered using Inkscape. Otherwise, SVG is produced.")
 		args = parser.parse_args(sys.argv[1:])
 
+		log_level = { 0: logging.WARNING, 1: logging.INFO }.get(args.verbose, logging.DEBUG)
+		logging.basicConfig(format = "%(message)s", level = log_level)
 		app = cls(args)
 		return app.run()
@@ -0,0 +1,210 @@
+#	pysvgedit - SVG manipulation toolkit
+#	Copyright (C) 2023-2024 Johannes Bauer
+#
+#	This file is part of pysvgedit.
+#
+#	pysvgedit is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	pysvgedit is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with pysvgedit; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import sys
+import json
+import datetime
+import collections
+import concurrent.futures
+import socketserver
+import pysvgedit
+from pysvgedit.MakoTemplateCache import MakoTemplateCache
+from .MakoRendererApp import HelperClass
+from .FriendlyArgumentParser import FriendlyArgumentParser
+
+class LRUCache():
+	def __init__(self, maxsize: int):
+		self._maxsize = maxsize
+		self._entries = collections.OrderedDict()
+		self._hits = 0
+		self._misses = 0
+
+	@property
+	def stats(self):
+		return { "entries": len(self._entries), "hits": self._hits, "misses": self._misses }
+
+	def get(self, key, create_callback):
+		if key in self._entries:
+			self._hits += 1
+			self._entries.move_to_end(key)
+			return self._entries[key]
+		self._misses += 1
+		value = create_callback()
+		self._entries[key] = value
+		while len(self._entries) > self._maxsize:
+			self._entries.popitem(last = False)
+		return value
+
+class RenderDaemonApp():
+	# Keeps parsed documents and compiled templates warm between requests.
+	# Requests and responses are JSON objects, one per line, either on
+	# stdin/stdout or on a Unix domain socket.
+	def __init__(self, args):
+		self._args = args
+		self._template_cache = MakoTemplateCache(module_directory = self._args.template_cache_dir)
+		self._templates = LRUCache(self._args.cache_size)
+		self._animations = LRUCache(self._args.cache_size)
+		render_cache = None if (self._args.render_cache is None) else pysvgedit.RenderCache(self._args.render_cache, max_size = self._args.render_cache_size * 1024 * 1024)
+		self._renderer = pysvgedit.InkscapeRenderer(worker_count = self._args.inkscape_workers, inkscape_binary = self._args.inkscape_binary, render_cache = render_cache)
+
+	@classmethod
+	def _file_key(cls, filename):
+		filename = os.path.realpath(filename)
+		return (filename, os.stat(filename).st_mtime_ns)
+
+	def _get_template(self, filename, ignore_errors, patch_style):
+		key = self._file_key(filename) + (ignore_errors, patch_style)
+		return self._templates.get(key, lambda: pysvgedit.SVGTemplate.readfile(filename, template_cache = self._template_cache, ignore_errors = ignore_errors, patch_style = patch_style))
+
+	def _get_frame_serializer(self, filename, animation_mode):
+		# The serializer never modifies its document, so it can be shared
+		# between requests.
+		key = self._file_key(filename) + (animation_mode, )
+		return self._animations.get(key, lambda: pysvgedit.SVGFrameSerializer(pysvgedit.SVGAnimation(pysvgedit.SVGDocument.readfile(filename), animation_mode = pysvgedit.SVGAnimationMode(animation_mode))))
+
+	def _submit_output(self, svg_data, outfile):
+		# Returns a future for the response; exports through Inkscape are
+		# dispatched to the persistent Inkscape workers and may run
+		# concurrently.
+		if (outfile is not None) and (not outfile.endswith(".svg")):
+			return self._renderer.submit(svg_data, outfile)
+		future = concurrent.futures.Future()
+		if outfile is not None:
+			with open(outfile, "wb") as f:
+				f.write(svg_data)
+		future.set_result(outfile)
+		return future
+
+	def _output(self, svg_data, outfile):
+		if outfile is None:
+			return { "svg": svg_data.decode("utf-8") }
+		return { "outfile": self._submit_output(svg_data, outfile).result() }
+
+	def _handle_mako(self, request):
+		template = self._get_template(request["template"], ignore_errors = request.get("ignore_errors", False), patch_style = request.get("patch_style", False))
+		template_data = dict(request.get("data", { }))
+		if request.get("functions", "default") == "default":
+			h = HelperClass()
+			h.now = datetime.datetime.now()
+			template_data["h"] = h
+		return self._output(template.render(template_data), request.get("outfile"))
+
+	def _handle_animation(self, request):
+		serializer = self._get_frame_serializer(request["infile"], request.get("animation_mode", "compose"))
+		frame_count = serializer.animation.frame_count
+		outdir = request.get("outdir")
+		filename_template = request.get("filename_template", "frame_{frameno:02d}.svg")
+		if outdir is None:
+			return { "frames": [ self._output(serializer.frame_bytes(frame_index), None) for frame_index in range(frame_count) ] }
+		pending = [ ]
+		for frame_index in range(frame_count):
+			outfile = os.path.join(outdir, filename_template.format(frameno = frame_index + 1))
+			pending.append(self._submit_output(serializer.frame_bytes(frame_index), outfile))
+		return { "frames": [ { "outfile": future.result() } for future in pending ] }
+
+	def _handle_stats(self, request):
+		response = { "templates": self._templates.stats, "animations": self._animations.stats, "compiled_templates": len(self._template_cache) }
+		if self._renderer.render_cache is not None:
+			response["render_cache"] = self._renderer.render_cache.stats
+		return response
+
+	def handle_request(self, request):
+		handler = {
+			"mako":			self._handle_mako,
+			"animation":	self._handle_animation,
+			"stats":		self._handle_stats,
+		}.get(request.get("type"))
+		response = { }
+		if "id" in request:
+			response["id"] = request["id"]
+		if handler is None:
+			response.update({ "status": "error", "error": f"Unknown request type: {request.get('type')}" })
+			return response
+		try:
+			response.update(handler(request))
+			response["status"] = "ok"
+		except Exception as e:
+			response.update({ "status": "error", "error": f"{e.__class__.__name__}: {e}" })
+			if self._args.verbose >= 1:
+				print(f"Error handling request: {response['error']}", file = sys.stderr)
+		return response
+
+	def handle_line(self, line):
+		try:
+			request = json.loads(line)
+		except json.decoder.JSONDecodeError as e:
+			return { "status": "error", "error": f"Invalid JSON request: {e}" }
+		if not isinstance(request, dict):
+			return { "status": "error", "error": "Request must be a JSON object." }
+		return self.handle_request(request)
+
+	def _serve_stdio(self):
+		for line in sys.stdin:
+			if line.strip() == "":
+				continue
+			print(json.dumps(self.handle_line(line)), flush = True)
+
+	def _serve_socket(self):
+		app = self
+
+		class RequestHandler(socketserver.StreamRequestHandler):
+			def handle(self):
+				for line in self.rfile:
+					if line.strip() == b"":
+						continue
+					response = app.handle_line(line)
+					self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+					self.wfile.flush()
+
+		if os.path.exists(self._args.socket):
+			os.unlink(self._args.socket)
+		# Requests are handled sequentially, the cached objects are not
+		# thread-safe.
+		with socketserver.UnixStreamServer(self._args.socket, RequestHandler) as server:
+			try:
+				server.serve_forever()
+			finally:
+				os.unlink(self._args.socket)
+
+	def run(self):
+		try:
+			if self._args.socket is None:
+				self._serve_stdio()
+			else:
+				self._serve_socket()
+		finally:
+			self._renderer.close()
+
+	@classmethod
+	def main(cls):
+		parser = FriendlyArgumentParser(description = "Long-running render daemon that keeps SVG documents and compiled templates warm. Reads JSON requests (one per line) and answers with JSON responses.")
+		parser.add_argument("-s", "--socket", metavar = "path", help = "Listen on this Unix domain socket. By default, requests are read from stdin and responses written to stdout.")
+		parser.add_argument("-n", "--cache-size", metavar = "count", type = int, default = 64, help = "Number of parsed documents and prepared templates to keep. Defaults to %(default)d.")
+		parser.add_argument("-c", "--template-cache-dir", metavar = "path", help = "Directory in which compiled Mako templates are persisted.")
+		parser.add_argument("-r", "--render-cache", metavar = "path", help = "Directory in which rendered PDF/PNG files are cached.")
+		parser.add_argument("--render-cache-size", metavar = "MiB", type = int, default = 1024, help = "Maximum size of the render cache. Defaults to %(default)d MiB.")
+		parser.add_argument("-w", "--inkscape-workers", metavar = "count", type = int, default = 1, help = "Number of persistent Inkscape processes used for PDF/PNG output. Defaults to %(default)d.")
+		parser.add_argument("--inkscape-binary", metavar = "path", default = "inkscape", help = "Inkscape executable to use. Defaults to %(default)s.")
+		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Increases verbosity. Can be specified multiple times to increase.")
+		args = parser.parse_args(sys.argv[1:])
+
+		app = cls(args)
+		return app.run()
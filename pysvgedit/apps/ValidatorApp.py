@@ -18,25 +18,268 @@
 #	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import os
 import sys
+import glob
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+import xml.dom.minidom
+import xml.parsers.expat
 import pysvgedit
+from pysvgedit.SVGValidator import SVGValidatorErrorClass, SVGValidationFinding
 from .FriendlyArgumentParser import FriendlyArgumentParser
 
 class ValidatorApp():
-	def __init__(self, args):
+	_worker_app = None
+
+	# Rule name -> SVGValidator keyword argument
+	_RULES = {
+		"missing-font":			"check_missing_fonts",
+		"dangling-reference":	"check_references",
+		"duplicate-id":			"check_duplicate_ids",
+		"missing-layer-id":		"check_layer_ids",
+		"oversize-image":		"check_image_size",
+	}
+
+	def __init__(self, args, font_inventory = None):
 		self._args = args
+		self._font_inventory = font_inventory
+		self._validator = None
+
+	@property
+	def font_inventory(self):
+		if self._font_inventory is None:
+			self._font_inventory = pysvgedit.FontInventory.default()
+		return self._font_inventory
+
+	@property
+	def severities(self):
+		severities = { }
+		for rule_name in self._RULES:
+			if rule_name in self._args.disable:
+				severities[rule_name] = SVGValidatorErrorClass.CheckDisabled
+			elif rule_name in self._args.error:
+				severities[rule_name] = SVGValidatorErrorClass.ThrowException
+			else:
+				severities[rule_name] = SVGValidatorErrorClass.EmitWarning
+		return severities
+
+	@property
+	def validator(self):
+		if self._validator is None:
+			kwargs = { self._RULES[rule_name]: severity for (rule_name, severity) in self.severities.items() }
+			self._validator = pysvgedit.SVGValidator(max_image_size = self._args.max_image_size * 1024, font_inventory = self.font_inventory, **kwargs)
+		return self._validator
+
+	@property
+	def config_key(self):
+		# Cached results are only valid for the same validator version,
+		# configuration and set of installed fonts.
+		config = {
+			"version":			pysvgedit.VERSION,
+			"severities":		{ rule_name: int(severity) for (rule_name, severity) in self.severities.items() },
+			"max_image_size":	self._args.max_image_size,
+			"fonts":			sorted(self.font_inventory.families),
+		}
+		return hashlib.sha256(json.dumps(config, sort_keys = True).encode("utf-8")).hexdigest()
+
+	def _infiles(self):
+		# Glob patterns are expanded (so that they also work when not
+		# expanded by the shell) and directories searched for SVG files.
+		seen = set()
+		for pattern in self._args.infile_svg:
+			filenames = sorted(glob.glob(pattern, recursive = True))
+			if len(filenames) == 0:
+				filenames = [ pattern ]
+			for filename in filenames:
+				if os.path.isdir(filename):
+					filenames_in_dir = sorted(glob.glob(os.path.join(filename, "**", "*.svg"), recursive = True))
+				else:
+					filenames_in_dir = [ filename ]
+				for filename in filenames_in_dir:
+					if filename not in seen:
+						seen.add(filename)
+						yield filename
+
+	@classmethod
+	def _finding_to_dict(cls, finding):
+		return { "rule": finding.rule, "severity": finding.severity.name, "message": finding.message, "element_id": finding.element_id }
+
+	@classmethod
+	def _finding_from_dict(cls, data):
+		return SVGValidationFinding(rule = data["rule"], severity = SVGValidatorErrorClass[data["severity"]], message = data["message"], element_id = data["element_id"])
+
+	def _validate(self, job):
+		(filename, svg_data) = job
+		t0 = time.monotonic()
+		try:
+			doc = pysvgedit.SVGDocument.frombytes(svg_data)
+			findings = self.validator.validate(doc, raise_on_fatal = False)
+		except (xml.parsers.expat.ExpatError, pysvgedit.SVGException) as e:
+			findings = [ SVGValidationFinding(rule = "parse-error", severity = SVGValidatorErrorClass.ThrowException, message = f"Cannot parse SVG: {e}") ]
+		except Exception as e:
+			# Whatever goes wrong with one file must neither end the run nor
+			# let the file pass.
+			findings = [ SVGValidationFinding(rule = "internal-error", severity = SVGValidatorErrorClass.ThrowException, message = f"Cannot validate SVG: {e.__class__.__name__}: {e}") ]
+		return (filename, findings, time.monotonic() - t0)
+
+	@classmethod
+	def _worker_init(cls, args, font_inventory):
+		# The font inventory is handed over from the parent process so that
+		# it is built only once.
+		cls._worker_app = cls(args, font_inventory = font_inventory)
+
+	@classmethod
+	def _worker_validate(cls, job):
+		return cls._worker_app._validate(job)
+
+	def _read_result_cache(self, config_key):
+		if self._args.result_cache is None:
+			return { }
+		try:
+			with open(self._args.result_cache) as f:
+				cache = json.load(f)
+		except (OSError, ValueError):
+			return { }
+		if cache.get("config") != config_key:
+			return { }
+		return cache["results"]
+
+	def _write_result_cache(self, config_key, results):
+		cache_dir = os.path.dirname(os.path.abspath(self._args.result_cache))
+		(fd, tmp_filename) = tempfile.mkstemp(dir = cache_dir, prefix = ".tmp_", suffix = ".json")
+		try:
+			with os.fdopen(fd, "w") as f:
+				json.dump({ "config": config_key, "results": results }, f)
+			os.replace(tmp_filename, self._args.result_cache)
+		finally:
+			if os.path.exists(tmp_filename):
+				os.unlink(tmp_filename)
+
+	def _validate_all(self):
+		# Yields (filename, findings, duration, cached) for every input file,
+		# not necessarily in order. Files whose content hash is contained in
+		# the result cache are not parsed at all.
+		config_key = self.config_key
+		cached_results = self._read_result_cache(config_key)
+		content_hashes = { }
+		jobs = [ ]
+		for filename in self._infiles():
+			try:
+				with open(filename, "rb") as f:
+					svg_data = f.read()
+			except OSError as e:
+				yield (filename, [ SVGValidationFinding(rule = "read-error", severity = SVGValidatorErrorClass.ThrowException, message = f"Cannot read file: {e}") ], 0, False)
+				continue
+			content_hash = hashlib.sha256(svg_data).hexdigest()
+			content_hashes[filename] = content_hash
+			if content_hash in cached_results:
+				yield (filename, [ self._finding_from_dict(finding) for finding in cached_results[content_hash] ], 0, True)
+			else:
+				jobs.append((filename, svg_data))
+
+		if (self._args.jobs == 1) or (len(jobs) <= 1):
+			results = map(self._validate, jobs)
+			pool = None
+		else:
+			pool = multiprocessing.Pool(processes = self._args.jobs, initializer = self._worker_init, initargs = (self._args, self.font_inventory))
+			results = pool.imap_unordered(self._worker_validate, jobs, chunksize = 16)
+		try:
+			for (filename, findings, duration) in results:
+				cached_results[content_hashes[filename]] = [ self._finding_to_dict(finding) for finding in findings ]
+				yield (filename, findings, duration, False)
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+
+		if (self._args.result_cache is not None) and (len(jobs) > 0):
+			self._write_result_cache(config_key, cached_results)
+
+	def _write_json_report(self, results, f):
+		report = {
+			"files": [ { "filename": filename, "cached": cached, "time": duration, "findings": [ self._finding_to_dict(finding) for finding in findings ] } for (filename, findings, duration, cached) in results ],
+		}
+		json.dump(report, f, indent = 4)
+		f.write("\n")
+
+	def _write_junit_report(self, results, f):
+		# One test case per file; fatal findings are failures, all others
+		# are reported as output of the test case.
+		doc = xml.dom.minidom.Document()
+		testsuite = doc.appendChild(doc.createElement("testsuite"))
+		testsuite.setAttribute("name", "svgvalidate")
+		testsuite.setAttribute("tests", str(len(results)))
+		failure_count = 0
+		for (filename, findings, duration, cached) in results:
+			testcase = testsuite.appendChild(doc.createElement("testcase"))
+			testcase.setAttribute("classname", "svgvalidate")
+			testcase.setAttribute("name", filename)
+			testcase.setAttribute("time", f"{duration:.3f}")
+			errors = [ finding for finding in findings if finding.severity == SVGValidatorErrorClass.ThrowException ]
+			warnings = [ finding for finding in findings if finding.severity == SVGValidatorErrorClass.EmitWarning ]
+			if len(errors) > 0:
+				failure_count += 1
+				failure = testcase.appendChild(doc.createElement("failure"))
+				failure.setAttribute("message", errors[0].message)
+				failure.appendChild(doc.createTextNode("\n".join(f"[{finding.rule}] {finding.message}" for finding in errors)))
+			if len(warnings) > 0:
+				system_out = testcase.appendChild(doc.createElement("system-out"))
+				system_out.appendChild(doc.createTextNode("\n".join(f"[{finding.rule}] {finding.message}" for finding in warnings)))
+		testsuite.setAttribute("failures", str(failure_count))
+		doc.writexml(f, addindent = "\t", newl = "\n", encoding = "utf-8")
+
+	def _write_report(self, results):
+		report_format = self._args.report_format
+		if report_format is None:
+			report_format = "junit" if self._args.report.endswith(".xml") else "json"
+		with open(self._args.report, "w") as f:
+			if report_format == "junit":
+				self._write_junit_report(results, f)
+			else:
+				self._write_json_report(results, f)
 
 	def run(self):
-		doc = pysvgedit.SVGDocument.readfile(self._args.infile_svg)
-		validator = pysvgedit.SVGValidator()
-		validator.validate(doc)
+		results = [ ]
+		(error_count, warning_count, cached_count) = (0, 0, 0)
+		for (filename, findings, duration, cached) in self._validate_all():
+			results.append((filename, findings, duration, cached))
+			cached_count += int(cached)
+			for finding in findings:
+				if finding.severity == SVGValidatorErrorClass.ThrowException:
+					error_count += 1
+					print(f"{filename}: error: [{finding.rule}] {finding.message}")
+				else:
+					warning_count += 1
+					print(f"{filename}: warning: [{finding.rule}] {finding.message}")
+			if self._args.verbose >= 2:
+				print(f"{filename}: {len(findings)} findings{' (cached)' if cached else ''}")
+		results.sort()
+		if self._args.report is not None:
+			self._write_report(results)
+		if self._args.verbose >= 1:
+			print(f"Validated {len(results)} files ({cached_count} cached): {error_count} errors, {warning_count} warnings")
+		return 1 if (error_count > 0) else 0
 
 	@classmethod
 	def main(cls):
-		parser = FriendlyArgumentParser(description = "Validate an SVG file.")
+		parser = FriendlyArgumentParser(description = "Validate SVG files.")
+		parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "Number of worker processes to validate with. Defaults to %(default)d.")
+		parser.add_argument("-c", "--result-cache", metavar = "filename", help = "JSON file in which validation results are cached. Files whose content did not change since a previous run with the same configuration are then not validated again.")
+		parser.add_argument("-e", "--error", metavar = "rule", choices = sorted(cls._RULES), action = "append", default = [ ], help = "Treat findings of this rule as errors instead of warnings. Can be specified multiple times. Can be one of %(choices)s.")
+		parser.add_argument("-d", "--disable", metavar = "rule", choices = sorted(cls._RULES), action = "append", default = [ ], help = "Disable this rule. Can be specified multiple times. Can be one of %(choices)s.")
+		parser.add_argument("--max-image-size", metavar = "KiB", type = int, default = 4096, help = "Maximum size of images embedded in the SVG document. Defaults to %(default)d KiB.")
+		parser.add_argument("-r", "--report", metavar = "filename", help = "Write a machine-readable report to this file.")
+		parser.add_argument("-f", "--report-format", choices = [ "json", "junit" ], help = "Format of the report. Can be one of %(choices)s, by default JUnit XML is written if the report filename ends with '.xml' and JSON otherwise.")
 		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Increases verbosity. Can be specified multiple times to increase.")
-		parser.add_argument("infile_svg", help = "Input SVG file.")
+		parser.add_argument("infile_svg", nargs = "+", help = "Input SVG file(s), glob patterns or directories that are searched for SVG files.")
 		args = parser.parse_args(sys.argv[1:])
 
+		# Findings are printed by the application itself.
+		logging.basicConfig(format = "%(message)s", level = logging.ERROR if (args.verbose < 3) else logging.DEBUG)
 		app = cls(args)
 		return app.run()
@@ -23,6 +23,7 @@ setuptools.setup(
 			"svgmakorender = pysvgedit.apps.MakoRendererApp:MakoRendererApp.main",
 			"svganimationrender = pysvgedit.apps.AnimationRendererApp:AnimationRendererApp.main",
 			"svgvalidate = pysvgedit.apps.ValidatorApp:ValidatorApp.main",
+			"svgrenderd = pysvgedit.apps.RenderDaemonApp:RenderDaemonApp.main",
 		]
 	},
 	include_package_data = False,